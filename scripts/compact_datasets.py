@@ -0,0 +1,58 @@
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from src.config import load_config
+from src.store.parquet import compact_partitioned_dataset
+from src.store.paths import OutputPaths
+from src.utils import utc_now_iso, write_json
+
+RAW_INDEX_SORT = ["station_id", "start_ms", "file_path"]
+
+
+def _dataset_dirs(root: Path, sources: list[str] | None) -> list[Path]:
+    if not root.exists():
+        return []
+    dirs = sorted(path for path in root.glob("source=*") if path.is_dir())
+    if sources:
+        dirs = [path for path in dirs if path.name.split("=", 1)[1] in sources]
+    return dirs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compact fragmented standard/raw-index parquet datasets.")
+    parser.add_argument("--config", default="configs/default.yaml")
+    parser.add_argument("--targets", default="standard,raw_index", help="Comma-separated: standard,raw_index")
+    parser.add_argument("--sources", default=None, help="Comma-separated sources (default: all)")
+    args = parser.parse_args()
+
+    config = load_config(ROOT / args.config)
+    output_paths = OutputPaths(ROOT / config.get("outputs", {}).get("root", "outputs"))
+    targets = [item.strip() for item in args.targets.split(",") if item.strip()]
+    sources = [item.strip() for item in args.sources.split(",")] if args.sources else None
+
+    report = {"generated_at_utc": utc_now_iso(), "datasets": {}}
+    for target in targets:
+        if target == "standard":
+            dataset_root, sort_by = output_paths.standard, None
+        elif target == "raw_index":
+            dataset_root, sort_by = output_paths.raw_index, RAW_INDEX_SORT
+        else:
+            raise ValueError(f"Unknown compaction target: {target}")
+        for dataset_dir in _dataset_dirs(dataset_root, sources):
+            source = dataset_dir.name.split("=", 1)[1] if target == "standard" else None
+            stats = compact_partitioned_dataset(dataset_dir, config, sort_by=sort_by, source=source)
+            key = f"{target}/{dataset_dir.name}"
+            report["datasets"][key] = stats
+            print(
+                f"{key}: files {stats['files_before']} -> {stats['files_after']}, "
+                f"scan {stats['scan_s_before']}s -> {stats['scan_s_after']}s"
+            )
+    write_json(output_paths.reports / "compaction.json", report)
+
+
+if __name__ == "__main__":
+    main()
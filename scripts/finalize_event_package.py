@@ -75,6 +75,7 @@ def main() -> None:
     _copytree(features_dir, tmp_dir / "features")
     _copytree(plots_dir / "html" / event_id, tmp_dir / "plots" / "html")
     _copytree(plots_dir / "spec" / event_id, tmp_dir / "plots" / "spec")
+    _copytree(plots_dir / "assets", tmp_dir / "plots" / "assets")
 
     if (linked_dir / "event.json").exists():
         shutil.copy2(linked_dir / "event.json", tmp_dir / "event.json")
@@ -103,13 +104,24 @@ def main() -> None:
         "plots/html/plot_aligned_timeseries.html",
         "plots/html/plot_station_map.html",
         "plots/html/plot_filter_effect.html",
+        "plots/spec/plot_aligned_timeseries.json",
+        "plots/spec/plot_station_map.json",
+        "plots/spec/plot_filter_effect.json",
+        "plots/spec/plot_aligned_timeseries.js",
+        "plots/spec/plot_station_map.js",
+        "plots/spec/plot_filter_effect.js",
+        "plots/assets/plotly.min.js",
         "reports/dq_event_link.json",
         "reports/dq_event_features.json",
         "reports/dq_plots.json",
         "reports/filter_effect.json",
         "reports/event_summary.md",
     ]
-    optional_files = ["plots/html/plot_vlf_spectrogram.html"]
+    optional_files = [
+        "plots/html/plot_vlf_spectrogram.html",
+        "plots/spec/plot_vlf_spectrogram.json",
+        "plots/spec/plot_vlf_spectrogram.js",
+    ]
     manifest = _build_manifest(tmp_dir, required_files, optional_files)
     write_json(tmp_dir / "reports" / "artifacts_manifest.json", manifest)
 
@@ -0,0 +1,50 @@
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from src.config import load_config
+from src.pipeline.online import OnlineScorer
+from src.store.paths import OutputPaths
+
+logger = logging.getLogger(__name__)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Score newly written standard data with per-series EWMA state.")
+    parser.add_argument("--config", default="configs/default.yaml")
+    parser.add_argument("--interval", type=float, default=None, help="Poll interval in seconds (default: online.poll_seconds)")
+    parser.add_argument("--once", action="store_true", help="Run a single poll and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    config = load_config(ROOT / args.config)
+    output_paths = OutputPaths(ROOT / config.get("outputs", {}).get("root", "outputs"))
+    scorer = OnlineScorer(output_paths, config)
+    interval = args.interval if args.interval is not None else scorer.settings["poll_seconds"]
+
+    while True:
+        started = time.monotonic()
+        try:
+            anomalies = scorer.poll()
+        except Exception:
+            logger.exception("Poll failed; state rolled back, retrying in %.1fs", interval)
+            if args.once:
+                raise
+        else:
+            if not anomalies.empty:
+                logger.info("%d anomalies in %.2fs", len(anomalies), time.monotonic() - started)
+                for (source, station_id), group in anomalies.groupby(["source", "station_id"], sort=False):
+                    logger.info(
+                        "  %s/%s: %d (max |score| %.1f)", source, station_id, len(group), group["score"].abs().max()
+                    )
+        if args.once:
+            break
+        time.sleep(max(interval - (time.monotonic() - started), 0.0))
+
+
+if __name__ == "__main__":
+    main()
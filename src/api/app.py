@@ -15,7 +15,11 @@ from fastapi.templating import Jinja2Templates
 
 from src.io.iaga2002 import read_iaga_window
 from src.io.seismic import StationMeta, read_mseed_window
-from src.store.parquet import read_parquet, read_parquet_filtered
+from src.pipeline.feature_store import VECTORS_FILE, FeatureIndex
+from src.pipeline.online import read_online_anomalies
+from src.pipeline.spatial import CATALOG_FILE, SpatialIndex
+from src.store.layout import read_layout, read_standard_filtered, station_bbox_filter
+from src.store.parquet import open_dataset, read_parquet, read_parquet_filtered, read_zone_map
 
 ROOT = Path(__file__).resolve().parents[2]
 OUTPUT_ROOT = Path(os.getenv("OUTPUT_ROOT", ROOT / "outputs"))
@@ -243,9 +247,52 @@ def _combine_filters(*filters: Optional[ds.Expression]) -> Optional[ds.Expressio
     return expr
 
 
+_SPATIAL_INDEX_CACHE: dict = {}
+
+
+def _spatial_index() -> SpatialIndex:
+    catalog_path = OUTPUT_ROOT / "reports" / "spatial_index" / CATALOG_FILE
+    if not catalog_path.exists():
+        raise HTTPException(status_code=404, detail="Spatial index not found; run the spatial stage")
+    stamp = catalog_path.stat().st_mtime_ns
+    cached = _SPATIAL_INDEX_CACHE.get("index")
+    if cached is None or cached[0] != stamp:
+        cached = (stamp, SpatialIndex.load(catalog_path.parent))
+        _SPATIAL_INDEX_CACHE["index"] = cached
+    return cached[1]
+
+
+_FEATURE_INDEX_CACHE: dict = {}
+
+
+def _feature_index() -> FeatureIndex:
+    store_dir = OUTPUT_ROOT / "feature_store"
+    vectors_path = store_dir / VECTORS_FILE
+    if not vectors_path.exists():
+        raise HTTPException(status_code=404, detail="Feature store not found; run the features stage")
+    stamp = vectors_path.stat().st_mtime_ns
+    cached = _FEATURE_INDEX_CACHE.get("index")
+    if cached is None or cached[0] != stamp:
+        cached = (stamp, FeatureIndex.load(store_dir))
+        _FEATURE_INDEX_CACHE["index"] = cached
+    return cached[1]
+
+
 def _dataset_fields(path: Path) -> set[str]:
-    dataset = ds.dataset(path, format="parquet", partitioning="hive")
-    return set(dataset.schema.names)
+    return set(open_dataset(path).schema.names)
+
+
+def _summarize_zone_map(fragments: List[dict]) -> Optional[dict]:
+    if not fragments or any(item.get("ts_min") is None for item in fragments):
+        return None
+    ts_min = pd.to_datetime(min(item["ts_min"] for item in fragments), unit="ms", utc=True)
+    ts_max = pd.to_datetime(max(item["ts_max"] for item in fragments), unit="ms", utc=True)
+    return {
+        "rows": int(sum(item["rows"] for item in fragments)),
+        "fragments": len(fragments),
+        "ts_min_utc": _format_utc(ts_min),
+        "ts_max_utc": _format_utc(ts_max),
+    }
 
 
 def _summarize_vlf_catalog(df: pd.DataFrame) -> dict:
@@ -651,8 +698,11 @@ def standard_query(
     row_filter = _build_row_filter(
         fields, start_ms, end_ms, station_id, lat_min, lat_max, lon_min, lon_max
     )
-    combined = _combine_filters(partition_filter, row_filter)
-    df = read_parquet_filtered(source_path, filters=combined, limit=limit)
+    bbox_filter = (
+        station_bbox_filter(source_path, lat_min, lat_max, lon_min, lon_max) if "lat" not in fields else None
+    )
+    combined = _combine_filters(partition_filter, row_filter, bbox_filter)
+    df = read_standard_filtered(source_path, filters=combined, limit=limit)
     summary = _summarize_df(df)
     filtered = _filter_df(df, start, end, station_id, lat_min, lat_max, lon_min, lon_max, limit)
     if response is not None:
@@ -691,13 +741,59 @@ def standard_summary(source: str = Query(..., description="geomag|aef|seismic|vl
         raise HTTPException(status_code=404, detail=f"Standard source not found: {source}")
     fields = _dataset_fields(source_path)
     summary_cols = [col for col in ["ts_ms", "starttime", "endtime"] if col in fields]
-    df = read_parquet_filtered(source_path, columns=summary_cols)
-    summary = _summarize_df(df)
+    summary = _summarize_zone_map(read_zone_map(source_path))
+    if summary is None:
+        df = read_parquet_filtered(source_path, columns=summary_cols)
+        summary = _summarize_df(df)
+    else:
+        summary["columns"] = summary_cols
+    layout = read_layout(source_path)
+    if layout.get("layout") == "wide":
+        summary["rows"] = int(layout.get("long_rows", summary.get("rows", 0)))
+        summary["layout"] = "wide"
     summary["source"] = source
     summary["stage"] = "standard"
     return summary
 
 
+@app.get("/online/anomalies")
+def online_anomalies(
+    since: Optional[str] = None,
+    source: Optional[str] = None,
+    station_id: Optional[str] = None,
+    limit: int = 500,
+):
+    df = read_online_anomalies(OUTPUT_ROOT / "online", _parse_time(since))
+    if source:
+        df = df[df["source"] == source]
+    if station_id:
+        df = df[df["station_id"].astype(str) == station_id]
+    df = df.sort_values("ts_ms", ascending=False, kind="stable")
+    return _safe_records(df.head(limit))
+
+
+@app.get("/spatial/stations")
+def spatial_stations(
+    lat: float,
+    lon: float,
+    radius_km: Optional[float] = None,
+    k: Optional[int] = None,
+    source: Optional[str] = None,
+):
+    if radius_km is None and k is None:
+        raise HTTPException(status_code=400, detail="radius_km or k is required")
+    index = _spatial_index()
+    if source:
+        index = SpatialIndex(index.stations[index.stations["source"] == source])
+    if radius_km is not None:
+        df = index.query_radius(lat, lon, radius_km)
+    else:
+        df = index.query_knn(lat, lon, k)
+    if radius_km is not None and k is not None:
+        df = df.head(int(k))
+    return _safe_records(df)
+
+
 @app.get("/events")
 def list_events(include_incomplete: bool = False):
     events = []
@@ -765,12 +861,23 @@ def get_association(event_id: str, limit: int = 200):
     return {"summary": summary, "changes": changes, "similarity": similarity}
 
 
+@app.get("/events/{event_id}/similar")
+def get_similar_events(
+    event_id: str, k: int = 10, params_hash: Optional[str] = None, min_overlap: int = 1
+):
+    try:
+        df = _feature_index().similar(event_id, k=k, params_hash=params_hash, min_overlap=min_overlap)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Event not in feature store: {event_id}")
+    return _safe_records(df)
+
+
 @app.get("/events/{event_id}/plots")
 def get_plot(event_id: str, kind: str):
     path = OUTPUT_ROOT / "plots" / "spec" / event_id / f"plot_{kind}.json"
     if not path.exists():
         raise HTTPException(status_code=404, detail="plot spec not found")
-    return json.loads(path.read_text(encoding="utf-8"))
+    return FileResponse(path, media_type="application/json")
 
 
 @app.get("/events/{event_id}/seismic/export")
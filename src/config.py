@@ -1,7 +1,8 @@
+import csv
 import hashlib
 import json
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 import yaml
 
@@ -36,3 +37,20 @@ def get_event(config: Dict[str, Any], event_id: Optional[str]) -> Dict[str, Any]
         if event.get("event_id") == event_id:
             return event
     raise ValueError(f"Event_id not found in config: {event_id}")
+
+
+EVENT_FLOAT_FIELDS = ("lat", "lon", "depth_km", "magnitude")
+
+
+def load_event_catalog(path: Path) -> List[Dict[str, Any]]:
+    events = []
+    with path.open("r", encoding="utf-8-sig", newline="") as handle:
+        for row in csv.DictReader(handle):
+            event = {key.strip(): (value.strip() if isinstance(value, str) else value) for key, value in row.items()}
+            if not event.get("event_id") or not event.get("origin_time_utc"):
+                raise ValueError(f"Event catalog row missing event_id/origin_time_utc: {row}")
+            for key in EVENT_FLOAT_FIELDS:
+                value = event.get(key)
+                event[key] = float(value) if value not in (None, "") else None
+            events.append(event)
+    return events
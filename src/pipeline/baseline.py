@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.dq.reporting import write_dq_report
+from src.sketch import QuantileSketch
+from src.store.layout import iter_standard_batches
+from src.utils import ensure_dir, utc_now_iso
+
+BASELINE_FILE = "baseline.parquet"
+STATE_KEY = b"baseline_state"
+BASELINE_KEYS = ["source", "station_id", "channel", "hour", "season"]
+SEASONS = np.array(
+    ["DJF", "DJF", "MAM", "MAM", "MAM", "JJA", "JJA", "JJA", "SON", "SON", "SON", "DJF"]
+)
+QUANTILE_COLUMNS = {"p05": 0.05, "p25": 0.25, "p50": 0.5, "p75": 0.75, "p95": 0.95}
+
+
+def baseline_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    cfg = config.get("baseline", {}) or {}
+    return {
+        "sources": [str(item) for item in cfg.get("sources", ["geomag", "aef", "seismic"])],
+        "sketch_k": int(cfg.get("sketch_k", 200)),
+        "min_count": int(cfg.get("min_count", 30)),
+        "full_rebuild": bool(cfg.get("full_rebuild", False)),
+        "statistic": str(cfg.get("statistic", "moments")),
+    }
+
+
+def baseline_time_keys(ts_ms: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    ts = pd.to_datetime(ts_ms.to_numpy(dtype="int64"), unit="ms", utc=True)
+    return ts.hour.to_numpy(), SEASONS[ts.month.to_numpy() - 1]
+
+
+def _merge_moments(
+    entry: Dict[str, Any], count: int, mean: float, m2: float, low: float, high: float
+) -> None:
+    total = entry["count"] + count
+    delta = mean - entry["mean"]
+    entry["mean"] += delta * count / total
+    entry["m2"] += m2 + delta * delta * entry["count"] * count / total
+    entry["count"] = total
+    entry["min"] = min(entry["min"], low)
+    entry["max"] = max(entry["max"], high)
+
+
+def _load_state(
+    baseline_dir: Path, settings: Dict[str, Any]
+) -> Tuple[Dict[tuple, Dict[str, Any]], Dict[str, Any]]:
+    table_path = baseline_dir / BASELINE_FILE
+    if settings["full_rebuild"] or not table_path.exists():
+        return {}, {}
+    metadata = pq.read_schema(table_path).metadata or {}
+    if STATE_KEY not in metadata:
+        return {}, {}
+    state = json.loads(metadata[STATE_KEY])
+    if int(state.get("sketch_k", 0)) != settings["sketch_k"]:
+        return {}, {}
+    entries: Dict[tuple, Dict[str, Any]] = {}
+    for record in pd.read_parquet(table_path).to_dict(orient="records"):
+        key = tuple(record[col] for col in BASELINE_KEYS)
+        entries[key] = {
+            "count": int(record["count"]),
+            "mean": float(record["mean"]),
+            "m2": float(record["m2"]),
+            "min": float(record["min"]),
+            "max": float(record["max"]),
+            "sketch": QuantileSketch.from_record(record, settings["sketch_k"]),
+        }
+    return entries, state.get("watermarks", {})
+
+
+def _accumulate(
+    entries: Dict[tuple, Dict[str, Any]], df: pd.DataFrame, source: str, sketch_k: int
+) -> int:
+    df = df[["ts_ms", "station_id", "channel", "value"]].copy()
+    df["value"] = pd.to_numeric(df["value"], errors="coerce")
+    df = df.dropna(subset=["ts_ms", "channel", "value"])
+    if df.empty:
+        return 0
+    df["station_id"] = df["station_id"].astype(str)
+    df["hour"], df["season"] = baseline_time_keys(df["ts_ms"])
+    grouped = df.groupby(["station_id", "channel", "hour", "season"], sort=False)["value"]
+    moments = grouped.agg(count="count", mean="mean", var="var", min="min", max="max")
+    moments["m2"] = moments["var"].fillna(0.0) * (moments["count"] - 1)
+    values = df["value"].to_numpy(dtype=float)
+    for (station_id, channel, hour, season), row in moments.iterrows():
+        key = (source, station_id, channel, int(hour), season)
+        entry = entries.get(key)
+        if entry is None:
+            entry = {
+                "count": 0,
+                "mean": 0.0,
+                "m2": 0.0,
+                "min": np.inf,
+                "max": -np.inf,
+                "sketch": QuantileSketch(sketch_k),
+            }
+            entries[key] = entry
+        _merge_moments(
+            entry,
+            int(row["count"]),
+            float(row["mean"]),
+            float(row["m2"]),
+            float(row["min"]),
+            float(row["max"]),
+        )
+    for (station_id, channel, hour, season), positions in grouped.indices.items():
+        key = (source, station_id, channel, int(hour), season)
+        entries[key]["sketch"].update(values[positions])
+    return int(len(df))
+
+
+def _station_ids(source_dir: Path) -> List[str]:
+    return sorted(
+        path.name.split("=", 1)[1]
+        for path in source_dir.glob("station_id=*")
+        if path.is_dir()
+    )
+
+
+def _entries_frame(entries: Dict[tuple, Dict[str, Any]]) -> pd.DataFrame:
+    records = []
+    for key, entry in entries.items():
+        record = dict(zip(BASELINE_KEYS, key))
+        count = entry["count"]
+        record.update(
+            {
+                "count": count,
+                "mean": entry["mean"],
+                "std": float(np.sqrt(entry["m2"] / (count - 1))) if count > 1 else np.nan,
+                "m2": entry["m2"],
+                "min": entry["min"],
+                "max": entry["max"],
+            }
+        )
+        quantiles = entry["sketch"].quantiles(list(QUANTILE_COLUMNS.values()))
+        record.update(dict(zip(QUANTILE_COLUMNS.keys(), quantiles.tolist())))
+        record["mad"] = entry["sketch"].mad()
+        record.update(entry["sketch"].to_record())
+        records.append(record)
+    frame = pd.DataFrame.from_records(records)
+    if frame.empty:
+        return frame
+    frame["hour"] = frame["hour"].astype("int8")
+    return frame.sort_values(BASELINE_KEYS, kind="stable").reset_index(drop=True)
+
+
+def load_baseline(
+    baseline_dir: Path, hour: Optional[int] = None, season: Optional[str] = None
+) -> pd.DataFrame:
+    path = baseline_dir / BASELINE_FILE
+    columns = BASELINE_KEYS + ["count", "mean", "std", "min", "max", "mad"] + list(QUANTILE_COLUMNS)
+    if not path.exists():
+        return pd.DataFrame(columns=columns)
+    filters = None
+    if hour is not None:
+        filters = ds.field("hour") == int(hour)
+    if season is not None:
+        season_filter = ds.field("season") == str(season)
+        filters = season_filter if filters is None else filters & season_filter
+    table = ds.dataset(path, format="parquet").to_table(columns=columns, filter=filters)
+    return table.to_pandas()
+
+
+def run_baseline(
+    base_dir: Path,
+    config: Dict[str, Any],
+    output_paths,
+    run_id: str,
+    params_hash: str,
+    strict: bool,
+    event_id: str | None,
+) -> None:
+    settings = baseline_settings(config)
+    baseline_dir = output_paths.baseline
+    entries, watermarks = _load_state(baseline_dir, settings)
+    incremental = bool(entries)
+    scanned: Dict[str, Dict[str, int]] = {}
+    for source in settings["sources"]:
+        source_dir = output_paths.standard / f"source={source}"
+        if not source_dir.exists():
+            continue
+        source_marks = watermarks.setdefault(source, {})
+        rows = 0
+        for station_id in _station_ids(source_dir):
+            filters = ds.field("station_id") == station_id
+            mark = source_marks.get(station_id)
+            if mark is not None:
+                filters = filters & (ds.field("ts_ms") > int(mark))
+            batches = iter_standard_batches(
+                source_dir, filters=filters, columns=["ts_ms", "station_id", "channel", "value"]
+            )
+            for df in batches:
+                rows += _accumulate(entries, df, source, settings["sketch_k"])
+                mark = max(int(df["ts_ms"].max()), int(mark or 0))
+            if mark is not None:
+                source_marks[station_id] = mark
+        scanned[source] = {"rows": rows, "stations": len(source_marks)}
+
+    frame = _entries_frame(entries)
+    state = {"watermarks": watermarks, "sketch_k": settings["sketch_k"], "updated_utc": utc_now_iso()}
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), STATE_KEY: json.dumps(state)})
+    ensure_dir(baseline_dir)
+    staged = baseline_dir / f".{BASELINE_FILE}.tmp"
+    pq.write_table(table, staged)
+    os.replace(staged, baseline_dir / BASELINE_FILE)
+
+    report = {
+        "incremental": incremental,
+        "sources": scanned,
+        "baseline_rows": int(len(frame)),
+        "sketch_k": settings["sketch_k"],
+        "below_min_count": int((frame["count"] < settings["min_count"]).sum()) if not frame.empty else 0,
+    }
+    write_dq_report(output_paths.reports / "dq_baseline.json", report)
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import os
+import warnings
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from src.utils import ensure_dir, utc_now_iso
+
+STORE_KEYS = ["event_id", "source", "station_id", "channel", "feature", "params_hash"]
+VECTORS_FILE = "_vectors.parquet"
+VECTOR_KEYS = ["event_id", "params_hash", "updated_utc"]
+
+
+def _write_atomic(df: pd.DataFrame, path: Path) -> None:
+    ensure_dir(path.parent)
+    staged = path.parent / f".{path.name}.tmp"
+    df.to_parquet(staged, index=False)
+    os.replace(staged, path)
+
+
+def _vector_row(rows: pd.DataFrame) -> pd.DataFrame:
+    names = rows["source"].astype(str)
+    for col in ["station_id", "channel", "feature"]:
+        names = names + "/" + rows[col].astype(str)
+    values = pd.to_numeric(rows["value"], errors="coerce")
+    return values.groupby(names.to_numpy(), sort=True).mean().to_frame().T.reset_index(drop=True)
+
+
+def update_feature_store(
+    store_dir: Path, features_df: pd.DataFrame, event_id: str, params_hash: str
+) -> Dict[str, int]:
+    rows = features_df[["source", "station_id", "channel", "feature", "value"]].copy()
+    rows["params_hash"] = params_hash
+    rows["value"] = pd.to_numeric(rows["value"], errors="coerce")
+    _write_atomic(rows, store_dir / f"event_id={event_id}" / f"part-{params_hash}.parquet")
+
+    vector = _vector_row(rows)
+    vector.insert(0, "updated_utc", utc_now_iso())
+    vector.insert(0, "params_hash", params_hash)
+    vector.insert(0, "event_id", event_id)
+    vectors_path = store_dir / VECTORS_FILE
+    if vectors_path.exists():
+        vectors = pd.read_parquet(vectors_path)
+        keep = ~((vectors["event_id"] == event_id) & (vectors["params_hash"] == params_hash))
+        vectors = pd.concat([vectors[keep], vector], ignore_index=True)
+    else:
+        vectors = vector
+    _write_atomic(vectors, vectors_path)
+    return {"store_rows": int(len(rows)), "store_vectors": int(len(vectors))}
+
+
+def read_feature_store(store_dir: Path, event_id: Optional[str] = None) -> pd.DataFrame:
+    if not store_dir.exists() or not any(store_dir.glob("event_id=*")):
+        return pd.DataFrame(columns=STORE_KEYS + ["value"])
+    filters = ds.field("event_id") == event_id if event_id is not None else None
+    dataset = ds.dataset(store_dir, format="parquet", partitioning="hive")
+    return dataset.to_table(filter=filters).to_pandas()
+
+
+class FeatureIndex:
+    def __init__(self, vectors: pd.DataFrame) -> None:
+        vectors = vectors.sort_values("updated_utc", kind="stable").reset_index(drop=True)
+        self.keys = vectors[VECTOR_KEYS].copy()
+        self.columns = [col for col in vectors.columns if col not in VECTOR_KEYS]
+        self.values = vectors[self.columns].to_numpy(dtype=float)
+        self._normalized: Dict[Optional[str], Tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def load(cls, store_dir: Path) -> "FeatureIndex":
+        path = store_dir / VECTORS_FILE
+        if not path.exists():
+            return cls(pd.DataFrame(columns=VECTOR_KEYS))
+        return cls(pd.read_parquet(path))
+
+    def _candidates(self, params_hash: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+        cached = self._normalized.get(params_hash)
+        if cached is not None:
+            return cached
+        keys = self.keys
+        if params_hash is not None:
+            rows = np.flatnonzero((keys["params_hash"] == params_hash).to_numpy())
+        else:
+            rows = np.flatnonzero((~keys["event_id"].duplicated(keep="last")).to_numpy())
+        matrix = self.values[rows]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            center = np.nanmean(matrix, axis=0)
+            spread = np.nanstd(matrix, axis=0)
+        spread = np.where((spread > 0) & np.isfinite(spread), spread, 1.0)
+        cached = (rows, (matrix - center) / spread)
+        self._normalized[params_hash] = cached
+        return cached
+
+    def similar(
+        self, event_id: str, k: int = 10, params_hash: Optional[str] = None, min_overlap: int = 1
+    ) -> pd.DataFrame:
+        rows, normalized = self._candidates(params_hash)
+        event_ids = self.keys["event_id"].to_numpy()[rows]
+        hits = np.flatnonzero(event_ids == event_id)
+        if hits.size == 0:
+            raise KeyError(event_id)
+        query = normalized[hits[-1]]
+        present = ~np.isnan(query)
+        diff = normalized[:, present] - query[present]
+        shared = ~np.isnan(diff)
+        diff[~shared] = 0.0
+        overlap = shared.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            distance = np.sqrt((diff * diff).sum(axis=1) / overlap)
+        valid = (event_ids != event_id) & (overlap >= max(int(min_overlap), 1))
+        positions = np.flatnonzero(valid)
+        order = positions[np.lexsort((-overlap[positions], distance[positions]))][: max(int(k), 0)]
+        result = self.keys.iloc[rows[order]].reset_index(drop=True)
+        result["distance"] = distance[order]
+        result["overlap"] = overlap[order]
+        return result
@@ -1,38 +1,288 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Optional
 
 import numpy as np
 import pandas as pd
 
 from src.config import get_event
-from src.store.parquet import read_parquet
+from src.pipeline.feature_store import update_feature_store
+from src.store.matrix import AlignedMatrix, build_aligned_matrix, load_aligned_matrix
 from src.utils import ensure_dir, write_json
 
 
-def _gradient_stats(group: pd.DataFrame) -> Optional[Tuple[float, float]]:
-    subset = group[["ts_ms", "value"]].dropna().sort_values("ts_ms")
-    if len(subset) < 2:
+GROUP_COLS = ["source", "station_id", "channel"]
+BASE_FEATURES = ["mean", "std", "variance", "min", "max", "peak", "rms", "count"]
+EXTRA_FEATURES = ["gradient_abs_mean", "gradient_abs_max", "p_arrival_offset_s", "s_arrival_offset_s"]
+FEATURE_COLUMNS = ["event_id", "source", "station_id", "channel", "feature", "value"]
+
+
+def _gradient_stats(df: pd.DataFrame) -> Optional[pd.DataFrame]:
+    subset = df[df["source"] == "geomag"]
+    if subset.empty:
         return None
-    dt_s = subset["ts_ms"].diff() / 1000.0
-    dv = subset["value"].diff()
+    grouped = subset.groupby(GROUP_COLS, sort=False)
+    dt_s = grouped["ts_ms"].diff() / 1000.0
+    dv = grouped["value"].diff()
     valid = dt_s > 0
-    if valid.sum() == 0:
-        return None
     grad = (dv[valid] / dt_s[valid]).abs()
-    if grad.empty:
-        return None
-    return float(grad.mean()), float(grad.max())
+    keys = subset.loc[valid, GROUP_COLS]
+    return grad.groupby([keys[col] for col in GROUP_COLS], sort=False).agg(
+        gradient_abs_mean="mean", gradient_abs_max="max"
+    )
 
 
-def _arrival_offset_s(group: pd.DataFrame, origin_ms: int) -> Optional[float]:
-    subset = group.dropna(subset=["ts_ms", "value"]).sort_values("ts_ms")
+def _arrival_offsets(df: pd.DataFrame, origin_ms: int) -> Optional[pd.DataFrame]:
+    subset = df[df["source"] == "seismic"]
     if subset.empty:
         return None
-    idx = subset["value"].astype(float).idxmax()
-    ts_ms = int(subset.loc[idx, "ts_ms"])
-    return (ts_ms - origin_ms) / 1000.0
+    peak_idx = subset.groupby(GROUP_COLS, sort=False)["value"].idxmax()
+    offset_s = (subset.loc[peak_idx.to_numpy(), "ts_ms"].to_numpy() - origin_ms) / 1000.0
+    channels = peak_idx.index.get_level_values("channel").astype(str)
+    offsets = pd.DataFrame(index=peak_idx.index)
+    offsets["p_arrival_offset_s"] = np.where(channels.str.endswith("_rms"), offset_s, np.nan)
+    offsets["s_arrival_offset_s"] = np.where(channels.str.endswith("_mean_abs"), offset_s, np.nan)
+    return offsets
+
+
+def _extract_features(aligned_df: pd.DataFrame, event_id: str, origin_ms: int) -> pd.DataFrame:
+    df = aligned_df[GROUP_COLS + ["ts_ms", "value"]].copy()
+    df["value"] = pd.to_numeric(df["value"], errors="coerce").astype(float)
+    df = df.dropna(subset=GROUP_COLS + ["ts_ms", "value"])
+    if df.empty:
+        return pd.DataFrame(columns=FEATURE_COLUMNS)
+    df = df.sort_values(GROUP_COLS + ["ts_ms"], kind="stable").reset_index(drop=True)
+    df["value_sq"] = df["value"] ** 2
+
+    grouped = df.groupby(GROUP_COLS, sort=False)
+    wide = grouped["value"].agg(
+        mean="mean", std="std", variance="var", min="min", max="max", count="count"
+    )
+    wide["peak"] = wide["max"]
+    wide["rms"] = np.sqrt(grouped["value_sq"].mean())
+    for extra in (_gradient_stats(df), _arrival_offsets(df, origin_ms)):
+        if extra is not None:
+            wide = wide.join(extra)
+    wide = wide.reindex(columns=BASE_FEATURES + EXTRA_FEATURES)
+
+    n_groups = len(wide)
+    n_features = len(wide.columns)
+    keys = wide.index.to_frame(index=False)
+    long_df = pd.DataFrame(
+        {
+            "event_id": event_id,
+            "source": np.repeat(keys["source"].to_numpy(), n_features),
+            "station_id": np.repeat(keys["station_id"].to_numpy(), n_features),
+            "channel": np.repeat(keys["channel"].to_numpy(), n_features),
+            "feature": np.tile(np.array(wide.columns, dtype=object), n_groups),
+            "value": wide.to_numpy(dtype=float).ravel(),
+        }
+    )
+    keep = long_df["feature"].isin(BASE_FEATURES) | long_df["value"].notna()
+    return long_df[keep].reset_index(drop=True)
+
+
+ROLLING_COLUMNS = [
+    "ts_ms",
+    "source",
+    "station_id",
+    "channel",
+    "rolling_mean",
+    "rolling_std",
+    "rolling_rms",
+    "rolling_median",
+    "rolling_gradient_abs",
+    "rolling_zscore",
+    "rolling_count",
+]
+
+
+def _window_sum(cumulative: np.ndarray, window: int) -> np.ndarray:
+    padded = np.vstack([np.zeros((1, cumulative.shape[1])), cumulative])
+    upper = padded[1:]
+    lower = padded[np.maximum(np.arange(1, len(padded)) - window, 0)]
+    return upper - lower
+
+
+def _rolling_features(matrix: AlignedMatrix, window_minutes: float) -> pd.DataFrame:
+    if matrix.empty or len(matrix.ts_ms) < 2:
+        return pd.DataFrame(columns=ROLLING_COLUMNS)
+    ts_ms = np.asarray(matrix.ts_ms, dtype="int64")
+    step_ms = int(ts_ms[1] - ts_ms[0])
+    window = max(int(round(window_minutes * 60_000 / step_ms)), 1)
+    min_periods = max(window // 2, 2) if window > 1 else 1
+    values = np.asarray(matrix.values, dtype=float)
+    observed = ~np.asarray(matrix.mask)
+    # Cumulative sums are taken around each column's first observed value so that a large DC level
+    # (e.g. ~50000 nT) does not cancel out the variance.
+    first = np.argmax(observed, axis=0)
+    reference = np.where(observed.any(axis=0), values[first, np.arange(values.shape[1])], 0.0)
+    filled = np.where(observed, values - reference, 0.0)
+
+    count = _window_sum(np.cumsum(observed, axis=0, dtype=float), window)
+    total = _window_sum(np.cumsum(filled, axis=0), window)
+    total_sq = _window_sum(np.cumsum(filled**2, axis=0), window)
+    grad = np.abs(np.diff(values, axis=0, prepend=np.nan)) / (step_ms / 1000.0)
+    grad_observed = ~np.isnan(grad)
+    grad_count = _window_sum(np.cumsum(grad_observed, axis=0, dtype=float), window)
+    grad_total = _window_sum(np.cumsum(np.where(grad_observed, grad, 0.0), axis=0), window)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        offset = total / count
+        variance = (total_sq - count * offset**2) / (count - 1)
+        std = np.sqrt(np.clip(variance, 0.0, None))
+        mean = offset + reference
+        rms = np.sqrt(np.clip(mean**2 + total_sq / count - offset**2, 0.0, None))
+        gradient = grad_total / grad_count
+        zscore = np.where(std > 0, (values - mean) / std, np.nan)
+    median = (
+        pd.DataFrame(values)
+        .rolling(window, min_periods=min_periods)
+        .median()
+        .to_numpy()
+    )
+
+    valid = count >= min_periods
+    bins, cols = np.nonzero(valid)
+    columns = matrix.columns
+    return pd.DataFrame(
+        {
+            "ts_ms": ts_ms[bins],
+            "source": columns["source"].to_numpy()[cols],
+            "station_id": columns["station_id"].to_numpy()[cols],
+            "channel": columns["channel"].to_numpy()[cols],
+            "rolling_mean": mean[bins, cols],
+            "rolling_std": std[bins, cols],
+            "rolling_rms": rms[bins, cols],
+            "rolling_median": median[bins, cols],
+            "rolling_gradient_abs": gradient[bins, cols],
+            "rolling_zscore": zscore[bins, cols],
+            "rolling_count": count[bins, cols].astype("int64"),
+        }
+    ).sort_values(["source", "station_id", "channel", "ts_ms"], kind="stable").reset_index(drop=True)
+
+
+SPECTRAL_DEFAULTS = {
+    "window": "hann",
+    "min_points": 16,
+    "bands_hz": {
+        "geomag": {"pc3": [0.022, 0.1], "pc4": [0.0067, 0.022], "pc5": [0.00167, 0.0067]},
+    },
+}
+
+
+def _spectral_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    settings = dict(SPECTRAL_DEFAULTS)
+    settings.update(config.get("features", {}).get("spectral", {}) or {})
+    return settings
+
+
+def _effective_bands(bands_hz: Dict[str, Dict[str, Any]], nyquist: float) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for source, bands in (bands_hz or {}).items():
+        for name, (low, high) in bands.items():
+            low, high = float(low), float(high)
+            entry: Dict[str, Any] = {"requested_hz": [low, high]}
+            if low >= nyquist:
+                entry["status"] = "skipped"
+            else:
+                entry["effective_hz"] = [low, min(high, nyquist)]
+                entry["status"] = "clipped" if high > nyquist else "full"
+            result.setdefault(source, {})[name] = entry
+    return result
+
+
+def _spectral_band_metadata(matrix: AlignedMatrix, settings: Dict[str, Any]) -> Dict[str, Any]:
+    if len(matrix.ts_ms) < 2:
+        return {}
+    nyquist = 500.0 / float(matrix.ts_ms[1] - matrix.ts_ms[0])
+    return {"nyquist_hz": nyquist, "bands": _effective_bands(settings.get("bands_hz"), nyquist)}
+
+
+def _spectral_features(matrix: AlignedMatrix, event_id: str, settings: Dict[str, Any]) -> pd.DataFrame:
+    if matrix.empty or len(matrix.ts_ms) < 2:
+        return pd.DataFrame(columns=FEATURE_COLUMNS)
+    observed = ~np.asarray(matrix.mask)
+    counts = observed.sum(axis=0)
+    keep = np.flatnonzero(counts >= int(settings.get("min_points", 16)))
+    if keep.size == 0:
+        return pd.DataFrame(columns=FEATURE_COLUMNS)
+    values = np.asarray(matrix.values, dtype=float)[:, keep]
+    observed = observed[:, keep]
+    n_bins = values.shape[0]
+    fs = 1000.0 / float(matrix.ts_ms[1] - matrix.ts_ms[0])
+
+    means = np.nanmean(values, axis=0)
+    block = np.where(observed, values - means, 0.0)
+    window = np.ones(n_bins) if settings.get("window") == "boxcar" else np.hanning(n_bins)
+    n_fft = 1 << max(int(n_bins - 1).bit_length(), 1)
+    spectrum = np.fft.rfft(block * window[:, None], n=n_fft, axis=0)
+    freqs = np.fft.rfftfreq(n_fft, d=1.0 / fs)
+    psd = np.abs(spectrum) ** 2 / (fs * float(np.sum(window**2)))
+    psd[1:-1] *= 2.0
+    psd *= n_bins / counts[keep]
+    df_hz = freqs[1] - freqs[0]
+
+    positive = freqs > 0
+    pos_freqs = freqs[positive]
+    pos_psd = psd[positive]
+    dominant = pos_freqs[np.argmax(pos_psd, axis=0)]
+    log_f = np.log10(pos_freqs)
+    with np.errstate(divide="ignore"):
+        log_p = np.log10(pos_psd)
+    finite = np.isfinite(log_p)
+    weights = finite.astype(float)
+    log_p = np.where(finite, log_p, 0.0)
+    n_fit = weights.sum(axis=0)
+    sum_x = log_f @ weights
+    sum_y = log_p.sum(axis=0)
+    sum_xx = (log_f**2) @ weights
+    sum_xy = log_f @ log_p
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (n_fit * sum_xy - sum_x * sum_y) / (n_fit * sum_xx - sum_x**2)
+
+    columns = matrix.columns.iloc[keep].reset_index(drop=True)
+    features = {"dominant_freq_hz": dominant, "spectral_slope": slope}
+    nyquist = fs / 2.0
+    sources = columns["source"].to_numpy()
+    for source, bands in _effective_bands(settings.get("bands_hz"), nyquist).items():
+        in_source = sources == source
+        if not in_source.any():
+            continue
+        for name, entry in bands.items():
+            if entry["status"] == "skipped":
+                continue
+            low, high = entry["effective_hz"]
+            upper = freqs <= high if entry["status"] == "clipped" else freqs < high
+            band = (freqs >= low) & upper
+            power = np.full(len(keep), np.nan)
+            power[in_source] = psd[band][:, in_source].sum(axis=0) * df_hz
+            features[f"band_power_{name}"] = power
+
+    names = list(features)
+    stacked = np.column_stack([features[name] for name in names])
+    long_df = pd.DataFrame(
+        {
+            "event_id": event_id,
+            "source": np.repeat(sources, len(names)),
+            "station_id": np.repeat(columns["station_id"].to_numpy(), len(names)),
+            "channel": np.repeat(columns["channel"].to_numpy(), len(names)),
+            "feature": np.tile(np.array(names, dtype=object), len(keep)),
+            "value": stacked.ravel(),
+        }
+    )
+    return long_df[long_df["value"].notna()].reset_index(drop=True)
+
+
+def _load_matrix(linked_dir: Path, aligned_df: pd.DataFrame, config: Dict[str, Any]) -> AlignedMatrix:
+    matrix = load_aligned_matrix(linked_dir)
+    if matrix is not None:
+        return matrix
+    interval = config.get("time", {}).get("align_interval", "1min")
+    interval_ms = int(pd.Timedelta(interval).total_seconds() * 1000)
+    ts = aligned_df["ts_ms"] if not aligned_df.empty else pd.Series([0], dtype="int64")
+    return build_aligned_matrix(aligned_df, int(ts.min()), int(ts.max()), interval_ms)
 
 
 def run_features(
@@ -54,96 +304,35 @@ def run_features(
         raise FileNotFoundError(f"Aligned parquet not found: {aligned_path}")
 
     aligned_df = pd.read_parquet(aligned_path)
-    if aligned_df.empty:
-        features_df = pd.DataFrame()
-    else:
-        aligned_df["value"] = pd.to_numeric(aligned_df["value"], errors="coerce")
-        feature_records: List[Dict[str, Any]] = []
-        group_cols = ["source", "station_id", "channel"]
-        for (source, station_id, channel), group in aligned_df.groupby(group_cols):
-            values = group["value"].dropna().astype(float)
-            if values.empty:
-                continue
-            stats = {
-                "mean": float(values.mean()),
-                "std": float(values.std()),
-                "variance": float(values.var()),
-                "min": float(values.min()),
-                "max": float(values.max()),
-                "peak": float(values.max()),
-                "rms": float(np.sqrt(np.mean(values**2))),
-                "count": int(values.count()),
-            }
-            for feature, value in stats.items():
-                feature_records.append(
-                    {
-                        "event_id": event_id,
-                        "source": source,
-                        "station_id": station_id,
-                        "channel": channel,
-                        "feature": feature,
-                        "value": value,
-                    }
-                )
-            if source == "geomag":
-                grad_stats = _gradient_stats(group)
-                if grad_stats is not None:
-                    grad_mean, grad_max = grad_stats
-                    for feature, value in {
-                        "gradient_abs_mean": grad_mean,
-                        "gradient_abs_max": grad_max,
-                    }.items():
-                        feature_records.append(
-                            {
-                                "event_id": event_id,
-                                "source": source,
-                                "station_id": station_id,
-                                "channel": channel,
-                                "feature": feature,
-                                "value": value,
-                            }
-                        )
-            if source == "seismic":
-                if channel.endswith("_rms"):
-                    offset = _arrival_offset_s(group, origin_ms)
-                    if offset is not None:
-                        feature_records.append(
-                            {
-                                "event_id": event_id,
-                                "source": source,
-                                "station_id": station_id,
-                                "channel": channel,
-                                "feature": "p_arrival_offset_s",
-                                "value": offset,
-                            }
-                        )
-                if channel.endswith("_mean_abs"):
-                    offset = _arrival_offset_s(group, origin_ms)
-                    if offset is not None:
-                        feature_records.append(
-                            {
-                                "event_id": event_id,
-                                "source": source,
-                                "station_id": station_id,
-                                "channel": channel,
-                                "feature": "s_arrival_offset_s",
-                                "value": offset,
-                            }
-                        )
-        features_df = pd.DataFrame.from_records(feature_records)
+    features_df = _extract_features(aligned_df, event_id, origin_ms)
+    window_minutes = float(config.get("features", {}).get("rolling_window_minutes", 30))
+    matrix = _load_matrix(linked_dir, aligned_df, config)
+    rolling_df = _rolling_features(matrix, window_minutes)
+    rolling_df.insert(0, "event_id", event_id)
+    spectral_settings = _spectral_settings(config)
+    spectral_df = _spectral_features(matrix, event_id, spectral_settings)
+    if not spectral_df.empty:
+        features_df = pd.concat([features_df, spectral_df], ignore_index=True)
 
     features_dir = output_paths.features / event_id
     ensure_dir(features_dir)
     if not features_df.empty:
         features_df.to_parquet(features_dir / "features.parquet", index=False)
     else:
-        pd.DataFrame(
-            columns=["event_id", "source", "station_id", "channel", "feature", "value"]
-        ).to_parquet(features_dir / "features.parquet", index=False)
+        pd.DataFrame(columns=FEATURE_COLUMNS).to_parquet(features_dir / "features.parquet", index=False)
+
+    rolling_df.to_parquet(features_dir / "rolling.parquet", index=False)
+    store_stats = update_feature_store(output_paths.feature_store, features_df, event_id, params_hash)
 
     summary = {
         "event_id": event_id,
         "feature_rows": int(len(features_df)),
+        "rolling_rows": int(len(rolling_df)),
+        "rolling_window_minutes": window_minutes,
+        "spectral_rows": int(len(spectral_df)),
+        "spectral_bands": _spectral_band_metadata(matrix, spectral_settings),
+        "params_hash": params_hash,
+        **store_stats,
         "sources": features_df["source"].value_counts().to_dict() if not features_df.empty else {},
     }
     write_json(features_dir / "summary.json", summary)
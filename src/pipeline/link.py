@@ -8,9 +8,10 @@ import numpy as np
 import pandas as pd
 import pyarrow.dataset as ds
 
-from src.config import get_event
-from src.pipeline.spatial import haversine_km
-from src.store.parquet import read_parquet_filtered
+from src.config import get_event, load_event_catalog
+from src.pipeline.spatial import SpatialIndex, load_spatial_index
+from src.store.layout import iter_standard_batches, read_station_locations
+from src.store.matrix import build_aligned_matrix, write_aligned_matrix
 from src.utils import ensure_dir, write_json
 
 
@@ -18,75 +19,170 @@ def _align_ts(ts_ms: pd.Series, interval_ms: int) -> pd.Series:
     return (ts_ms // interval_ms) * interval_ms
 
 
-def _filter_by_distance(df: pd.DataFrame, lat: float, lon: float, radius_km: float) -> pd.DataFrame:
-    if df.empty or df["lat"].isna().all():
-        return df
-    distances = df.apply(lambda row: haversine_km(lat, lon, row["lat"], row["lon"]), axis=1)
+LINK_SOURCES = ["geomag", "aef", "seismic", "vlf"]
+AGGREGATE_STATS = ["mean", "min", "max", "std", "count", "last"]
+BIN_KEYS = ["event_id", "source", "station_id", "channel", "ts_ms"]
+
+
+def _resolve_align_strategy(config: Dict[str, Any], source: str) -> str:
+    strategies = config.get("time", {}).get("align_strategy", {}) or {}
+    read_mode = (config.get("paths", {}).get(source, {}) or {}).get("read_mode")
+    for key in ([f"{source}_{str(read_mode).lower()}"] if read_mode else []) + [source]:
+        if key in strategies:
+            return str(strategies[key]).lower()
+    return "floor"
+
+
+def _aggregate_bins(df: pd.DataFrame, stats: List[str]) -> pd.DataFrame:
+    keys = [col for col in BIN_KEYS if col in df.columns]
+    df = df.assign(value=pd.to_numeric(df["value"], errors="coerce"))
+    spec = {"value": ("value", "mean")}
+    for stat in stats:
+        if stat != "mean":
+            spec[f"value_{stat}"] = ("value", stat)
+    for col in df.columns:
+        if col not in keys and col != "value":
+            spec[col] = (col, "last")
+    aggregated = df.groupby(keys, sort=True, dropna=False).agg(**spec).reset_index()
+    if "value_count" in aggregated.columns:
+        aggregated["value_count"] = aggregated["value_count"].astype("int64")
+    ordered = [col for col in df.columns if col in aggregated.columns]
+    return aggregated[ordered + [col for col in aggregated.columns if col not in ordered]]
+
+
+def _link_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    window_cfg = config.get("time", {}).get("event_window", {})
+    link_cfg = config.get("link", {}) or {}
+    interval = config.get("time", {}).get("align_interval", "1min")
+    return {
+        "pre_hours": float(window_cfg.get("pre_hours", 72)),
+        "post_hours": float(window_cfg.get("post_hours", 24)),
+        "interval": interval,
+        "interval_ms": int(pd.Timedelta(interval).total_seconds() * 1000),
+        "radius_km": float(link_cfg.get("spatial_km", 200)),
+        "require_location": bool(link_cfg.get("require_station_location", False)),
+        "strategies": {source: _resolve_align_strategy(config, source) for source in LINK_SOURCES},
+        "aggregate_stats": [
+            str(stat).lower()
+            for stat in (config.get("time", {}).get("aggregate_stats") or AGGREGATE_STATS)
+            if str(stat).lower() in AGGREGATE_STATS
+        ],
+    }
+
+
+def _event_window(event: Dict[str, Any], settings: Dict[str, Any]) -> tuple:
+    origin = pd.Timestamp(event["origin_time_utc"])
+    start = origin - pd.Timedelta(hours=settings["pre_hours"])
+    end = origin + pd.Timedelta(hours=settings["post_hours"])
+    return start, end, int(start.value // 1_000_000), int(end.value // 1_000_000)
+
+
+def _merge_windows(windows: List[tuple]) -> List[List[int]]:
+    order = sorted(range(len(windows)), key=lambda idx: windows[idx][2])
+    groups: List[List[int]] = []
+    group_end = None
+    for idx in order:
+        _, _, start_ms, end_ms = windows[idx]
+        if groups and start_ms <= group_end:
+            groups[-1].append(idx)
+            group_end = max(group_end, end_ms)
+        else:
+            groups.append([idx])
+            group_end = end_ms
+    return groups
+
+
+def _resolve_batch_events(base_dir: Path, config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    batch_cfg = (config.get("link", {}) or {}).get("batch", {}) or {}
+    catalog_csv = batch_cfg.get("catalog_csv")
+    if catalog_csv:
+        return load_event_catalog(base_dir / catalog_csv)
+    events = config.get("events") or []
+    if not events:
+        raise ValueError("No events configured for batch link.")
+    return list(events)
+
+
+def _nearby_by_event(
+    catalog: SpatialIndex | None,
+    source_path: Path,
+    source: str,
+    events: List[Dict[str, Any]],
+    window_filter: ds.Expression,
+    settings: Dict[str, Any],
+) -> List[pd.DataFrame | None] | None:
+    if catalog is not None and (catalog.stations["source"] == source).any():
+        index = SpatialIndex(catalog.stations[catalog.stations["source"] == source])
+    else:
+        locations = read_station_locations(source_path, filters=window_filter)
+        if settings["require_location"]:
+            locations = locations.dropna(subset=["lat", "lon"])
+        if locations.empty:
+            return None
+        if not locations["lat"].notna().any():
+            return [None] * len(events)
+        index = SpatialIndex(locations)
+    hits = index.query_radius_batch(
+        [event["lat"] for event in events], [event["lon"] for event in events], settings["radius_km"]
+    )
+    hits = hits.assign(station_id=hits["station_id"].astype(str))
+    nearby = []
+    for idx in range(len(events)):
+        event_hits = hits[hits["query_index"] == idx]
+        nearby.append(event_hits.groupby("station_id", as_index=False)["distance_km"].min())
+    return nearby
+
+
+def _route_event_rows(
+    df: pd.DataFrame,
+    ts_sorted: np.ndarray,
+    window: tuple,
+    nearby: pd.DataFrame | None,
+) -> pd.DataFrame:
+    lo = int(np.searchsorted(ts_sorted, window[2], side="left"))
+    hi = int(np.searchsorted(ts_sorted, window[3], side="right"))
+    rows = df.iloc[lo:hi]
+    if nearby is None:
+        return rows
+    rows = rows[rows["station_id"].isin(nearby["station_id"])]
+    return rows.merge(nearby, on="station_id", how="inner")
+
+
+def _finish_source_frame(
+    df: pd.DataFrame, source: str, event: Dict[str, Any], settings: Dict[str, Any]
+) -> tuple:
     df = df.copy()
-    df["distance_km"] = distances
-    return df[df["distance_km"] <= radius_km]
+    if "source" not in df.columns:
+        df["source"] = source
+    if "distance_km" not in df.columns:
+        df["distance_km"] = np.nan
+    df["ts_ms"] = _align_ts(df["ts_ms"], settings["interval_ms"])
+    df["event_id"] = event["event_id"]
+    if settings["strategies"].get(source) == "aggregate":
+        df = _aggregate_bins(df, settings["aggregate_stats"])
 
+    station_stats = (
+        df.groupby("station_id")[["lat", "lon", "elev", "distance_km"]]
+        .agg({"lat": "first", "lon": "first", "elev": "first", "distance_km": "min"})
+        .reset_index()
+    )
+    station_stats["source"] = source
+    station_stats["rows"] = df.groupby("station_id").size().values
+    return df, station_stats.to_dict(orient="records")
 
-def run_link(
-    base_dir: Path,
-    config: Dict[str, Any],
+
+def _write_linked_event(
     output_paths,
-    run_id: str,
+    config: Dict[str, Any],
     params_hash: str,
-    strict: bool,
-    event_id: str | None,
+    event: Dict[str, Any],
+    window: tuple,
+    aligned_frames: List[pd.DataFrame],
+    stations_summary: List[Dict[str, Any]],
+    settings: Dict[str, Any],
 ) -> None:
-    event = get_event(config, event_id)
-    origin = pd.Timestamp(event["origin_time_utc"])
-    pre_hours = float(config.get("time", {}).get("event_window", {}).get("pre_hours", 72))
-    post_hours = float(config.get("time", {}).get("event_window", {}).get("post_hours", 24))
-    start = origin - pd.Timedelta(hours=pre_hours)
-    end = origin + pd.Timedelta(hours=post_hours)
-
-    interval = config.get("time", {}).get("align_interval", "1min")
-    interval_ms = int(pd.Timedelta(interval).total_seconds() * 1000)
-    link_cfg = config.get("link", {}) or {}
-    radius_km = float(link_cfg.get("spatial_km", 200))
-    require_location = bool(link_cfg.get("require_station_location", False))
-
-    sources = ["geomag", "aef", "seismic", "vlf"]
-    aligned_frames = []
-    stations_summary = []
-    start_ms = int(start.value // 1_000_000)
-    end_ms = int(end.value // 1_000_000)
-    for source in sources:
-        source_path = output_paths.standard / f"source={source}"
-        if not source_path.exists():
-            continue
-        filters = (ds.field("ts_ms") >= start_ms) & (ds.field("ts_ms") <= end_ms)
-        df = read_parquet_filtered(source_path, filters=filters)
-        if df.empty:
-            continue
-        if require_location:
-            df = df.dropna(subset=["lat", "lon"])
-            if df.empty:
-                continue
-        df = _filter_by_distance(df, event["lat"], event["lon"], radius_km)
-        if df.empty:
-            continue
-        df = df.copy()
-        if "source" not in df.columns:
-            df["source"] = source
-        if "distance_km" not in df.columns:
-            df["distance_km"] = np.nan
-        df["ts_ms"] = _align_ts(df["ts_ms"], interval_ms)
-        df["event_id"] = event["event_id"]
-        aligned_frames.append(df)
-
-        station_stats = (
-            df.groupby("station_id")[["lat", "lon", "elev", "distance_km"]]
-            .agg({"lat": "first", "lon": "first", "elev": "first", "distance_km": "min"})
-            .reset_index()
-        )
-        station_stats["source"] = source
-        station_stats["rows"] = df.groupby("station_id").size().values
-        stations_summary.extend(station_stats.to_dict(orient="records"))
-
+    start, end, start_ms, end_ms = window
+    interval_ms = settings["interval_ms"]
     aligned_df = pd.concat(aligned_frames, ignore_index=True) if aligned_frames else pd.DataFrame()
     linked_dir = output_paths.linked / event["event_id"]
     ensure_dir(linked_dir)
@@ -98,6 +194,9 @@ def run_link(
             columns=["ts_ms", "source", "station_id", "channel", "value", "lat", "lon", "elev", "quality_flags"]
         ).to_parquet(aligned_path, index=False)
 
+    matrix = build_aligned_matrix(aligned_df, start_ms, end_ms, interval_ms)
+    write_aligned_matrix(matrix, linked_dir)
+
     stations_path = linked_dir / "stations.json"
     write_json(stations_path, {"stations": stations_summary})
 
@@ -128,8 +227,97 @@ def run_link(
         "magnitude": event.get("magnitude"),
         "pipeline_version": config.get("pipeline", {}).get("version", "0.0.0"),
         "params_hash": params_hash,
-        "align_interval": interval,
-        "window": {"pre_hours": pre_hours, "post_hours": post_hours},
-        "spatial_km": radius_km,
+        "align_interval": settings["interval"],
+        "align_strategy": settings["strategies"],
+        "window": {"pre_hours": settings["pre_hours"], "post_hours": settings["post_hours"]},
+        "spatial_km": settings["radius_km"],
     }
     write_json(linked_dir / "event.json", event_payload)
+
+
+def link_events(
+    events: List[Dict[str, Any]],
+    config: Dict[str, Any],
+    output_paths,
+    params_hash: str,
+) -> Dict[str, Any]:
+    settings = _link_settings(config)
+    windows = [_event_window(event, settings) for event in events]
+    groups = _merge_windows(windows)
+    catalog = load_spatial_index(output_paths.reports / "spatial_index")
+    aligned_frames: List[List[pd.DataFrame]] = [[] for _ in events]
+    stations_summary: List[List[Dict[str, Any]]] = [[] for _ in events]
+    scans = 0
+
+    for source in LINK_SOURCES:
+        source_path = output_paths.standard / f"source={source}"
+        if not source_path.exists():
+            continue
+        for group in groups:
+            group_start = min(windows[idx][2] for idx in group)
+            group_end = max(windows[idx][3] for idx in group)
+            filters = (ds.field("ts_ms") >= group_start) & (ds.field("ts_ms") <= group_end)
+            nearby = _nearby_by_event(
+                catalog, source_path, source, [events[idx] for idx in group], filters, settings
+            )
+            if nearby is None:
+                continue
+            active = [pos for pos, item in enumerate(nearby) if item is None or not item.empty]
+            if not active:
+                continue
+            if all(nearby[pos] is not None for pos in active):
+                station_ids = sorted(set().union(*(nearby[pos]["station_id"] for pos in active)))
+                filters = filters & ds.field("station_id").isin(station_ids)
+            routed: Dict[int, List[pd.DataFrame]] = {pos: [] for pos in active}
+            for df in iter_standard_batches(source_path, filters=filters):
+                if settings["require_location"]:
+                    df = df.dropna(subset=["lat", "lon"])
+                    if df.empty:
+                        continue
+                df["station_id"] = df["station_id"].astype(str)
+                df = df.sort_values("ts_ms", kind="stable").reset_index(drop=True)
+                ts_sorted = df["ts_ms"].to_numpy()
+                for pos in active:
+                    rows = _route_event_rows(df, ts_sorted, windows[group[pos]], nearby[pos])
+                    if not rows.empty:
+                        routed[pos].append(rows)
+            scans += 1
+            for pos, parts in routed.items():
+                if not parts:
+                    continue
+                idx = group[pos]
+                rows = pd.concat(parts, ignore_index=True).sort_values("ts_ms", kind="stable")
+                frame, station_records = _finish_source_frame(rows, source, events[idx], settings)
+                aligned_frames[idx].append(frame)
+                stations_summary[idx].extend(station_records)
+
+    for idx, event in enumerate(events):
+        _write_linked_event(
+            output_paths,
+            config,
+            params_hash,
+            event,
+            windows[idx],
+            aligned_frames[idx],
+            stations_summary[idx],
+            settings,
+        )
+    return {"events": len(events), "window_groups": len(groups), "scans": scans}
+
+
+def run_link(
+    base_dir: Path,
+    config: Dict[str, Any],
+    output_paths,
+    run_id: str,
+    params_hash: str,
+    strict: bool,
+    event_id: str | None,
+) -> None:
+    batch_cfg = (config.get("link", {}) or {}).get("batch", {}) or {}
+    if event_id is None and batch_cfg.get("enabled", False):
+        events = _resolve_batch_events(base_dir, config)
+        stats = link_events(events, config, output_paths, params_hash)
+        write_json(output_paths.reports / "link_batch.json", stats)
+        return
+    link_events([get_event(config, event_id)], config, output_paths, params_hash)
@@ -1,15 +1,19 @@
 from __future__ import annotations
 
+import heapq
 import json
 import math
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterator, List, Tuple
 
 import numpy as np
 import pandas as pd
 import yaml
 
 from src.config import get_event
+from src.pipeline.baseline import BASELINE_KEYS, baseline_settings, baseline_time_keys, load_baseline
+from src.store.matrix import AlignedMatrix, load_aligned_matrix
 from src.utils import ensure_dir, write_json
 
 
@@ -24,9 +28,25 @@ def _association_config(config: Dict[str, Any]) -> Dict[str, Any]:
         "min_overlap": int(assoc_cfg.get("min_overlap", 30)),
         "min_points": int(assoc_cfg.get("min_points", 20)),
         "topn_pairs": int(assoc_cfg.get("topn_pairs", 50)),
+        "pair_block_size": int(assoc_cfg.get("pair_block_size", 256)),
+        "workers": int(assoc_cfg.get("workers", 1)),
+        "max_in_flight": int(assoc_cfg.get("max_in_flight", 0)),
+        "changepoint_window_minutes": int(assoc_cfg.get("changepoint_window_minutes", 60)),
+        "changepoint_min_points": int(assoc_cfg.get("changepoint_min_points", 10)),
     }
 
 
+def _matrix_series_map(matrix: AlignedMatrix) -> Dict[Tuple[str, str], pd.Series]:
+    series_map: Dict[Tuple[str, str], pd.Series] = {}
+    for (source, channel), positions in matrix.column_groups(["source", "channel"]).items():
+        values = matrix.combined(positions)
+        observed = ~np.isnan(values)
+        if not observed.any():
+            continue
+        series_map[(source, channel)] = pd.Series(values[observed], index=matrix.ts_ms[observed])
+    return series_map
+
+
 def _series_map(aligned_df: pd.DataFrame) -> Dict[Tuple[str, str], pd.Series]:
     df = aligned_df[["ts_ms", "source", "channel", "value"]].copy()
     df = df.dropna(subset=["ts_ms", "source", "channel"])
@@ -59,21 +79,192 @@ def _zscore_series(series: pd.Series, min_points: int) -> pd.Series | None:
     return (series - mean) / std
 
 
-def _corr_with_lag(
-    series_a: pd.Series, series_b: pd.Series, lag_ms: int, min_overlap: int
-) -> Tuple[float | None, int]:
-    if lag_ms:
-        shifted = series_b.copy()
-        shifted.index = shifted.index + lag_ms
-    else:
-        shifted = series_b
-    joined = pd.concat([series_a, shifted], axis=1, join="inner").dropna()
-    if len(joined) < min_overlap:
-        return None, len(joined)
-    corr = float(np.corrcoef(joined.iloc[:, 0], joined.iloc[:, 1])[0, 1])
-    if not math.isfinite(corr):
-        return None, len(joined)
-    return corr, len(joined)
+def _series_grid(
+    series_list: List[pd.Series], lag_ms: List[int]
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    stamps = np.unique(np.concatenate([s.index.to_numpy(dtype="int64") for s in series_list]))
+    step = int(np.gcd.reduce(np.concatenate([np.diff(stamps), np.asarray(lag_ms, dtype="int64")])))
+    step = step or 60_000
+    length = int((stamps[-1] - stamps[0]) // step) + 1
+    values = np.zeros((len(series_list), length))
+    mask = np.zeros((len(series_list), length))
+    for row, series in enumerate(series_list):
+        observed = series.dropna()
+        pos = (observed.index.to_numpy(dtype="int64") - stamps[0]) // step
+        values[row, pos] = observed.to_numpy(dtype=float)
+        mask[row, pos] = 1.0
+    return values, mask, step
+
+
+def _changepoint_scan(
+    values: np.ndarray,
+    mask: np.ndarray,
+    ts_ms: np.ndarray,
+    origin_ms: int,
+    window_ms: int,
+    min_points: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    n_series = values.shape[0]
+    best_ts = np.full(n_series, -1, dtype="int64")
+    best_score = np.full(n_series, np.nan)
+    candidates = np.flatnonzero(
+        (ts_ms >= origin_ms - window_ms) & (ts_ms <= origin_ms + window_ms)
+    )
+    if candidates.size == 0:
+        return best_ts, best_score
+    total = mask.sum(axis=1, keepdims=True)
+    centered = (values - (values * mask).sum(axis=1, keepdims=True) / np.maximum(total, 1)) * mask
+    scale = np.sqrt((centered**2).sum(axis=1, keepdims=True) / np.maximum(total, 1))
+    zeros = np.zeros((n_series, 1))
+    counts = np.hstack([zeros, np.cumsum(mask, axis=1)])
+    sums = np.hstack([zeros, np.cumsum(centered, axis=1)])
+    squares = np.hstack([zeros, np.cumsum(centered**2, axis=1)])
+    n_pre = counts[:, candidates]
+    n_post = counts[:, -1:] - n_pre
+    s_pre = sums[:, candidates]
+    s_post = sums[:, -1:] - s_pre
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pre_mean = s_pre / n_pre
+        post_mean = s_post / n_post
+        pre_var = (squares[:, candidates] - n_pre * pre_mean**2) / (n_pre - 1)
+        pre_std = np.sqrt(np.clip(pre_var, 0.0, None))
+        pre_std = np.where(pre_std > 1e-9 * scale, pre_std, 1.0)
+        score = np.abs(post_mean - pre_mean) / pre_std
+    valid = (n_pre >= min_points) & (n_post >= min_points) & np.isfinite(score)
+    score = np.where(valid, score, -1.0)
+    best = np.argmax(score, axis=1)
+    found = score[np.arange(n_series), best] >= 0
+    best_ts[found] = ts_ms[candidates[best[found]]]
+    best_score[found] = score[found, best[found]]
+    return best_ts, best_score
+
+
+_WORKER_SPECTRA: Tuple[np.ndarray, ...] | None = None
+
+
+def _series_spectra(values: np.ndarray, mask: np.ndarray) -> Tuple[np.ndarray, ...]:
+    n_fft = 1 << int(2 * values.shape[1] - 1).bit_length()
+    return tuple(
+        np.fft.rfft(arr, n=n_fft, axis=1) for arr in (mask, values * mask, values**2 * mask)
+    )
+
+
+def _correlate_block(
+    spectra: Tuple[np.ndarray, ...], block: np.ndarray, lag_bins: np.ndarray, min_overlap: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    f_m, f_x, f_xx = spectra
+    n_fft = 2 * (f_m.shape[1] - 1)
+    lag_index = np.mod(lag_bins, n_fft)
+    a, b = block[:, 0], block[:, 1]
+
+    def xcorr(f_a: np.ndarray, f_b: np.ndarray) -> np.ndarray:
+        return np.fft.irfft(f_a[a] * np.conj(f_b[b]), n=n_fft, axis=1)[:, lag_index]
+
+    n = np.rint(xcorr(f_m, f_m))
+    sum_a = xcorr(f_x, f_m)
+    sum_b = xcorr(f_m, f_x)
+    sum_aa = xcorr(f_xx, f_m)
+    sum_bb = xcorr(f_m, f_xx)
+    sum_ab = xcorr(f_x, f_x)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var_a = sum_aa - sum_a**2 / n
+        var_b = sum_bb - sum_b**2 / n
+        corr = (sum_ab - sum_a * sum_b / n) / np.sqrt(var_a * var_b)
+    tol = 1e-9 * np.maximum(n, 1.0)
+    valid = (n >= min_overlap) & (var_a > tol) & (var_b > tol) & np.isfinite(corr)
+    score = np.where(valid, np.abs(corr), -1.0)
+    best = np.argmax(score, axis=1)
+    rows = np.arange(len(block))
+    found = score[rows, best] >= 0
+    best_corr = np.where(found, np.clip(corr[rows, best], -1.0, 1.0), np.nan)
+    return block, best_corr, best, n[rows, best].astype("int64")
+
+
+def _init_pair_worker(spectra: Tuple[np.ndarray, ...]) -> None:
+    global _WORKER_SPECTRA
+    _WORKER_SPECTRA = spectra
+
+
+def _pool_correlate_block(args: Tuple[np.ndarray, np.ndarray, int]):
+    block, lag_bins, min_overlap = args
+    return _correlate_block(_WORKER_SPECTRA, block, lag_bins, min_overlap)
+
+
+def _candidate_pairs(
+    mask: np.ndarray,
+    sources: np.ndarray,
+    lag_bins: np.ndarray,
+    min_overlap: int,
+    stats: Dict[str, int],
+) -> Iterator[np.ndarray]:
+    counts = mask.sum(axis=1).astype("int64")
+    observed = mask > 0
+    first = np.argmax(observed, axis=1)
+    last = mask.shape[1] - 1 - np.argmax(observed[:, ::-1], axis=1)
+    lo, hi = int(lag_bins.min()), int(lag_bins.max())
+    for idx_a in range(len(mask) - 1):
+        idx_b = np.arange(idx_a + 1, len(mask))
+        idx_b = idx_b[sources[idx_b] != sources[idx_a]]
+        stats["pairs_total"] += int(len(idx_b))
+        span = (
+            np.minimum(last[idx_a], last[idx_b] + hi)
+            - np.maximum(first[idx_a], first[idx_b] + lo)
+            + 1
+        )
+        bound = np.minimum(np.minimum(counts[idx_a], counts[idx_b]), span)
+        idx_b = idx_b[bound >= min_overlap]
+        if len(idx_b):
+            yield np.column_stack([np.full(len(idx_b), idx_a), idx_b])
+
+
+def _pair_blocks(pairs: Iterator[np.ndarray], block_size: int) -> Iterator[np.ndarray]:
+    pending: List[np.ndarray] = []
+    size = 0
+    for chunk in pairs:
+        pending.append(chunk)
+        size += len(chunk)
+        while size >= block_size:
+            merged = np.concatenate(pending)
+            yield merged[:block_size]
+            rest = merged[block_size:]
+            pending = [rest] if len(rest) else []
+            size = len(rest)
+    if size:
+        yield np.concatenate(pending)
+
+
+def _lagged_correlations(
+    values: np.ndarray,
+    mask: np.ndarray,
+    sources: np.ndarray,
+    lag_bins: np.ndarray,
+    min_overlap: int,
+    stats: Dict[str, int],
+    block_size: int = 256,
+    workers: int = 1,
+    max_in_flight: int = 0,
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    spectra = _series_spectra(values, mask)
+    blocks = _pair_blocks(
+        _candidate_pairs(mask, sources, lag_bins, min_overlap, stats), max(1, block_size)
+    )
+    if workers <= 1:
+        for block in blocks:
+            yield _correlate_block(spectra, block, lag_bins, min_overlap)
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_pair_worker, initargs=(spectra,)
+    ) as executor:
+        limit = max_in_flight if max_in_flight > 0 else 2 * workers
+        in_flight = set()
+        for block in blocks:
+            if len(in_flight) >= limit:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            in_flight.add(executor.submit(_pool_correlate_block, (block, lag_bins, min_overlap)))
+        for future in as_completed(in_flight):
+            yield future.result()
 
 
 def _compute_association(
@@ -83,16 +274,20 @@ def _compute_association(
     params_hash: str,
 ) -> Tuple[Dict[str, Any], pd.DataFrame, pd.DataFrame] | None:
     linked_dir = output_paths.linked / event_id
-    aligned_path = linked_dir / "aligned.parquet"
-    if not aligned_path.exists():
-        return None
-    aligned_df = pd.read_parquet(aligned_path)
-    if aligned_df.empty:
-        return None
+    matrix = load_aligned_matrix(linked_dir)
+    if matrix is not None:
+        series_map = _matrix_series_map(matrix)
+    else:
+        aligned_path = linked_dir / "aligned.parquet"
+        if not aligned_path.exists():
+            return None
+        aligned_df = pd.read_parquet(aligned_path)
+        if aligned_df.empty:
+            return None
+        series_map = _series_map(aligned_df)
     event = get_event(config, event_id)
     origin_ms = int(pd.Timestamp(event["origin_time_utc"]).value // 1_000_000)
     assoc_cfg = _association_config(config)
-    series_map = _series_map(aligned_df)
     if not series_map:
         return None
 
@@ -130,55 +325,107 @@ def _compute_association(
         )
     change_df = pd.DataFrame.from_records(change_rows)
 
+    scan_keys = list(series_map.keys())
+    scan_values, scan_mask, scan_step = _series_grid(
+        [series_map[key] for key in scan_keys], [60_000]
+    )
+    scan_start = min(int(series.index.min()) for series in series_map.values())
+    scan_ts = scan_start + np.arange(scan_values.shape[1], dtype="int64") * scan_step
+    split_ts, split_score = _changepoint_scan(
+        scan_values,
+        scan_mask,
+        scan_ts,
+        origin_ms,
+        assoc_cfg["changepoint_window_minutes"] * 60_000,
+        max(2, assoc_cfg["changepoint_min_points"]),
+    )
+    scan_df = pd.DataFrame(
+        {
+            "source": [key[0] for key in scan_keys],
+            "channel": [key[1] for key in scan_keys],
+            "best_split_ms": np.where(split_ts >= 0, split_ts, np.nan),
+            "best_split_score": split_score,
+        }
+    )
+    onsets = scan_df[scan_df["best_split_score"] >= assoc_cfg["change_threshold"]]
+    onset_times = {
+        source: {
+            "ts_ms": int(ts),
+            "offset_minutes": (int(ts) - origin_ms) / 60_000,
+        }
+        for source, ts in onsets.groupby("source")["best_split_ms"].min().items()
+    }
+    if not change_df.empty:
+        change_df = change_df.merge(scan_df, on=["source", "channel"], how="left")
+
     lag_step = max(1, assoc_cfg["lag_step_minutes"])
     max_lag = max(0, assoc_cfg["max_lag_minutes"])
     lag_values = list(range(-max_lag, max_lag + 1, lag_step))
     similarity_rows: List[Dict[str, Any]] = []
-    keys = list(series_map.keys())
-    for idx, key_a in enumerate(keys):
-        for key_b in keys[idx + 1 :]:
-            source_a, channel_a = key_a
-            source_b, channel_b = key_b
-            if source_a == source_b:
-                continue
-            series_a = _zscore_series(series_map[key_a], assoc_cfg["min_points"])
-            series_b = _zscore_series(series_map[key_b], assoc_cfg["min_points"])
-            if series_a is None or series_b is None:
-                continue
-            best_corr = None
-            best_lag = 0
-            best_n = 0
-            for lag_min in lag_values:
-                corr, n_overlap = _corr_with_lag(
-                    series_a, series_b, lag_min * 60_000, assoc_cfg["min_overlap"]
-                )
-                if corr is None:
-                    continue
-                if best_corr is None or abs(corr) > abs(best_corr):
-                    best_corr = corr
-                    best_lag = lag_min
-                    best_n = n_overlap
-            if best_corr is None:
+    zscored = {
+        key: series
+        for key, series in (
+            (key, _zscore_series(series, assoc_cfg["min_points"]))
+            for key, series in series_map.items()
+        )
+        if series is not None
+    }
+    keys = list(zscored.keys())
+    pair_stats = {"pairs_total": 0, "pairs_evaluated": 0}
+    top_pairs: List[Tuple[float, int, Tuple[int, int, float, int, int]]] = []
+    if len(keys) > 1:
+        lag_ms = [lag_min * 60_000 for lag_min in lag_values]
+        values, mask, step_ms = _series_grid([zscored[key] for key in keys], lag_ms)
+        sources = np.array([key[0] for key in keys], dtype=object)
+        results = _lagged_correlations(
+            values,
+            mask,
+            sources,
+            np.asarray(lag_ms, dtype="int64") // step_ms,
+            assoc_cfg["min_overlap"],
+            pair_stats,
+            block_size=assoc_cfg["pair_block_size"],
+            workers=assoc_cfg["workers"],
+            max_in_flight=assoc_cfg["max_in_flight"],
+        )
+        topn = assoc_cfg["topn_pairs"]
+        for block, corrs, lag_pos, overlaps in results:
+            pair_stats["pairs_evaluated"] += int(len(block))
+            if topn <= 0:
                 continue
-            similarity_rows.append(
-                {
-                    "event_id": event_id,
-                    "source_a": source_a,
-                    "channel_a": channel_a,
-                    "source_b": source_b,
-                    "channel_b": channel_b,
-                    "corr": float(best_corr),
-                    "lag_minutes": int(best_lag),
-                    "overlap_points": int(best_n),
-                    "similarity_flag": abs(best_corr) >= assoc_cfg["corr_threshold"],
-                    "params_hash": params_hash,
-                }
-            )
+            strength = np.abs(corrs)
+            keep = ~np.isnan(strength)
+            if len(top_pairs) >= topn:
+                keep &= strength >= top_pairs[0][0]
+            keep = np.flatnonzero(keep)
+            if len(keep) > topn:
+                keep = keep[np.argpartition(-strength[keep], topn - 1)[:topn]]
+            for row in keep:
+                idx_a, idx_b = int(block[row, 0]), int(block[row, 1])
+                pair = (idx_a, idx_b, float(corrs[row]), int(lag_pos[row]), int(overlaps[row]))
+                item = (float(strength[row]), -(idx_a * len(keys) + idx_b), pair)
+                if len(top_pairs) < topn:
+                    heapq.heappush(top_pairs, item)
+                elif item > top_pairs[0]:
+                    heapq.heapreplace(top_pairs, item)
+    for _, _, (idx_a, idx_b, corr, pos, n_overlap) in sorted(top_pairs, reverse=True):
+        source_a, channel_a = keys[idx_a]
+        source_b, channel_b = keys[idx_b]
+        similarity_rows.append(
+            {
+                "event_id": event_id,
+                "source_a": source_a,
+                "channel_a": channel_a,
+                "source_b": source_b,
+                "channel_b": channel_b,
+                "corr": corr,
+                "lag_minutes": int(lag_values[pos]),
+                "overlap_points": n_overlap,
+                "similarity_flag": abs(corr) >= assoc_cfg["corr_threshold"],
+                "params_hash": params_hash,
+            }
+        )
     similarity_df = pd.DataFrame.from_records(similarity_rows)
-    if not similarity_df.empty:
-        similarity_df = similarity_df.sort_values(
-            "corr", key=lambda s: s.abs(), ascending=False
-        ).head(assoc_cfg["topn_pairs"])
 
     co_occurrence = len(change_sources) >= assoc_cfg["min_sources"]
     similarity_flag = (
@@ -191,8 +438,12 @@ def _compute_association(
         "change_threshold": assoc_cfg["change_threshold"],
         "corr_threshold": assoc_cfg["corr_threshold"],
         "change_sources": sorted(change_sources),
+        "changepoint_window_minutes": assoc_cfg["changepoint_window_minutes"],
+        "onset_times": onset_times,
         "change_rows": int(len(change_df)),
         "similarity_rows": int(len(similarity_df)),
+        "pairs_total": pair_stats["pairs_total"],
+        "pairs_evaluated": pair_stats["pairs_evaluated"],
         "co_occurrence": co_occurrence,
         "similarity_flag": similarity_flag,
         "association_flag": association_flag,
@@ -201,6 +452,72 @@ def _compute_association(
     return summary, change_df, similarity_df
 
 
+SCORE_KEYS = ["source", "channel", "feature"]
+MAD_SCALE = 1.4826
+
+
+def _group_scores(features_df: pd.DataFrame, scoring: str) -> pd.Series:
+    values = features_df["value"]
+    grouped = values.groupby([features_df[key] for key in SCORE_KEYS], sort=False)
+    if scoring == "robust":
+        center = grouped.transform("median")
+        spread = (values - center).abs().groupby(
+            [features_df[key] for key in SCORE_KEYS], sort=False
+        ).transform("median") * MAD_SCALE
+    elif scoring == "zscore":
+        center = grouped.transform("mean")
+        spread = grouped.transform("std")
+    else:
+        raise ValueError(f"Unknown features.scoring: {scoring}")
+    spread = spread.mask(spread == 0, 1.0)
+    score = (values - center) / spread
+    keyless = features_df[SCORE_KEYS].isna().any(axis=1)
+    return score.mask(keyless, 0.0)
+
+
+BASELINE_FEATURE = "baseline_sample"
+BASELINE_COLUMNS = ["source", "station_id", "channel", "feature", "value", "ts_ms", "score"]
+
+
+def _baseline_scores(
+    features_df: pd.DataFrame, config: Dict[str, Any], output_paths, event_id: str
+) -> pd.DataFrame:
+    settings = baseline_settings(config)
+    baseline = load_baseline(output_paths.baseline)
+    if settings["statistic"] == "robust":
+        baseline["center"] = baseline["p50"]
+        baseline["spread"] = baseline["mad"] * MAD_SCALE
+    else:
+        baseline["center"] = baseline["mean"]
+        baseline["spread"] = baseline["std"]
+    baseline = baseline[(baseline["count"] >= settings["min_count"]) & (baseline["spread"] > 0)]
+    if baseline.empty or features_df.empty:
+        return pd.DataFrame(columns=BASELINE_COLUMNS)
+    baseline = baseline.assign(station_id=baseline["station_id"].astype(str), hour=baseline["hour"].astype(int))
+
+    aligned_path = output_paths.linked / event_id / "aligned.parquet"
+    if not aligned_path.exists():
+        return pd.DataFrame(columns=BASELINE_COLUMNS)
+    aligned = pd.read_parquet(aligned_path, columns=["ts_ms", "source", "station_id", "channel", "value"])
+    aligned = aligned.assign(
+        station_id=aligned["station_id"].astype(str),
+        value=pd.to_numeric(aligned["value"], errors="coerce"),
+    ).dropna(subset=["value"])
+    series = features_df[["source", "station_id"]].drop_duplicates().astype({"station_id": str})
+    aligned = aligned.merge(series, on=["source", "station_id"], how="inner")
+    if aligned.empty:
+        return pd.DataFrame(columns=BASELINE_COLUMNS)
+    aligned["hour"], aligned["season"] = baseline_time_keys(aligned["ts_ms"])
+    samples = aligned.merge(baseline, on=BASELINE_KEYS, how="inner")
+    if samples.empty:
+        return pd.DataFrame(columns=BASELINE_COLUMNS)
+    samples["score"] = (samples["value"] - samples["center"]) / samples["spread"]
+    strength = samples["score"].abs()
+    samples = samples.loc[strength.groupby([samples["source"], samples["station_id"], samples["channel"]]).idxmax()]
+    samples["feature"] = BASELINE_FEATURE
+    return samples[BASELINE_COLUMNS].reset_index(drop=True)
+
+
 def run_model(
     base_dir: Path,
     config: Dict[str, Any],
@@ -220,19 +537,21 @@ def run_model(
     features_df = pd.read_parquet(features_path)
     threshold = float(config.get("features", {}).get("anomaly_threshold", 3.0))
     topn = int(config.get("features", {}).get("topn_anomalies", 50))
+    scoring = str(config.get("features", {}).get("scoring", "zscore"))
 
     anomaly_df = pd.DataFrame()
     if not features_df.empty:
         features_df["value"] = pd.to_numeric(features_df["value"], errors="coerce")
-        features_df["score"] = 0.0
-        for name, group in features_df.groupby(["source", "channel", "feature"]):
-            mean = group["value"].mean()
-            std = group["value"].std() or 1.0
-            score = (group["value"] - mean) / std
-            features_df.loc[group.index, "score"] = score
-
-        anomalies = features_df.loc[features_df["score"].abs() >= threshold].copy()
-        anomalies = anomalies.sort_values("score", key=lambda s: s.abs(), ascending=False).head(topn)
+        if scoring == "baseline":
+            features_df["score"] = _group_scores(features_df, "zscore")
+            samples = _baseline_scores(features_df, config, output_paths, event_id)
+            if not samples.empty:
+                features_df = pd.concat([features_df, samples], ignore_index=True)
+        else:
+            features_df["score"] = _group_scores(features_df, scoring)
+
+        anomalies = features_df.loc[features_df["score"].abs() >= threshold]
+        anomalies = anomalies.loc[anomalies["score"].abs().nlargest(topn).index].copy()
         anomalies.insert(0, "rank", range(1, len(anomalies) + 1))
         anomaly_df = anomalies[["rank", "source", "station_id", "feature", "score"]]
 
@@ -263,6 +582,8 @@ def run_model(
                     "change_score",
                     "change_flag",
                     "params_hash",
+                    "best_split_ms",
+                    "best_split_score",
                 ]
             ).to_parquet(features_dir / "association_changes.parquet", index=False)
         if not similarity_df.empty:
@@ -284,10 +605,20 @@ def run_model(
             ).to_parquet(features_dir / "association_similarity.parquet", index=False)
         write_json(features_dir / "association.json", summary)
 
-    rulebook = {"anomaly_threshold": threshold, "topn": topn, "params_hash": params_hash}
+    rulebook = {
+        "anomaly_threshold": threshold,
+        "topn": topn,
+        "scoring": scoring,
+        "params_hash": params_hash,
+    }
     ensure_dir(output_paths.models)
     with (output_paths.models / "rulebook.yaml").open("w", encoding="utf-8") as handle:
         yaml.safe_dump(rulebook, handle, allow_unicode=True, sort_keys=False)
 
-    dq = {"event_id": event_id, "anomalies": int(len(anomaly_df)), "threshold": threshold}
+    dq = {
+        "event_id": event_id,
+        "anomalies": int(len(anomaly_df)),
+        "threshold": threshold,
+        "scoring": scoring,
+    }
     write_json(features_dir / "dq_anomaly.json", dq)
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from scipy.signal import lfilter
+
+from src.store.layout import read_standard_filtered
+from src.store.parquet import (
+    compact_partitioned_dataset,
+    list_dataset_files,
+    replace_partition_files,
+    staged_part_paths,
+)
+from src.utils import ensure_dir, utc_now_iso
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = "state.parquet"
+ANOMALY_DIR = "anomalies"
+SERIES_KEYS = ["source", "station_id", "channel"]
+STATE_COLUMNS = SERIES_KEYS + ["count", "mean", "var", "last_ts_ms"]
+ANOMALY_COLUMNS = SERIES_KEYS + ["ts_ms", "value", "expected", "score", "detected_utc"]
+ANOMALY_SORT = ["ts_ms", "source", "station_id", "channel"]
+
+
+def online_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    cfg = config.get("online", {}) or {}
+    return {
+        "sources": [str(item) for item in cfg.get("sources", ["geomag", "aef"])],
+        "alpha": float(cfg.get("alpha", 0.05)),
+        "min_points": int(cfg.get("min_points", 30)),
+        "poll_seconds": float(cfg.get("poll_seconds", 5)),
+        "compact_min_files": int(cfg.get("compact_min_files", 32)),
+        "threshold": float(config.get("features", {}).get("anomaly_threshold", 3.0)),
+    }
+
+
+def ewma_update(
+    values: np.ndarray, mean: float, var: float, alpha: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    decay = 1.0 - alpha
+    means = lfilter([alpha], [1.0, -decay], values, zi=[decay * mean])[0]
+    prior_mean = np.concatenate([[mean], means[:-1]])
+    deviation = values - prior_mean
+    variances = lfilter([decay * alpha], [1.0, -decay], deviation**2, zi=[decay * var])[0]
+    prior_var = np.concatenate([[var], variances[:-1]])
+    return means, variances, prior_mean, prior_var
+
+
+class OnlineScorer:
+    def __init__(self, output_paths, config: Dict[str, Any]) -> None:
+        self.output_paths = output_paths
+        self.config = config
+        self.settings = online_settings(config)
+        self.root = output_paths.online
+        self.state = self._load_state()
+        self.failed_stations: List[Tuple[str, str]] = []
+
+    def _load_state(self) -> Dict[tuple, Dict[str, Any]]:
+        path = self.root / STATE_FILE
+        if not path.exists():
+            return {}
+        return {
+            tuple(record[key] for key in SERIES_KEYS): record
+            for record in pd.read_parquet(path).to_dict(orient="records")
+        }
+
+    def _save_state(self) -> None:
+        ensure_dir(self.root)
+        frame = pd.DataFrame.from_records(list(self.state.values()), columns=STATE_COLUMNS)
+        staged = self.root / f".{STATE_FILE}.tmp"
+        frame.to_parquet(staged, index=False)
+        os.replace(staged, self.root / STATE_FILE)
+
+    def _station_marks(self, source: str) -> Dict[str, int]:
+        marks: Dict[str, int] = {}
+        for (state_source, station_id, _), record in self.state.items():
+            if state_source != source:
+                continue
+            mark = int(record["last_ts_ms"])
+            marks[station_id] = min(marks.get(station_id, mark), mark)
+        return marks
+
+    def _new_rows(self, source: str) -> pd.DataFrame:
+        source_dir = self.output_paths.standard / f"source={source}"
+        if not source_dir.exists():
+            return pd.DataFrame(columns=["ts_ms", "station_id", "channel", "value"])
+        marks = self._station_marks(source)
+        frames: List[pd.DataFrame] = []
+        for station_dir in sorted(source_dir.glob("station_id=*")):
+            station_id = station_dir.name.split("=", 1)[1]
+            filters = ds.field("station_id") == station_id
+            if station_id in marks:
+                filters = filters & (ds.field("ts_ms") > marks[station_id])
+            try:
+                df = read_standard_filtered(
+                    source_dir, filters=filters, columns=["ts_ms", "station_id", "channel", "value"]
+                )
+            except (pa.ArrowException, OSError) as exc:
+                logger.warning("Skipping %s/%s until next poll: %s", source, station_id, exc)
+                self.failed_stations.append((source, station_id))
+                continue
+            if not df.empty:
+                frames.append(df)
+        if not frames:
+            return pd.DataFrame(columns=["ts_ms", "station_id", "channel", "value"])
+        return pd.concat(frames, ignore_index=True)
+
+    def _score_series(self, key: tuple, group: pd.DataFrame) -> pd.DataFrame:
+        settings = self.settings
+        record = self.state.get(key)
+        if record is not None:
+            group = group[group["ts_ms"] > int(record["last_ts_ms"])]
+        if group.empty:
+            return group.iloc[0:0]
+        values = group["value"].to_numpy(dtype=float)
+        if record is None:
+            record = dict(zip(SERIES_KEYS, key))
+            record.update({"count": 0, "mean": float(values[0]), "var": 0.0})
+        means, variances, prior_mean, prior_var = ewma_update(
+            values, float(record["mean"]), float(record["var"]), settings["alpha"]
+        )
+        prior_count = int(record["count"]) + np.arange(len(values))
+        prior_var = prior_var / (1.0 - (1.0 - settings["alpha"]) ** np.maximum(prior_count - 1, 1))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scores = (values - prior_mean) / np.sqrt(prior_var)
+        flagged = (
+            (prior_count >= settings["min_points"])
+            & (prior_var > 0)
+            & (np.abs(scores) >= settings["threshold"])
+        )
+        record.update(
+            {
+                "count": int(record["count"]) + len(values),
+                "mean": float(means[-1]),
+                "var": float(variances[-1]),
+                "last_ts_ms": int(group["ts_ms"].iloc[-1]),
+            }
+        )
+        self.state[key] = record
+        anomalies = group.loc[flagged, ["ts_ms", "value"]].copy()
+        anomalies["expected"] = prior_mean[flagged]
+        anomalies["score"] = scores[flagged]
+        return anomalies
+
+    def _append_anomalies(self, result: pd.DataFrame) -> None:
+        log_dir = self.root / ANOMALY_DIR
+        ensure_dir(log_dir)
+        [temp_path] = staged_part_paths(log_dir, 1)
+        try:
+            result.to_parquet(temp_path, index=False)
+            replace_partition_files(log_dir, [temp_path], [])
+        except Exception:
+            temp_path.unlink(missing_ok=True)
+            raise
+        parts = [path for path in log_dir.glob("*.parquet") if not path.name.startswith((".", "_"))]
+        if len(parts) >= self.settings["compact_min_files"]:
+            compact_partitioned_dataset(log_dir, self.config, sort_by=ANOMALY_SORT, timed=False)
+
+    def poll(self) -> pd.DataFrame:
+        self.failed_stations = []
+        found: List[pd.DataFrame] = []
+        for source in self.settings["sources"]:
+            df = self._new_rows(source)
+            if df.empty:
+                continue
+            df["value"] = pd.to_numeric(df["value"], errors="coerce")
+            df = df.dropna(subset=["ts_ms", "channel", "value"])
+            df["station_id"] = df["station_id"].astype(str)
+            df = df.sort_values(["station_id", "channel", "ts_ms"], kind="stable")
+            for (station_id, channel), group in df.groupby(["station_id", "channel"], sort=False):
+                key = (source, station_id, channel)
+                anomalies = self._score_series(key, group)
+                if anomalies.empty:
+                    continue
+                anomalies["source"] = source
+                anomalies["station_id"] = station_id
+                anomalies["channel"] = channel
+                found.append(anomalies)
+        result = pd.DataFrame(columns=ANOMALY_COLUMNS)
+        if found:
+            result = pd.concat(found, ignore_index=True)
+            result["detected_utc"] = utc_now_iso()
+            result = result[ANOMALY_COLUMNS]
+        try:
+            if not result.empty:
+                self._append_anomalies(result)
+            self._save_state()
+        except Exception:
+            self.state = self._load_state()
+            raise
+        return result
+
+
+def read_online_anomalies(online_dir: Path, since_ms: int | None = None) -> pd.DataFrame:
+    log_dir = online_dir / ANOMALY_DIR
+    files = [str(path) for path in list_dataset_files(log_dir)] if log_dir.exists() else []
+    if not files:
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+    filters = ds.field("ts_ms") >= int(since_ms) if since_ms is not None else None
+    return ds.dataset(files, format="parquet").to_table(filter=filters).to_pandas()
@@ -1,24 +1,309 @@
 from __future__ import annotations
 
+import hashlib
 import json
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.io as pio
+from plotly.offline import get_plotlyjs
 
+from src.plots.downsample import bucket_max, downsample_indices
+from src.store.matrix import MATRIX_DIR, load_aligned_matrix
 from src.store.parquet import read_parquet
-from src.utils import ensure_dir, write_json
+from src.utils import compute_sha256, ensure_dir, write_json
+
+
+PLOTLY_ASSET = "plotly.min.js"
+FINGERPRINT_SUFFIX = ".fingerprint.json"
+SPEC_SCRIPT_SUFFIX = ".js"
+PLOT_CONFIG = {"responsive": True, "displaylogo": False, "scrollZoom": True}
+PLOT_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>html, body {{ margin: 0; height: 100%; }} #plot {{ width: 100%; height: 100%; }}</style>
+</head>
+<body>
+<div id="plot"></div>
+<script>
+  var page = location.href.replace(/[?#].*$/, "");
+  var specBase = page.replace(/\\/html\\/((?:[^\\/]+\\/)?)([^\\/]+)\\.html$/, "/spec/$1$2");
+  var assetUrl = page.replace(/\\/html\\/(?:[^\\/]+\\/)?[^\\/]+\\.html$/, "/assets/{asset}");
+  function draw(spec) {{ Plotly.newPlot("plot", spec.data, spec.layout, {config}); }}
+  function fail(url, error) {{ document.getElementById("plot").textContent = "Failed to load " + url + ": " + error; }}
+  function load(src, onload, onerror) {{
+    var script = document.createElement("script");
+    script.src = src;
+    script.onload = onload;
+    script.onerror = onerror;
+    document.head.appendChild(script);
+  }}
+  // The spec script works from file:// (e.g. a finalized event package); fetch is only a fallback when served.
+  load(assetUrl, function () {{
+    load(specBase + ".js", function () {{ draw(window.PLOT_SPEC); }}, function () {{
+      if (!/^https?:$/.test(location.protocol)) {{ return fail(specBase + ".js", "not found"); }}
+      fetch(specBase + ".json")
+        .then(function (response) {{ return response.json(); }})
+        .then(draw)
+        .catch(function (error) {{ fail(specBase + ".json", error); }});
+    }});
+  }}, function () {{ fail(assetUrl, "not found"); }});
+</script>
+</body>
+</html>
+"""
+
+
+def _ensure_plotly_asset(assets_dir: Path) -> None:
+    asset_path = assets_dir / PLOTLY_ASSET
+    source = get_plotlyjs()
+    if asset_path.exists() and asset_path.stat().st_size == len(source.encode("utf-8")):
+        return
+    ensure_dir(assets_dir)
+    asset_path.write_text(source, encoding="utf-8")
+
+
+def _compact(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=float)
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return values.astype(np.float32)
+    spread = float(finite.max() - finite.min())
+    if float(np.abs(finite).max()) * 2.0**-24 <= 1e-4 * spread or spread == 0:
+        return values.astype(np.float32)
+    return values
 
 
 def _write_plot(fig: go.Figure, spec_path: Path, html_path: Path) -> None:
     ensure_dir(spec_path.parent)
     ensure_dir(html_path.parent)
-    spec_path.write_text(pio.to_json(fig), encoding="utf-8")
-    config = {"responsive": True, "displaylogo": False, "scrollZoom": True}
-    fig.write_html(str(html_path), include_plotlyjs="cdn", config=config)
+    spec = pio.to_json(fig, validate=False).replace("\\u002f", "/")
+    spec_path.write_text(spec, encoding="utf-8")
+    spec_path.with_suffix(SPEC_SCRIPT_SUFFIX).write_text(f"window.PLOT_SPEC = {spec};\n", encoding="utf-8")
+    title = fig.layout.title.text or spec_path.stem
+    html_path.write_text(
+        PLOT_HTML.format(title=title, asset=PLOTLY_ASSET, config=json.dumps(PLOT_CONFIG)), encoding="utf-8"
+    )
+
+
+def _plot_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    cfg = config.get("plots", {}) or {}
+    return {
+        "max_points_per_trace": max(int(cfg.get("max_points_per_trace", 4000)), 4),
+        "downsample": str(cfg.get("downsample", "minmax")),
+        "workers": max(int(cfg.get("workers", 1)), 1),
+        "full_rebuild": bool(cfg.get("full_rebuild", False)),
+    }
+
+
+def _downsampled_trace(
+    ts_ms: np.ndarray, values: np.ndarray, name: str, settings: Dict[str, Any], points: Dict[str, int]
+) -> go.Scatter:
+    keep = np.flatnonzero(~np.isnan(values))
+    picks = keep[
+        downsample_indices(ts_ms[keep], values[keep], settings["max_points_per_trace"], settings["downsample"])
+    ]
+    points["input"] += int(len(keep))
+    points["output"] += int(len(picks))
+    return go.Scatter(x=ts_ms[picks].astype(np.float64), y=_compact(values[picks]), mode="lines", name=name)
+
+
+def _plot_aligned_timeseries(task: Dict[str, Any]) -> Dict[str, Any]:
+    linked_dir = task["linked_dir"]
+    settings = task["params"]
+    matrix = load_aligned_matrix(linked_dir)
+    traces = []
+    points = {"input": 0, "output": 0}
+    if matrix is not None and not matrix.empty:
+        ts_ms = np.asarray(matrix.ts_ms, dtype=np.int64)
+        observed = (~np.asarray(matrix.mask)).sum(axis=0)
+        channel_groups = matrix.column_groups(["channel"])
+        counts = {key[0]: int(observed[positions].sum()) for key, positions in channel_groups.items()}
+        for channel in sorted(counts, key=counts.get, reverse=True)[:3]:
+            values = np.asarray(matrix.combined(channel_groups[(channel,)]), dtype=float)
+            traces.append(_downsampled_trace(ts_ms, values, channel, settings, points))
+    elif matrix is None and (linked_dir / "aligned.parquet").exists():
+        aligned_df = pd.read_parquet(linked_dir / "aligned.parquet", columns=["ts_ms", "channel", "value"])
+        top_channels = (
+            aligned_df.groupby("channel")["value"].count().sort_values(ascending=False).head(3).index.tolist()
+        )
+        for channel in top_channels:
+            subset = aligned_df[aligned_df["channel"] == channel].sort_values("ts_ms")
+            ts_ms = subset["ts_ms"].to_numpy(dtype=np.int64)
+            values = pd.to_numeric(subset["value"], errors="coerce").to_numpy(dtype=float)
+            traces.append(_downsampled_trace(ts_ms, values, channel, settings, points))
+    if not traces:
+        return {"aligned_timeseries": "missing: no aligned data"}
+    fig = go.Figure()
+    for trace in traces:
+        fig.add_trace(trace)
+    fig.update_xaxes(type="date", rangeslider_visible=True)
+    fig.update_layout(
+        title="Aligned Timeseries",
+        xaxis_title="Time (UTC)",
+        yaxis_title="Value",
+        height=520,
+    )
+    _write_plot(fig, task["spec_path"], task["html_path"])
+    return {"aligned_timeseries": "ok", "aligned_timeseries_points": points}
+
+
+def _plot_station_map(task: Dict[str, Any]) -> Dict[str, Any]:
+    linked_dir = task["linked_dir"]
+    stations_path = linked_dir / "stations.json"
+    aligned_path = linked_dir / "aligned.parquet"
+    if (linked_dir / MATRIX_DIR / "values.npy").exists():
+        stations_payload = (
+            json.loads(stations_path.read_text(encoding="utf-8")).get("stations", [])
+            if stations_path.exists()
+            else []
+        )
+        stations = pd.DataFrame.from_records(stations_payload, columns=["station_id", "lat", "lon"])
+    elif aligned_path.exists():
+        stations = pd.read_parquet(aligned_path, columns=["station_id", "lat", "lon"])
+    else:
+        stations = pd.DataFrame(columns=["station_id", "lat", "lon"])
+    stations = stations.dropna(subset=["lat", "lon"])
+    if stations.empty:
+        return {"station_map": "missing: no station coordinates"}
+    stations = stations[["station_id", "lat", "lon"]].drop_duplicates().reset_index(drop=True)
+    fig = go.Figure(
+        go.Scattergeo(
+            lon=stations["lon"],
+            lat=stations["lat"],
+            text=stations["station_id"],
+            mode="markers",
+        )
+    )
+    fig.update_layout(title="Station Map", height=520)
+    _write_plot(fig, task["spec_path"], task["html_path"])
+    return {"station_map": "ok"}
+
+
+def _plot_filter_effect(task: Dict[str, Any]) -> Dict[str, Any]:
+    if not task["inputs"]:
+        return {"filter_effect": "missing: filter_effect.json not found"}
+    filter_effect = json.loads(task["inputs"][0].read_text(encoding="utf-8"))
+    sources = list(filter_effect.keys())
+    before = [filter_effect[s].get("before_std") for s in sources]
+    after = [filter_effect[s].get("after_std") for s in sources]
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=sources, y=before, name="before_std"))
+    fig.add_trace(go.Bar(x=sources, y=after, name="after_std"))
+    fig.update_layout(title="Filter Effect", barmode="group", yaxis_title="Std", height=520)
+    _write_plot(fig, task["spec_path"], task["html_path"])
+    return {"filter_effect": "ok"}
+
+
+def _plot_vlf_spectrogram(task: Dict[str, Any]) -> Dict[str, Any]:
+    if not task["inputs"]:
+        return {"vlf_spectrogram": "missing: no vlf data"}
+    import zarr
+
+    root = zarr.open(str(task["inputs"][0]), mode="r")
+    epoch_ns = root["epoch_ns"][:]
+    freq = root["freq_hz"][:]
+    starts, ch1 = bucket_max(root["ch1"][:], task["params"]["max_points_per_trace"])
+    fig = go.Figure(
+        data=go.Heatmap(
+            z=_compact(np.log10(ch1 + 1e-12).T),
+            x=epoch_ns[starts] / 1e6,
+            y=freq,
+            colorscale="Viridis",
+        )
+    )
+    fig.update_layout(title="VLF Spectrogram (CH1)", xaxis_title="Time", yaxis_title="Freq (Hz)", height=520)
+    fig.update_xaxes(type="date")
+    _write_plot(fig, task["spec_path"], task["html_path"])
+    return {"vlf_spectrogram": "ok"}
+
+
+PLOT_BUILDERS = {
+    "aligned_timeseries": _plot_aligned_timeseries,
+    "station_map": _plot_station_map,
+    "filter_effect": _plot_filter_effect,
+    "vlf_spectrogram": _plot_vlf_spectrogram,
+}
+
+
+def _plot_tasks(config: Dict[str, Any], output_paths, event_id: str) -> List[Dict[str, Any]]:
+    settings = _plot_settings(config)
+    linked_dir = output_paths.linked / event_id
+    matrix_dir = linked_dir / MATRIX_DIR
+    if (matrix_dir / "values.npy").exists():
+        series_inputs = [matrix_dir]
+        station_inputs = [linked_dir / "stations.json"]
+    else:
+        series_inputs = station_inputs = [linked_dir / "aligned.parquet"]
+    vlf_inputs = sorted((output_paths.raw / "vlf").glob("*/*/spectrogram.zarr"))[:1]
+    version = config.get("pipeline", {}).get("version", "0.0.0")
+    trace_params = {
+        "max_points_per_trace": settings["max_points_per_trace"],
+        "downsample": settings["downsample"],
+    }
+    plans = [
+        ("aligned_timeseries", series_inputs, trace_params),
+        ("station_map", station_inputs, {}),
+        ("filter_effect", [output_paths.reports / "filter_effect.json"], {}),
+        ("vlf_spectrogram", vlf_inputs, {"max_points_per_trace": settings["max_points_per_trace"]}),
+    ]
+    spec_dir = output_paths.plots / "spec" / event_id
+    html_dir = output_paths.plots / "html" / event_id
+    return [
+        {
+            "kind": kind,
+            "linked_dir": linked_dir,
+            "inputs": [path for path in inputs if path.exists()],
+            "params": dict(params, pipeline_version=version),
+            "spec_path": spec_dir / f"plot_{kind}.json",
+            "html_path": html_dir / f"plot_{kind}.html",
+            "fingerprint_path": spec_dir / f"plot_{kind}{FINGERPRINT_SUFFIX}",
+        }
+        for kind, inputs, params in plans
+    ]
+
+
+def _input_files(paths: List[Path]) -> List[Path]:
+    files: List[Path] = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(sorted(item for item in path.rglob("*") if item.is_file()))
+        else:
+            files.append(path)
+    return files
+
+
+def _fingerprint(task: Dict[str, Any], previous: Dict[str, Any]) -> Dict[str, Any]:
+    known = previous.get("inputs", {})
+    inputs = {}
+    for path in _input_files(task["inputs"]):
+        stat = path.stat()
+        record = known.get(str(path))
+        if record is None or record["size"] != stat.st_size or record["mtime_ns"] != stat.st_mtime_ns:
+            record = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": compute_sha256(path)}
+        inputs[str(path)] = record
+    payload = json.dumps(
+        {"params": task["params"], "inputs": {key: value["sha256"] for key, value in inputs.items()}},
+        sort_keys=True,
+    )
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return {"digest": digest, "params": task["params"], "inputs": inputs}
+
+
+def _load_fingerprint(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _run_plot_task(task: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    return task["kind"], PLOT_BUILDERS[task["kind"]](task)
 
 
 def run_plots(
@@ -32,109 +317,48 @@ def run_plots(
 ) -> None:
     if event_id is None:
         event_id = (config.get("events") or [{}])[0].get("event_id")
-    linked_dir = output_paths.linked / event_id
-    aligned_path = linked_dir / "aligned.parquet"
-    aligned_df = pd.read_parquet(aligned_path) if aligned_path.exists() else pd.DataFrame()
-
-    plots_html_dir = output_paths.plots / "html" / event_id
+    settings = _plot_settings(config)
     plots_spec_dir = output_paths.plots / "spec" / event_id
-    dq = {}
+    _ensure_plotly_asset(output_paths.plots / "assets")
 
-    # Plot 1: aligned timeseries (top 3 channels)
-    if not aligned_df.empty:
-        aligned_df["ts"] = pd.to_datetime(aligned_df["ts_ms"], unit="ms", utc=True)
-        top_channels = (
-            aligned_df.groupby("channel")["value"].count().sort_values(ascending=False).head(3).index.tolist()
-        )
-        fig = go.Figure()
-        for channel in top_channels:
-            subset = aligned_df[aligned_df["channel"] == channel].sort_values("ts")
-            fig.add_trace(go.Scatter(x=subset["ts"], y=subset["value"], mode="lines", name=channel))
-        fig.update_xaxes(rangeslider_visible=True)
-        fig.update_layout(
-            title="Aligned Timeseries",
-            xaxis_title="Time (UTC)",
-            yaxis_title="Value",
-            height=520,
-        )
-        _write_plot(fig, plots_spec_dir / "plot_aligned_timeseries.json", plots_html_dir / "plot_aligned_timeseries.html")
-        dq["aligned_timeseries"] = "ok"
-    else:
-        dq["aligned_timeseries"] = "missing: no aligned data"
-
-    # Plot 2: station map
-    if not aligned_df.empty and aligned_df["lat"].notna().any():
-        stations = (
-            aligned_df.dropna(subset=["lat", "lon"])[["station_id", "lat", "lon"]]
-            .drop_duplicates()
-            .reset_index(drop=True)
-        )
-        fig = go.Figure(
-            go.Scattergeo(
-                lon=stations["lon"],
-                lat=stations["lat"],
-                text=stations["station_id"],
-                mode="markers",
-            )
-        )
-        fig.update_layout(title="Station Map", height=520)
-        _write_plot(fig, plots_spec_dir / "plot_station_map.json", plots_html_dir / "plot_station_map.html")
-        dq["station_map"] = "ok"
-    else:
-        dq["station_map"] = "missing: no station coordinates"
-
-    # Plot 3: filter effect
-    filter_effect_path = output_paths.reports / "filter_effect.json"
-    if filter_effect_path.exists():
-        filter_effect = json.loads(filter_effect_path.read_text(encoding="utf-8"))
-        sources = list(filter_effect.keys())
-        before = [filter_effect[s].get("before_std") for s in sources]
-        after = [filter_effect[s].get("after_std") for s in sources]
-        fig = go.Figure()
-        fig.add_trace(go.Bar(x=sources, y=before, name="before_std"))
-        fig.add_trace(go.Bar(x=sources, y=after, name="after_std"))
-        fig.update_layout(title="Filter Effect", barmode="group", yaxis_title="Std", height=520)
-        _write_plot(fig, plots_spec_dir / "plot_filter_effect.json", plots_html_dir / "plot_filter_effect.html")
-        dq["filter_effect"] = "ok"
+    dq: Dict[str, Any] = {}
+    pending: List[Dict[str, Any]] = []
+    fingerprints: Dict[str, Optional[Dict[str, Any]]] = {}
+    reused: List[str] = []
+    for task in _plot_tasks(config, output_paths, event_id):
+        kind = task["kind"]
+        fingerprints[kind] = None
+        if task["inputs"]:
+            previous = _load_fingerprint(task["fingerprint_path"])
+            current = _fingerprint(task, previous)
+            fingerprints[kind] = current
+            if (
+                not settings["full_rebuild"]
+                and previous.get("digest") == current["digest"]
+                and task["spec_path"].exists()
+                and task["spec_path"].with_suffix(SPEC_SCRIPT_SUFFIX).exists()
+                and task["html_path"].exists()
+            ):
+                dq.update(previous.get("dq", {}))
+                reused.append(kind)
+                continue
+        pending.append(task)
+
+    if settings["workers"] > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(settings["workers"], len(pending))) as pool:
+            results = list(pool.map(_run_plot_task, pending))
     else:
-        dq["filter_effect"] = "missing: filter_effect.json not found"
-
-    # Plot 4: VLF spectrogram (optional)
-    vlf_dir = output_paths.raw / "vlf"
-    spectro_written = False
-    if vlf_dir.exists():
-        for station_dir in vlf_dir.glob("*"):
-            for run_dir in station_dir.glob("*"):
-                zarr_path = run_dir / "spectrogram.zarr"
-                if not zarr_path.exists():
-                    continue
-                import zarr
-
-                root = zarr.open(str(zarr_path), mode="r")
-                epoch_ns = root["epoch_ns"][:]
-                freq = root["freq_hz"][:]
-                ch1 = root["ch1"][:]
-                fig = go.Figure(
-                    data=go.Heatmap(
-                        z=np.log10(ch1 + 1e-12).T,
-                        x=pd.to_datetime(epoch_ns, unit="ns"),
-                        y=freq,
-                        colorscale="Viridis",
-                    )
-                )
-                fig.update_layout(
-                    title="VLF Spectrogram (CH1)", xaxis_title="Time", yaxis_title="Freq (Hz)", height=520
-                )
-                _write_plot(
-                    fig,
-                    plots_spec_dir / "plot_vlf_spectrogram.json",
-                    plots_html_dir / "plot_vlf_spectrogram.html",
-                )
-                spectro_written = True
-                break
-            if spectro_written:
-                break
-    dq["vlf_spectrogram"] = "ok" if spectro_written else "missing: no vlf data"
+        results = [_run_plot_task(task) for task in pending]
+
+    for task, (kind, task_dq) in zip(pending, results):
+        dq.update(task_dq)
+        current = fingerprints[kind]
+        if current is not None and task_dq.get(kind) == "ok":
+            write_json(task["fingerprint_path"], dict(current, dq=task_dq))
+        elif task["fingerprint_path"].exists():
+            task["fingerprint_path"].unlink()
 
+    dq["rebuilt"] = sorted(kind for kind, _ in results)
+    dq["reused"] = sorted(reused)
     write_json(plots_spec_dir / "dq_plots.json", dq)
     write_json(output_paths.reports / "dq_plots.json", dq)
@@ -9,7 +9,7 @@ import pandas as pd
 from src.dq.reporting import write_dq_report
 from src.io.iaga2002 import resolve_iaga_patterns, scan_iaga_file
 from src.store.parquet import read_parquet, write_parquet_partitioned
-from src.utils import ensure_dir, write_json
+from src.utils import ensure_dir, update_json, write_json
 
 
 def _collect_files(root: Path, patterns: List[str], max_files: int | None) -> List[Path]:
@@ -156,5 +156,5 @@ def run_raw(
         if source_path.exists():
             total_bytes = sum(p.stat().st_size for p in source_path.rglob("*") if p.is_file())
             index_sizes[source] = {"index_bytes": total_bytes}
-    write_json(output_paths.reports / "compression.json", index_sizes)
+    update_json(output_paths.reports / "compression.json", index_sizes)
     write_json(output_paths.reports / "compression_stats.json", index_sizes)
@@ -14,6 +14,7 @@ STAGE_ORDER = [
     "raw",
     "standard",
     "spatial",
+    "baseline",
     "link",
     "features",
     "model",
@@ -26,6 +27,7 @@ STAGE_FUNCS = {
     "raw": stage_impl.run_raw,
     "standard": stage_impl.run_standard,
     "spatial": stage_impl.run_spatial,
+    "baseline": stage_impl.run_baseline,
     "link": stage_impl.run_link,
     "features": stage_impl.run_features,
     "model": stage_impl.run_model,
@@ -1,41 +1,140 @@
 from __future__ import annotations
 
 import math
+import shutil
 from pathlib import Path
 from typing import Any, Dict, List
 
 import numpy as np
 import pandas as pd
+from scipy.spatial import cKDTree
 
 from src.dq.reporting import write_dq_report
-from src.store.parquet import read_parquet, write_parquet_configured
+from src.store.parquet import read_parquet, read_parquet_filtered
+from src.utils import ensure_dir
 
 
-def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    r = 6371.0
-    lat1_r = math.radians(lat1)
-    lat2_r = math.radians(lat2)
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat / 2) ** 2 + math.cos(lat1_r) * math.cos(lat2_r) * math.sin(dlon / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return r * c
+EARTH_RADIUS_KM = 6371.0
+CATALOG_COLUMNS = ["source", "station_id", "lat", "lon", "elev"]
+CATALOG_FILE = "stations.parquet"
+
+
+def _unit_vectors(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    lat_r = np.radians(np.asarray(lats, dtype=float))
+    lon_r = np.radians(np.asarray(lons, dtype=float))
+    cos_lat = np.cos(lat_r)
+    return np.column_stack([cos_lat * np.cos(lon_r), cos_lat * np.sin(lon_r), np.sin(lat_r)])
+
+
+def _chord_from_km(radius_km: float) -> float:
+    angle = min(float(radius_km) / EARTH_RADIUS_KM, math.pi)
+    return 2.0 * math.sin(angle / 2.0)
+
+
+def _km_from_chord(chord: np.ndarray) -> np.ndarray:
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord, dtype=float) / 2.0, 0.0, 1.0))
 
 
 class SpatialIndex:
     def __init__(self, stations: pd.DataFrame) -> None:
-        self.stations = stations.dropna(subset=["lat", "lon"]).copy()
+        self.stations = stations.dropna(subset=["lat", "lon"]).reset_index(drop=True)
+        self._xyz = _unit_vectors(self.stations["lat"], self.stations["lon"])
+        self._tree = cKDTree(self._xyz) if len(self.stations) else None
 
-    def query_radius(self, lat: float, lon: float, radius_km: float) -> pd.DataFrame:
-        if self.stations.empty:
-            return self.stations
-        distances = self.stations.apply(
-            lambda row: haversine_km(lat, lon, row["lat"], row["lon"]), axis=1
-        )
-        result = self.stations[distances <= radius_km].copy()
-        result["distance_km"] = distances[distances <= radius_km].values
+    @classmethod
+    def load(cls, index_dir: Path) -> "SpatialIndex":
+        return cls(pd.read_parquet(index_dir / CATALOG_FILE))
+
+    def save(self, index_dir: Path) -> None:
+        ensure_dir(index_dir)
+        self.stations.to_parquet(index_dir / CATALOG_FILE, index=False)
+
+    def _rows(self, positions: np.ndarray, chords: np.ndarray) -> pd.DataFrame:
+        result = self.stations.iloc[positions].copy()
+        result["distance_km"] = _km_from_chord(chords)
         return result
 
+    def query_radius(self, lat: float, lon: float, radius_km: float) -> pd.DataFrame:
+        result = self.query_radius_batch([lat], [lon], radius_km)
+        return result.drop(columns=["query_index"])
+
+    def query_radius_batch(self, lats, lons, radius_km: float) -> pd.DataFrame:
+        if self._tree is None:
+            return self.stations.assign(distance_km=pd.Series(dtype=float), query_index=pd.Series(dtype=int))
+        points = _unit_vectors(lats, lons)
+        hits = self._tree.query_ball_point(points, r=_chord_from_km(radius_km))
+        query_index = np.repeat(np.arange(len(points)), [len(item) for item in hits])
+        positions = np.fromiter((pos for item in hits for pos in item), dtype=int, count=len(query_index))
+        chords = np.linalg.norm(self._xyz[positions] - points[query_index], axis=1)
+        result = self._rows(positions, chords)
+        result.insert(0, "query_index", query_index)
+        return result.sort_values(["query_index", "distance_km"], kind="stable").reset_index(drop=True)
+
+    def query_knn(self, lat: float, lon: float, k: int) -> pd.DataFrame:
+        return self.query_knn_batch([lat], [lon], k).drop(columns=["query_index"])
+
+    def query_knn_batch(self, lats, lons, k: int) -> pd.DataFrame:
+        if self._tree is None:
+            return self.stations.assign(distance_km=pd.Series(dtype=float), query_index=pd.Series(dtype=int))
+        points = _unit_vectors(lats, lons)
+        k = max(min(int(k), len(self.stations)), 1)
+        chords, positions = self._tree.query(points, k=k)
+        chords = np.asarray(chords).reshape(len(points), k)
+        positions = np.asarray(positions).reshape(len(points), k)
+        result = self._rows(positions.ravel(), chords.ravel())
+        result.insert(0, "query_index", np.repeat(np.arange(len(points)), k))
+        return result.reset_index(drop=True)
+
+
+def _first_location(df: pd.DataFrame, source: str) -> pd.DataFrame:
+    if df.empty:
+        return pd.DataFrame(columns=CATALOG_COLUMNS)
+    df = df.copy()
+    for col in ["lat", "lon", "elev"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce") if col in df.columns else np.nan
+    df["station_id"] = df["station_id"].astype(str)
+    df = df.sort_values(["station_id", "lat"], na_position="last", kind="stable")
+    df = df.drop_duplicates(subset=["station_id"], keep="first")
+    df["source"] = source
+    return df[CATALOG_COLUMNS]
+
+
+def build_station_catalog(output_paths) -> pd.DataFrame:
+    frames = []
+    for source in ["geomag", "aef"]:
+        index_dir = output_paths.raw_index / f"source={source}"
+        if index_dir.exists():
+            index_df = read_parquet_filtered(index_dir, columns=["station_id", "lat", "lon", "elev"])
+            frames.append(_first_location(index_df, source))
+
+    seismic_ingest = output_paths.ingest / "seismic"
+    if seismic_ingest.exists():
+        trace_df = read_parquet(seismic_ingest)
+        if not trace_df.empty:
+            frames.append(_first_location(trace_df, "seismic"))
+
+    located = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=CATALOG_COLUMNS)
+    vlf_catalog = output_paths.raw / "vlf_catalog.parquet"
+    if vlf_catalog.exists():
+        vlf_df = read_parquet(vlf_catalog)
+        if not vlf_df.empty:
+            # VLF CDFs carry no coordinates; co-located observatories share the station code.
+            vlf_df = vlf_df[["station_id"]].drop_duplicates()
+            vlf_df["station_id"] = vlf_df["station_id"].astype(str)
+            known = located.dropna(subset=["lat", "lon"]).drop_duplicates(subset=["station_id"])
+            vlf_df = vlf_df.merge(known[["station_id", "lat", "lon", "elev"]], on="station_id", how="left")
+            frames.append(_first_location(vlf_df, "vlf"))
+
+    if not frames:
+        return pd.DataFrame(columns=CATALOG_COLUMNS)
+    return pd.concat(frames, ignore_index=True).reset_index(drop=True)
+
+
+def load_spatial_index(index_dir: Path) -> SpatialIndex | None:
+    if not (index_dir / CATALOG_FILE).exists():
+        return None
+    return SpatialIndex.load(index_dir)
+
 
 def run_spatial(
     base_dir: Path,
@@ -46,21 +145,20 @@ def run_spatial(
     strict: bool,
     event_id: str | None,
 ) -> None:
-    stations = []
-    seismic_ingest = output_paths.ingest / "seismic"
-    if seismic_ingest.exists():
-        trace_df = read_parquet(seismic_ingest)
-        if not trace_df.empty:
-            stations.append(trace_df[["station_id", "lat", "lon", "elev"]].drop_duplicates())
-
-    if stations:
-        station_df = pd.concat(stations, ignore_index=True)
-    else:
-        station_df = pd.DataFrame(columns=["station_id", "lat", "lon", "elev"])
-
-    write_parquet_configured(station_df, output_paths.reports / "spatial_index", config, partition_cols=None)
+    station_df = build_station_catalog(output_paths)
+    index_dir = output_paths.reports / "spatial_index"
+    if index_dir.exists():
+        shutil.rmtree(index_dir)
+    index = SpatialIndex(station_df)
+    index.save(index_dir)
+    located = index.stations
     report = {
         "station_count": int(len(station_df)),
-        "index_type": "bruteforce",
+        "located_count": int(len(located)),
+        "unlocated": station_df[station_df["lat"].isna() | station_df["lon"].isna()][
+            ["source", "station_id"]
+        ].to_dict(orient="records"),
+        "by_source": located["source"].value_counts().to_dict() if not located.empty else {},
+        "index_type": "kdtree",
     }
     write_dq_report(output_paths.reports / "dq_spatial.json", report)
@@ -3,6 +3,7 @@ from __future__ import annotations
 from pathlib import Path
 from typing import Any, Dict
 
+from src.pipeline.baseline import run_baseline
 from src.pipeline.ingest import run_ingest
 from src.pipeline.manifest import build_manifest
 from src.pipeline.raw import run_raw
@@ -35,6 +36,7 @@ run_ingest = run_ingest
 run_raw = run_raw
 run_standard = run_standard
 run_spatial = run_spatial
+run_baseline = run_baseline
 
 
 run_link = run_link
@@ -15,8 +15,18 @@ import pywt
 import zarr
 
 from src.dq.reporting import basic_stats, write_dq_report
-from src.store.parquet import read_parquet, write_parquet_partitioned
-from src.utils import ensure_dir, write_json
+from src.sketch import QuantileSketch
+from src.store.layout import resolve_layout, widen_dataset
+from src.store.parquet import (
+    ParquetWriterPool,
+    column_byte_breakdown,
+    read_parquet,
+    write_parquet_partitioned,
+)
+from src.utils import ensure_dir, update_json, write_json
+
+
+SKETCHES_FILE = "_sketches.parquet"
 
 
 def _parse_flags(series: pd.Series) -> List[Dict[str, Any]]:
@@ -124,11 +134,17 @@ def _iter_expand_minute_to_seconds(
 
 
 def _mad_outlier_mask(
-    values: pd.Series, threshold: float, mean: float | None, std: float | None
+    values: pd.Series,
+    threshold: float,
+    mean: float | None,
+    std: float | None,
+    median: float | None = None,
+    mad: float | None = None,
 ) -> pd.Series:
     series = values.astype(float)
-    median = float(series.median())
-    mad = float(np.median(np.abs(series - median)))
+    if median is None or mad is None or math.isnan(median) or math.isnan(mad):
+        median = float(series.median())
+        mad = float(np.median(np.abs(series - median)))
     if mad > 0:
         z = 0.6745 * (series - median) / mad
         return z.abs() > threshold
@@ -237,12 +253,21 @@ def _apply_geomag_aef_preprocess(
     return values, preprocess_meta
 
 
+def _flag_outliers(df: pd.DataFrame, mask: pd.Series, threshold: float) -> None:
+    for idx in df.index[mask]:
+        flags = df.at[idx, "quality_flags"]
+        flags["is_outlier"] = True
+        flags["outlier_method"] = "mad"
+        flags["threshold"] = threshold
+        df.at[idx, "quality_flags"] = flags
+    df.loc[mask, "value"] = np.nan
+
+
 def _clean_timeseries_group(
     df: pd.DataFrame,
     config: Dict[str, Any],
     source: str,
-    mean: float | None,
-    std: float | None,
+    series_stats: Dict[str, float] | None,
 ) -> Tuple[pd.DataFrame, np.ndarray]:
     if df.empty:
         return df, np.array([])
@@ -251,6 +276,13 @@ def _clean_timeseries_group(
     df["quality_flags"] = _parse_flags(df["quality_flags"])
     source_cfg = _source_preprocess_cfg(config, source)
     preprocess_meta: Dict[str, Any] = {}
+    series_stats = series_stats or {}
+    outlier_cfg = source_cfg.get("outlier", config.get("preprocess", {}).get("outlier", {}))
+    threshold = float(outlier_cfg.get("threshold", 6.0))
+    scope = str(outlier_cfg.get("scope", "series")).lower()
+    if scope not in {"series", "batch"}:
+        raise ValueError(f"Unknown outlier scope: {scope}")
+    whole_series = scope == "series" and series_stats.get("median") is not None
 
     values = pd.to_numeric(df["value"], errors="coerce")
     if source in {"geomag", "aef"}:
@@ -275,17 +307,20 @@ def _clean_timeseries_group(
                 "threshold": despike_threshold,
             }
 
-    outlier_cfg = source_cfg.get("outlier", config.get("preprocess", {}).get("outlier", {}))
-    threshold = float(outlier_cfg.get("threshold", 6.0))
-    outlier_mask = _mad_outlier_mask(df["value"], threshold, mean, std)
-    for idx in df.index[outlier_mask]:
-        flags = df.at[idx, "quality_flags"]
-        flags["is_outlier"] = True
-        flags["outlier_method"] = "mad"
-        flags["threshold"] = threshold
-        df.at[idx, "quality_flags"] = flags
-    df.loc[outlier_mask, "value"] = np.nan
-    preprocess_meta["outlier"] = {"method": "mad", "threshold": threshold}
+    outlier_mask = _mad_outlier_mask(
+        df["value"],
+        threshold,
+        series_stats.get("mean"),
+        series_stats.get("std"),
+        series_stats.get("median") if whole_series else None,
+        series_stats.get("mad") if whole_series else None,
+    )
+    _flag_outliers(df, outlier_mask, threshold)
+    preprocess_meta["outlier"] = {
+        "method": "mad",
+        "threshold": threshold,
+        "scope": "series" if whole_series else "batch",
+    }
 
     interp_cfg = source_cfg.get("interpolate", config.get("preprocess", {}).get("interpolate", {}))
     interp_limit = _resolve_int(
@@ -352,11 +387,38 @@ def _compute_group_stats(
     dataset: ds.Dataset,
     batch_rows: int,
     max_rows: int | None,
-) -> Tuple[Dict[Tuple[str, str], Dict[str, float]], Dict[str, float]]:
+    sketch_k: int = 200,
+    residual_cfg: Dict[str, Any] | None = None,
+    overlap: int = 0,
+) -> Tuple[
+    Dict[Tuple[str, str], Dict[str, float]],
+    Dict[str, float],
+    Dict[Tuple[str, str], QuantileSketch],
+]:
     stats: Dict[Tuple[str, str], Dict[str, float]] = {}
+    sketches: Dict[Tuple[str, str], QuantileSketch] = {}
     total = {"count": 0, "sum": 0.0, "sum_sq": 0.0}
+    tails: Dict[Tuple[str, str], pd.DataFrame] = {}
+
+    def observe(key: Tuple[str, str], values: np.ndarray) -> None:
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        entry = stats.get(key)
+        if entry is None:
+            entry = {"count": 0, "sum": 0.0, "sum_sq": 0.0}
+            stats[key] = entry
+            sketches[key] = QuantileSketch(sketch_k)
+        _update_sum_stats(entry, values)
+        _update_sum_stats(total, values)
+        sketches[key].update(values)
+
+    def residual(group: pd.DataFrame) -> np.ndarray:
+        values, _ = _apply_geomag_aef_preprocess(group["value"], group["ts_ms"], residual_cfg)
+        return values.to_numpy(dtype=float)
+
     seen = 0
-    scanner = dataset.scanner(columns=["station_id", "channel", "value"], batch_size=batch_rows)
+    scanner = dataset.scanner(columns=["ts_ms", "station_id", "channel", "value"], batch_size=batch_rows)
     for batch in scanner.to_batches():
         df = batch.to_pandas()
         if df.empty:
@@ -367,19 +429,55 @@ def _compute_group_stats(
             df = df.iloc[: max_rows - seen]
         seen += len(df)
         df["value"] = pd.to_numeric(df["value"], errors="coerce")
-        grouped = df.groupby(["station_id", "channel"])["value"]
-        for key, series in grouped:
-            values = series.to_numpy(dtype=float, copy=False)
-            values = values[~np.isnan(values)]
-            if values.size == 0:
+        for key, group in df.groupby(["station_id", "channel"], sort=False):
+            if residual_cfg is None:
+                observe(key, group["value"].to_numpy(dtype=float))
                 continue
-            entry = stats.get(key)
-            if entry is None:
-                entry = {"count": 0, "sum": 0.0, "sum_sq": 0.0}
-                stats[key] = entry
-            _update_sum_stats(entry, values)
-            _update_sum_stats(total, values)
-    return stats, total
+            tail = tails.get(key)
+            combined = pd.concat([tail, group], ignore_index=True) if tail is not None and not tail.empty else group
+            combined = combined.sort_values("ts_ms")
+            values = residual(combined)
+            if overlap > 0 and len(combined) > overlap:
+                observe(key, values[:-overlap])
+                tails[key] = combined.iloc[-overlap:]
+            else:
+                observe(key, values)
+                tails[key] = combined.iloc[0:0]
+    for key, tail in tails.items():
+        if not tail.empty:
+            observe(key, residual(tail))
+    return stats, total, sketches
+
+
+def _series_stats(
+    group_stats: Dict[Tuple[str, str], Dict[str, float]],
+    sketches: Dict[Tuple[str, str], QuantileSketch],
+) -> Dict[Tuple[str, str], Dict[str, float]]:
+    return {
+        key: {
+            "mean": stats["sum"] / stats["count"],
+            "std": _stats_from_sum(stats) or 1.0,
+            "median": sketches[key].quantile(0.5),
+            "mad": sketches[key].mad(),
+        }
+        for key, stats in group_stats.items()
+        if stats["count"] > 0
+    }
+
+
+def _write_series_sketches(
+    output_base: Path,
+    source: str,
+    series_stats: Dict[Tuple[str, str], Dict[str, float]],
+    sketches: Dict[Tuple[str, str], QuantileSketch],
+) -> None:
+    records = []
+    for (station_id, channel), stats in series_stats.items():
+        record = {"source": source, "station_id": str(station_id), "channel": channel}
+        record.update(stats)
+        record.update(sketches[(station_id, channel)].to_record())
+        records.append(record)
+    pd.DataFrame.from_records(records).to_parquet(output_base / SKETCHES_FILE, index=False)
 
 
 def _apply_seismic_preprocess(trace, config: Dict[str, Any]) -> tuple[object, Dict[str, Any]]:
@@ -760,18 +858,14 @@ def _process_standard_source(
     if overlap >= batch_rows:
         batch_rows = max(overlap + 1, batch_rows)
 
-    group_stats, _ = _compute_group_stats(dataset, batch_rows, max_rows)
+    sketch_k = int(config.get("preprocess", {}).get("sketch_k", 200))
+    residual_cfg = _source_preprocess_cfg(config, source) if source in {"geomag", "aef"} else None
+    group_stats, _, sketches = _compute_group_stats(
+        dataset, batch_rows, max_rows, sketch_k, residual_cfg=residual_cfg, overlap=overlap
+    )
     if not group_stats:
         return {}, {}
-
-    mean_std = {
-        key: (
-            stats["sum"] / stats["count"],
-            _stats_from_sum(stats) or 1.0,
-        )
-        for key, stats in group_stats.items()
-        if stats["count"] > 0
-    }
+    series_stats = _series_stats(group_stats, sketches)
 
     output_base = output_paths.standard / f"source={source}"
     if output_base.exists():
@@ -793,7 +887,6 @@ def _process_standard_source(
     after_stats = {"count": 0, "sum": 0.0, "sum_sq": 0.0}
 
     tails: Dict[Tuple[str, str], pd.DataFrame] = {}
-    part_counters: Dict[Path, int] = {}
     seen = 0
     scanner = dataset.scanner(
         columns=[
@@ -813,7 +906,7 @@ def _process_standard_source(
         batch_size=batch_rows,
     )
 
-    try:
+    with ParquetWriterPool(output_base, config, source=source) as pool:
         for batch in scanner.to_batches():
             df = batch.to_pandas()
             if df.empty:
@@ -832,9 +925,8 @@ def _process_standard_source(
                 else:
                     combined_raw = group
                 combined_raw = combined_raw.sort_values("ts_ms")
-                mean, std = mean_std.get(key, (None, None))
                 cleaned, before_values = _clean_timeseries_group(
-                    combined_raw, config, source, mean, std
+                    combined_raw, config, source, series_stats.get(key)
                 )
                 if overlap > 0 and len(cleaned) > overlap:
                     to_write = cleaned.iloc[:-overlap].copy()
@@ -860,12 +952,7 @@ def _process_standard_source(
                     ):
                         if expanded.empty:
                             continue
-                        part_counters = write_parquet_partitioned(
-                            expanded,
-                            output_base,
-                            config,
-                            part_counters=part_counters,
-                        )
+                        pool.write(expanded)
                         ts_min = int(expanded["ts_ms"].min())
                         ts_max = int(expanded["ts_ms"].max())
                         report["ts_min"] = (
@@ -898,20 +985,14 @@ def _process_standard_source(
                 _update_sum_stats(after_stats, after_vals)
 
                 if not expand_cfg:
-                    part_counters = write_parquet_partitioned(
-                        to_write,
-                        output_base,
-                        config,
-                        part_counters=part_counters,
-                    )
+                    pool.write(to_write)
             gc.collect()
 
         for key, tail_raw in tails.items():
             if tail_raw.empty:
                 continue
-            mean, std = mean_std.get(key, (None, None))
             cleaned, before_values = _clean_timeseries_group(
-                tail_raw, config, source, mean, std
+                tail_raw, config, source, series_stats.get(key)
             )
             if cleaned.empty:
                 continue
@@ -928,12 +1009,7 @@ def _process_standard_source(
                 ):
                     if expanded.empty:
                         continue
-                    part_counters = write_parquet_partitioned(
-                        expanded,
-                        output_base,
-                        config,
-                        part_counters=part_counters,
-                    )
+                    pool.write(expanded)
                     ts_min = int(expanded["ts_ms"].min())
                     ts_max = int(expanded["ts_ms"].max())
                     report["ts_min"] = (
@@ -963,14 +1039,13 @@ def _process_standard_source(
             after_vals = after_vals[~np.isnan(after_vals)]
             _update_sum_stats(after_stats, after_vals)
             if not expand_cfg:
-                part_counters = write_parquet_partitioned(
-                    cleaned,
-                    output_base,
-                    config,
-                    part_counters=part_counters,
-                )
-    finally:
-        pass
+                pool.write(cleaned)
+
+    _write_series_sketches(output_base, source, series_stats, sketches)
+    if resolve_layout(config, source) == "wide":
+        layout = widen_dataset(output_base, config, source=source)
+        report["layout"] = "wide"
+        report["wide_rows"] = layout.get("wide_rows")
 
     report["station_count"] = int(len(station_ids))
     report["missing_rate"] = float(missing_count / report["rows"]) if report["rows"] else None
@@ -1017,7 +1092,7 @@ def run_standard(
         seismic_dir = output_paths.standard / "source=seismic"
         if seismic_dir.exists():
             shutil.rmtree(seismic_dir)
-        write_parquet_partitioned(seismic_df, seismic_dir, config)
+        write_parquet_partitioned(seismic_df, seismic_dir, config, source="seismic")
         reports["seismic"] = basic_stats(seismic_df)
 
     vlf_df = _vlf_features(config, output_paths.raw, max_rows, params_hash)
@@ -1025,8 +1100,17 @@ def run_standard(
         vlf_dir = output_paths.standard / "source=vlf"
         if vlf_dir.exists():
             shutil.rmtree(vlf_dir)
-        write_parquet_partitioned(vlf_df, vlf_dir, config)
+        write_parquet_partitioned(vlf_df, vlf_dir, config, source="vlf")
         reports["vlf"] = basic_stats(vlf_df)
 
     write_dq_report(output_paths.reports / "dq_standard.json", {"sources": reports})
     write_json(output_paths.reports / "filter_effect.json", filter_reports)
+    update_json(
+        output_paths.reports / "compression.json",
+        {
+            "standard": {
+                source: column_byte_breakdown(output_paths.standard / f"source={source}")
+                for source in reports
+            }
+        },
+    )
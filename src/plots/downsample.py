@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+
+
+def _extremes(y: np.ndarray) -> np.ndarray:
+    return np.array([int(np.argmin(y)), int(np.argmax(y))])
+
+
+def minmax_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    buckets = max(int(max_points) // 2, 1)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    bucket = np.repeat(np.arange(buckets), np.diff(edges))
+    order = np.lexsort((y, bucket))
+    picks = np.concatenate([order[edges[:-1]], order[edges[1:] - 1]])
+    return np.unique(picks)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    target = max(int(max_points) - 2, 3)
+    edges = np.linspace(1, n - 1, target - 1).astype(np.int64)
+    selected = np.empty(target, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for idx in range(target - 2):
+        start, end = edges[idx], edges[idx + 1]
+        if idx + 2 < len(edges):
+            next_x = x[end : edges[idx + 2]].mean()
+            next_y = y[end : edges[idx + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs(
+            (x[prev] - next_x) * (y[start:end] - y[prev]) - (x[prev] - x[start:end]) * (next_y - y[prev])
+        )
+        prev = start + int(np.argmax(area))
+        selected[idx + 1] = prev
+    return np.unique(np.concatenate([selected, _extremes(y)]))
+
+
+def downsample_indices(x: np.ndarray, y: np.ndarray, max_points: int, method: str = "minmax") -> np.ndarray:
+    if method == "minmax":
+        return minmax_indices(y, max_points)
+    if method == "lttb":
+        return lttb_indices(x, y, max_points)
+    raise ValueError(f"Unknown downsample method: {method}")
+
+
+def bucket_max(z: np.ndarray, max_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    z = np.asarray(z, dtype=float)
+    n = z.shape[0]
+    if n <= max_rows:
+        return np.arange(n), z
+    edges = np.linspace(0, n, int(max_rows) + 1).astype(np.int64)
+    return edges[:-1], np.fmax.reduceat(z, edges[:-1], axis=0)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, Iterable, List, Sequence
+
+import numpy as np
+
+
+class QuantileSketch:
+    def __init__(self, k: int = 200) -> None:
+        self.k = max(int(k), 8)
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._offset = 0
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * (2.0 / 3.0) ** depth)), 2)
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                paired = items[: len(items) - len(keep)]
+                promoted = paired[self._offset :: 2]
+                self._offset ^= 1
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                level = 0
+                continue
+            level += 1
+
+    def update(self, values: Iterable[float]) -> None:
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        self.count += int(values.size)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.count == 0:
+            return
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        qs = np.asarray(qs, dtype=float)
+        if self.count == 0:
+            return np.full(qs.shape, np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(len(level_items), 2.0**level) for level, level_items in enumerate(self.levels)]
+        )
+        order = np.argsort(items, kind="stable")
+        items = items[order]
+        cumulative = np.cumsum(weights[order])
+        pos = np.searchsorted(cumulative, qs * cumulative[-1], side="left")
+        result = items[np.clip(pos, 0, len(items) - 1)]
+        result = np.where(qs <= 0, self.min, result)
+        return np.where(qs >= 1, self.max, result)
+
+    def quantile(self, q: float) -> float:
+        return float(self.quantiles([q])[0])
+
+    def mad(self) -> float:
+        if self.count == 0:
+            return float("nan")
+        items = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(len(level_items), 2.0**level) for level, level_items in enumerate(self.levels)]
+        )
+        deviations = np.abs(items - self.quantile(0.5))
+        order = np.argsort(deviations, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        pos = int(np.searchsorted(cumulative, 0.5 * cumulative[-1], side="left"))
+        return float(deviations[order][min(pos, len(order) - 1)])
+
+    def to_record(self) -> Dict[str, Any]:
+        return {
+            "sketch_items": np.concatenate(self.levels).tolist(),
+            "sketch_levels": [int(len(items)) for items in self.levels],
+            "sketch_count": int(self.count),
+            "sketch_min": float(self.min) if self.count else None,
+            "sketch_max": float(self.max) if self.count else None,
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any], k: int = 200) -> "QuantileSketch":
+        sketch = cls(k)
+        items = record.get("sketch_items")
+        items = np.asarray([] if items is None else items, dtype=float)
+        sizes = record.get("sketch_levels")
+        sizes = [] if sizes is None else [int(size) for size in sizes]
+        if sizes:
+            bounds = np.cumsum([0] + sizes)
+            sketch.levels = [items[bounds[idx] : bounds[idx + 1]] for idx in range(len(sizes))]
+        sketch.count = int(record.get("sketch_count") or 0)
+        if sketch.count:
+            sketch.min = float(record["sketch_min"])
+            sketch.max = float(record["sketch_max"])
+        return sketch
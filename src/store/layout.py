@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.constants import BASE_COLUMNS
+from src.store.parquet import (
+    apply_value_dtype,
+    encoding_writer_options,
+    list_dataset_files,
+    list_leaf_partitions,
+    open_dataset,
+    parquet_writer_options,
+    read_parquet_filtered,
+    recover_partition_replacements,
+    remove_dataset_metadata,
+    replace_partition_files,
+    resolve_encodings,
+    staged_part_paths,
+    write_dataset_metadata,
+)
+from src.utils import write_json
+
+LAYOUT_FILE = "_layout.json"
+STATIONS_FILE = "_stations.parquet"
+VALUE_PREFIX = "value__"
+FLAGS_PREFIX = "quality_flags__"
+STATION_COLUMNS = ["station_id", "source", "lat", "lon", "elev", "proc_stage", "proc_version", "params_hash"]
+
+
+def resolve_layout(config: Dict[str, Any], source: str) -> str:
+    layout_cfg = ((config.get("storage") or {}).get("standard") or {}).get("layout") or {}
+    if isinstance(layout_cfg, str):
+        return layout_cfg.lower()
+    return str(layout_cfg.get(source, "long")).lower()
+
+
+def read_layout(dataset_dir: Path) -> Dict[str, Any]:
+    path = dataset_dir / LAYOUT_FILE
+    if not path.exists():
+        return {"layout": "long"}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _dataset_channels(files: List[Path]) -> List[str]:
+    channels = set()
+    for path in files:
+        column = pq.read_table(path, columns=["channel"])["channel"]
+        channels.update(item for item in pc.unique(column).to_pylist() if item is not None)
+    return sorted(channels)
+
+
+def _wide_schema(channels: List[str]) -> pa.Schema:
+    fields = [pa.field("ts_ms", pa.int64()), pa.field("station_id", pa.string())]
+    for channel in channels:
+        fields.append(pa.field(f"{VALUE_PREFIX}{channel}", pa.float64()))
+        fields.append(pa.field(f"{FLAGS_PREFIX}{channel}", pa.string()))
+    return pa.schema(fields)
+
+
+def _to_wide(df: pd.DataFrame, channels: List[str]) -> pd.DataFrame:
+    df = df.drop_duplicates(subset=["ts_ms", "channel"], keep="last")
+    pivot = df.set_index(["ts_ms", "channel"])[["value", "quality_flags"]].unstack("channel")
+    wide = pd.DataFrame({"ts_ms": pivot.index.to_numpy(dtype="int64")})
+    wide["station_id"] = str(df["station_id"].iloc[0])
+    for channel in channels:
+        if ("value", channel) in pivot.columns:
+            wide[f"{VALUE_PREFIX}{channel}"] = pivot[("value", channel)].to_numpy(dtype=float)
+            wide[f"{FLAGS_PREFIX}{channel}"] = pivot[("quality_flags", channel)].to_numpy(dtype=object)
+        else:
+            wide[f"{VALUE_PREFIX}{channel}"] = np.nan
+            wide[f"{FLAGS_PREFIX}{channel}"] = None
+    return wide.sort_values("ts_ms", kind="stable").reset_index(drop=True)
+
+
+def _station_record(df: pd.DataFrame) -> Dict[str, Any]:
+    record = {}
+    for col in STATION_COLUMNS:
+        if col not in df.columns:
+            record[col] = None
+            continue
+        values = df[col].dropna()
+        record[col] = values.iloc[0] if not values.empty else None
+    return record
+
+
+def widen_dataset(
+    dataset_dir: Path, config: Dict[str, Any], source: Optional[str] = None
+) -> Dict[str, Any]:
+    if read_layout(dataset_dir).get("layout") == "wide":
+        return read_layout(dataset_dir)
+    recover_partition_replacements(dataset_dir)
+    files = list_dataset_files(dataset_dir)
+    if not files:
+        return {}
+    channels = _dataset_channels(files)
+    encodings = resolve_encodings(config, source)
+    schema = apply_value_dtype(_wide_schema(channels).empty_table(), encodings).schema
+    writer_options = {**parquet_writer_options(config), **encoding_writer_options(schema, encodings)}
+    parquet_cfg = (config.get("storage") or {}).get("parquet") or {}
+    row_group_rows = int(parquet_cfg.get("row_group_rows") or 65_536)
+
+    stations: Dict[str, Dict[str, Any]] = {}
+    long_rows = 0
+    wide_rows = 0
+    remove_dataset_metadata(dataset_dir)
+    for part_dir in list_leaf_partitions(dataset_dir):
+        part_files = [path for path in files if path.parent == part_dir]
+        table = pa.concat_tables([pq.read_table(path) for path in part_files], promote_options="default")
+        df = table.to_pandas()
+        if df.empty:
+            continue
+        long_rows += len(df)
+        station_id = str(df["station_id"].iloc[0])
+        stations.setdefault(station_id, _station_record(df))
+        wide = _to_wide(df, channels)
+        wide_rows += len(wide)
+
+        [temp_path] = staged_part_paths(part_dir, 1)
+        try:
+            pq.write_table(
+                pa.Table.from_pandas(wide, schema=schema, preserve_index=False),
+                temp_path,
+                row_group_size=row_group_rows,
+                **writer_options,
+            )
+        except Exception:
+            temp_path.unlink(missing_ok=True)
+            raise
+        replace_partition_files(part_dir, [temp_path], part_files)
+
+    station_df = pd.DataFrame.from_records(list(stations.values()), columns=STATION_COLUMNS)
+    pq.write_table(pa.Table.from_pandas(station_df, preserve_index=False), dataset_dir / STATIONS_FILE)
+    layout = {
+        "layout": "wide",
+        "channels": channels,
+        "long_rows": int(long_rows),
+        "wide_rows": int(wide_rows),
+    }
+    write_dataset_metadata(dataset_dir)
+    write_json(dataset_dir / LAYOUT_FILE, layout)
+    return layout
+
+
+def _long_view(wide: pd.DataFrame, stations: pd.DataFrame, channels: List[str]) -> pd.DataFrame:
+    frames = []
+    for channel in channels:
+        value_col = f"{VALUE_PREFIX}{channel}"
+        flags_col = f"{FLAGS_PREFIX}{channel}"
+        if value_col not in wide.columns:
+            continue
+        present = wide[value_col].notna() | wide[flags_col].notna()
+        if not present.any():
+            continue
+        subset = wide.loc[present]
+        frames.append(
+            pd.DataFrame(
+                {
+                    "ts_ms": subset["ts_ms"].to_numpy(),
+                    "station_id": subset["station_id"].to_numpy(),
+                    "channel": channel,
+                    "value": subset[value_col].to_numpy(),
+                    "quality_flags": subset[flags_col].to_numpy(),
+                }
+            )
+        )
+    if not frames:
+        return pd.DataFrame(columns=BASE_COLUMNS)
+    long_df = pd.concat(frames, ignore_index=True)
+    long_df["station_id"] = long_df["station_id"].astype(str)
+    long_df = long_df.merge(stations, on="station_id", how="left")
+    long_df = long_df.sort_values(["station_id", "ts_ms", "channel"], kind="stable").reset_index(drop=True)
+    extra = [col for col in long_df.columns if col not in BASE_COLUMNS]
+    return long_df[[col for col in BASE_COLUMNS if col in long_df.columns] + extra]
+
+
+def _wide_stations(path: Path) -> pd.DataFrame:
+    stations_path = path / STATIONS_FILE
+    stations = (
+        pd.read_parquet(stations_path)
+        if stations_path.exists()
+        else pd.DataFrame(columns=STATION_COLUMNS)
+    )
+    stations = stations.copy()
+    stations["station_id"] = stations["station_id"].astype(str)
+    return stations
+
+
+def _wide_batches(path: Path, layout: Dict[str, Any], filters: Optional[ds.Expression]) -> Iterator[pd.DataFrame]:
+    stations = _wide_stations(path)
+    channels = layout.get("channels", [])
+    for batch in open_dataset(path).scanner(filter=filters).to_batches():
+        if batch.num_rows == 0:
+            continue
+        wide = batch.to_pandas()
+        long_df = _long_view(wide.drop(columns=["date"], errors="ignore"), stations, channels)
+        if long_df.empty:
+            continue
+        if "date" in wide.columns:
+            long_df["date"] = pd.to_datetime(long_df["ts_ms"], unit="ms", utc=True).dt.strftime("%Y-%m-%d")
+        yield long_df
+
+
+def iter_standard_batches(
+    path: Path,
+    filters: Optional[ds.Expression] = None,
+    columns: Optional[List[str]] = None,
+) -> Iterator[pd.DataFrame]:
+    if not path.exists():
+        return
+    if read_layout(path).get("layout") == "wide":
+        for long_df in _wide_batches(path, read_layout(path), filters):
+            yield long_df[[col for col in columns if col in long_df.columns]] if columns else long_df
+        return
+    dataset = open_dataset(path)
+    if columns:
+        columns = [col for col in columns if col in dataset.schema.names]
+    for batch in dataset.scanner(columns=columns or None, filter=filters).to_batches():
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def read_standard_filtered(
+    path: Path,
+    filters: Optional[ds.Expression] = None,
+    columns: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+) -> pd.DataFrame:
+    layout = read_layout(path) if path.exists() else {"layout": "long"}
+    if layout.get("layout") != "wide":
+        return read_parquet_filtered(path, filters=filters, columns=columns, limit=limit)
+    frames = []
+    rows = 0
+    for long_df in _wide_batches(path, layout, filters):
+        frames.append(long_df)
+        rows += len(long_df)
+        if limit is not None and limit > 0 and rows >= limit:
+            break
+    if not frames:
+        return pd.DataFrame(columns=columns or BASE_COLUMNS)
+    long_df = pd.concat(frames, ignore_index=True)
+    long_df = long_df.sort_values(["station_id", "ts_ms", "channel"], kind="stable").reset_index(drop=True)
+    if columns:
+        long_df = long_df[[col for col in columns if col in long_df.columns]]
+    if limit is not None and limit > 0:
+        long_df = long_df.head(int(limit))
+    return long_df
+
+
+def station_bbox_filter(
+    path: Path,
+    lat_min: Optional[float] = None,
+    lat_max: Optional[float] = None,
+    lon_min: Optional[float] = None,
+    lon_max: Optional[float] = None,
+) -> Optional[ds.Expression]:
+    if lat_min is None and lat_max is None and lon_min is None and lon_max is None:
+        return None
+    stations = read_station_locations(path)
+    inside = pd.Series(True, index=stations.index)
+    if lat_min is not None:
+        inside &= stations["lat"] >= lat_min
+    if lat_max is not None:
+        inside &= stations["lat"] <= lat_max
+    if lon_min is not None:
+        inside &= stations["lon"] >= lon_min
+    if lon_max is not None:
+        inside &= stations["lon"] <= lon_max
+    station_ids = sorted(stations.loc[inside, "station_id"].astype(str).unique())
+    return ds.field("station_id").isin(pa.array(station_ids, type=pa.string()))
+
+
+def read_station_locations(path: Path, filters: Optional[ds.Expression] = None) -> pd.DataFrame:
+    if read_layout(path).get("layout") == "wide":
+        stations_path = path / STATIONS_FILE
+        if not stations_path.exists():
+            return pd.DataFrame(columns=["station_id", "lat", "lon", "elev"])
+        stations = pd.read_parquet(stations_path, columns=["station_id", "lat", "lon", "elev"])
+    else:
+        stations = read_parquet_filtered(path, filters=filters, columns=["station_id", "lat", "lon", "elev"])
+    stations = stations.drop_duplicates(subset=["station_id", "lat", "lon"]).reset_index(drop=True)
+    stations["station_id"] = stations["station_id"].astype(str)
+    return stations
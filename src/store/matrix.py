@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.utils import ensure_dir, write_json
+
+MATRIX_DIR = "matrix"
+SERIES_KEYS = ["source", "station_id", "channel"]
+
+
+@dataclass
+class AlignedMatrix:
+    values: np.ndarray
+    ts_ms: np.ndarray
+    mask: np.ndarray
+    columns: pd.DataFrame
+
+    @property
+    def empty(self) -> bool:
+        return self.values.size == 0
+
+    def column_groups(self, keys: List[str]) -> dict:
+        return {
+            (key if isinstance(key, tuple) else (key,)): group.index.to_numpy()
+            for key, group in self.columns.groupby(keys, sort=True)
+        }
+
+    def combined(self, positions: np.ndarray) -> np.ndarray:
+        block = self.values[:, positions]
+        if block.shape[1] == 1:
+            return block[:, 0]
+        observed = ~self.mask[:, positions]
+        result = np.full(block.shape[0], np.nan)
+        rows = observed.any(axis=1)
+        if rows.any():
+            result[rows] = np.nanmedian(block[rows], axis=1)
+        return result
+
+
+def build_aligned_matrix(
+    aligned_df: pd.DataFrame, start_ms: int, end_ms: int, interval_ms: int
+) -> AlignedMatrix:
+    first_bin = (start_ms // interval_ms) * interval_ms
+    ts_ms = np.arange(first_bin, end_ms + 1, interval_ms, dtype="int64")
+    if aligned_df.empty:
+        return AlignedMatrix(
+            values=np.empty((len(ts_ms), 0)),
+            ts_ms=ts_ms,
+            mask=np.empty((len(ts_ms), 0), dtype=bool),
+            columns=pd.DataFrame(columns=SERIES_KEYS),
+        )
+    df = aligned_df[["ts_ms"] + SERIES_KEYS + ["value"]].copy()
+    df["value"] = pd.to_numeric(df["value"], errors="coerce")
+    df = df.dropna(subset=["ts_ms", "source", "channel", "value"])
+    df["station_id"] = df["station_id"].astype(str)
+    df["bin"] = (df["ts_ms"].to_numpy(dtype="int64") - first_bin) // interval_ms
+    df = df[(df["bin"] >= 0) & (df["bin"] < len(ts_ms))]
+    df["col"] = df.groupby(SERIES_KEYS, sort=True).ngroup()
+    columns = (
+        df.drop_duplicates("col").sort_values("col")[SERIES_KEYS].reset_index(drop=True)
+    )
+    reduced = df.groupby(["col", "bin"], sort=False)["value"].median()
+    values = np.full((len(ts_ms), len(columns)), np.nan)
+    cols = reduced.index.get_level_values("col").to_numpy()
+    bins = reduced.index.get_level_values("bin").to_numpy()
+    values[bins, cols] = reduced.to_numpy()
+    return AlignedMatrix(values=values, ts_ms=ts_ms, mask=np.isnan(values), columns=columns)
+
+
+def write_aligned_matrix(matrix: AlignedMatrix, linked_dir: Path) -> Path:
+    matrix_dir = linked_dir / MATRIX_DIR
+    if matrix_dir.exists():
+        shutil.rmtree(matrix_dir)
+    ensure_dir(matrix_dir)
+    np.save(matrix_dir / "values.npy", np.ascontiguousarray(matrix.values))
+    np.save(matrix_dir / "ts_ms.npy", matrix.ts_ms)
+    np.save(matrix_dir / "mask.npy", np.ascontiguousarray(matrix.mask))
+    matrix.columns.to_parquet(matrix_dir / "columns.parquet", index=False)
+    write_json(
+        matrix_dir / "matrix.json",
+        {
+            "n_bins": int(matrix.values.shape[0]),
+            "n_series": int(matrix.values.shape[1]),
+            "observed": int((~matrix.mask).sum()),
+        },
+    )
+    return matrix_dir
+
+
+def load_aligned_matrix(linked_dir: Path) -> Optional[AlignedMatrix]:
+    matrix_dir = linked_dir / MATRIX_DIR
+    if not (matrix_dir / "values.npy").exists():
+        return None
+    return AlignedMatrix(
+        values=np.load(matrix_dir / "values.npy", mmap_mode="r"),
+        ts_ms=np.load(matrix_dir / "ts_ms.npy", mmap_mode="r"),
+        mask=np.load(matrix_dir / "mask.npy", mmap_mode="r"),
+        columns=pd.read_parquet(matrix_dir / "columns.parquet"),
+    )
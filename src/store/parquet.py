@@ -4,6 +4,8 @@ import json
 import math
 import os
 import shutil
+import time
+from collections import OrderedDict
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
@@ -12,7 +14,7 @@ import pyarrow as pa
 import pyarrow.dataset as ds
 import pyarrow.parquet as pq
 
-from src.utils import ensure_dir
+from src.utils import ensure_dir, write_json
 
 
 def _normalize_flags(df: pd.DataFrame) -> pd.DataFrame:
@@ -55,6 +57,92 @@ def _resolve_config_compression(config: Dict[str, Any]) -> str:
     return parquet_cfg.get("compression", "zstd")
 
 
+def _resolve_config_int(config: Dict[str, Any], key: str, default: int) -> int:
+    parquet_cfg = (config.get("storage") or {}).get("parquet") or {}
+    value = parquet_cfg.get(key)
+    if value is None:
+        return default
+    value = int(value)
+    return value if value > 0 else default
+
+
+def _resolve_sort_by(config: Dict[str, Any]) -> List[str]:
+    parquet_cfg = (config.get("storage") or {}).get("parquet") or {}
+    sort_by = parquet_cfg.get("sort_by")
+    if sort_by is None:
+        return ["ts_ms"]
+    return [str(col) for col in sort_by]
+
+
+def _resolve_page_index(config: Dict[str, Any]) -> bool:
+    parquet_cfg = (config.get("storage") or {}).get("parquet") or {}
+    return bool(parquet_cfg.get("page_index", True))
+
+
+def parquet_writer_options(config: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "compression": _resolve_config_compression(config),
+        "write_page_index": _resolve_page_index(config),
+        "data_page_size": _resolve_config_int(config, "data_page_size", 256 * 1024),
+    }
+
+
+def resolve_encodings(config: Dict[str, Any], source: Optional[str]) -> Dict[str, Any]:
+    parquet_cfg = (config.get("storage") or {}).get("parquet") or {}
+    encodings_cfg = parquet_cfg.get("encodings") or {}
+    if not source:
+        return {}
+    return dict(encodings_cfg.get(source) or {})
+
+
+def _is_value_column(name: str) -> bool:
+    return name == "value" or name.startswith("value__")
+
+
+NULL_FIELD_TYPES = {"ts_ms": pa.int64(), "lat": pa.float64(), "lon": pa.float64(), "elev": pa.float64()}
+
+
+def _fill_null_types(table: pa.Table) -> pa.Table:
+    # An all-None object column arrives as the null type, which later batches cannot be cast to;
+    # give it the declared column type (strings unless it is a timestamp, coordinate or value column).
+    for index, field in enumerate(table.schema):
+        if not pa.types.is_null(field.type):
+            continue
+        if _is_value_column(field.name):
+            target = pa.float64()
+        else:
+            target = NULL_FIELD_TYPES.get(field.name, pa.string())
+        table = table.set_column(index, field.with_type(target), table.column(index).cast(target))
+    return table
+
+
+def apply_value_dtype(table: pa.Table, encodings: Dict[str, Any]) -> pa.Table:
+    if str(encodings.get("value_dtype", "float64")).lower() != "float32":
+        return table
+    for index, field in enumerate(table.schema):
+        if _is_value_column(field.name) and pa.types.is_float64(field.type):
+            table = table.set_column(index, field.with_type(pa.float32()), table.column(index).cast(pa.float32()))
+    return table
+
+
+def encoding_writer_options(schema: pa.Schema, encodings: Dict[str, Any]) -> Dict[str, Any]:
+    column_encoding = {}
+    ts_encoding = encodings.get("ts_encoding")
+    if ts_encoding and "ts_ms" in schema.names:
+        ts_encoding = str(ts_encoding).upper()
+        column_encoding["ts_ms"] = "DELTA_BINARY_PACKED" if ts_encoding == "DELTA" else ts_encoding
+    if encodings.get("byte_stream_split"):
+        for field in schema:
+            if pa.types.is_floating(field.type):
+                column_encoding[field.name] = "BYTE_STREAM_SPLIT"
+    if not column_encoding:
+        return {}
+    return {
+        "column_encoding": column_encoding,
+        "use_dictionary": [name for name in schema.names if name not in column_encoding],
+    }
+
+
 def _resolve_partition_cols(config: Dict[str, Any]) -> List[str]:
     parquet_cfg = (config.get("storage") or {}).get("parquet") or {}
     cols = parquet_cfg.get("partition_cols")
@@ -236,13 +324,372 @@ def write_parquet_configured(
     )
 
 
+METADATA_FILE = "_metadata"
+COMMON_METADATA_FILE = "_common_metadata"
+ZONE_MAP_FILE = "_zonemap.json"
+ZONE_MAP_COLUMNS = [("ts_ms", "ts_ms"), ("start_ms", "end_ms")]
+
+_DATASET_CACHE: Dict[str, tuple] = {}
+
+
+REPLACE_JOURNAL = "_replace.json"
+
+
+def _read_journal(journal_path: Path) -> Optional[Dict[str, List[str]]]:
+    try:
+        return json.loads(journal_path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def list_dataset_files(dataset_dir: Path) -> List[Path]:
+    # A partition with a pending replace journal resolves to the journal's new files only, so readers never
+    # see both generations even if the writer stopped between publishing the new parts and deleting the old.
+    for _ in range(3):
+        files = set()
+        journals = []
+        for path in dataset_dir.rglob("*"):
+            if path.name == REPLACE_JOURNAL:
+                journals.append(path)
+            elif path.suffix == ".parquet" and not any(
+                part.startswith((".", "_")) for part in path.relative_to(dataset_dir).parts
+            ):
+                files.add(path)
+        settled = True
+        for journal_path in journals:
+            journal = _read_journal(journal_path)
+            if journal is None:
+                settled = False
+                break
+            part_dir = journal_path.parent
+            files.difference_update(part_dir / name for name in journal["old"])
+            for staged_name, final_name in zip(journal["staged"], journal["final"]):
+                final = part_dir / final_name
+                files.add(final if final.exists() else part_dir / staged_name)
+        if settled:
+            break
+    return sorted(files)
+
+
+def _column_range(metadata: pq.FileMetaData, min_col: str, max_col: str) -> tuple:
+    names = metadata.schema.names
+    if min_col not in names or max_col not in names:
+        return None, None
+    min_idx = names.index(min_col)
+    max_idx = names.index(max_col)
+    lows, highs = [], []
+    for rg in range(metadata.num_row_groups):
+        row_group = metadata.row_group(rg)
+        low_stats = row_group.column(min_idx).statistics
+        high_stats = row_group.column(max_idx).statistics
+        if low_stats is None or high_stats is None or not low_stats.has_min_max or not high_stats.has_min_max:
+            return None, None
+        lows.append(low_stats.min)
+        highs.append(high_stats.max)
+    if not lows:
+        return None, None
+    return int(min(lows)), int(max(highs))
+
+
+def remove_dataset_metadata(dataset_dir: Path) -> None:
+    for name in (METADATA_FILE, COMMON_METADATA_FILE, ZONE_MAP_FILE):
+        path = dataset_dir / name
+        if path.exists():
+            path.unlink()
+    _DATASET_CACHE.pop(str(dataset_dir), None)
+
+
+def write_dataset_metadata(dataset_dir: Path) -> Dict[str, Any]:
+    recover_partition_replacements(dataset_dir)
+    files = list_dataset_files(dataset_dir)
+    remove_dataset_metadata(dataset_dir)
+    if not files:
+        return {}
+    schema = pq.read_schema(files[0])
+    collected = []
+    fragments = []
+    for path in files:
+        metadata = pq.read_metadata(path)
+        relative = path.relative_to(dataset_dir).as_posix()
+        entry = {
+            "path": relative,
+            "rows": int(metadata.num_rows),
+            "row_groups": int(metadata.num_row_groups),
+            "bytes": int(path.stat().st_size),
+            "ts_min": None,
+            "ts_max": None,
+        }
+        for min_col, max_col in ZONE_MAP_COLUMNS:
+            ts_min, ts_max = _column_range(metadata, min_col, max_col)
+            if ts_min is not None:
+                entry["ts_min"], entry["ts_max"] = ts_min, ts_max
+                break
+        fragments.append(entry)
+        metadata.set_file_path(relative)
+        collected.append(metadata)
+
+    write_json(dataset_dir / ZONE_MAP_FILE, {"fragments": fragments})
+    try:
+        pq.write_metadata(schema, dataset_dir / COMMON_METADATA_FILE)
+        pq.write_metadata(schema, dataset_dir / METADATA_FILE, metadata_collector=collected)
+    except (pa.ArrowException, RuntimeError):
+        # Fragments with diverging schemas cannot share one footer; fall back to discovery.
+        for name in (METADATA_FILE, COMMON_METADATA_FILE):
+            if (dataset_dir / name).exists():
+                (dataset_dir / name).unlink()
+    return {"fragments": len(fragments), "rows": int(sum(item["rows"] for item in fragments))}
+
+
+def read_zone_map(dataset_dir: Path) -> List[Dict[str, Any]]:
+    path = dataset_dir / ZONE_MAP_FILE
+    if not path.exists():
+        return []
+    return json.loads(path.read_text(encoding="utf-8")).get("fragments", [])
+
+
+def column_byte_breakdown(dataset_dir: Path) -> Dict[str, Any]:
+    files = list_dataset_files(dataset_dir)
+    columns: Dict[str, Dict[str, Any]] = {}
+    rows = 0
+    for path in files:
+        metadata = pq.read_metadata(path)
+        rows += int(metadata.num_rows)
+        for rg_index in range(metadata.num_row_groups):
+            row_group = metadata.row_group(rg_index)
+            for col_index in range(row_group.num_columns):
+                chunk = row_group.column(col_index)
+                entry = columns.setdefault(
+                    chunk.path_in_schema,
+                    {
+                        "physical_type": chunk.physical_type,
+                        "compressed_bytes": 0,
+                        "uncompressed_bytes": 0,
+                        "encodings": set(),
+                    },
+                )
+                entry["compressed_bytes"] += int(chunk.total_compressed_size)
+                entry["uncompressed_bytes"] += int(chunk.total_uncompressed_size)
+                entry["encodings"].update(chunk.encodings)
+    for entry in columns.values():
+        entry["encodings"] = sorted(entry["encodings"])
+        entry["bytes_per_row"] = float(entry["compressed_bytes"] / rows) if rows else None
+    return {
+        "files": len(files),
+        "rows": rows,
+        "total_bytes": int(sum(path.stat().st_size for path in files)),
+        "columns": columns,
+    }
+
+
+def open_dataset(path: Path) -> ds.Dataset:
+    metadata_path = path / METADATA_FILE
+    if not metadata_path.exists():
+        files = list_dataset_files(path)
+        if not files:
+            return ds.dataset(path, format="parquet", partitioning="hive")
+        return ds.dataset(
+            [str(file) for file in files], format="parquet", partitioning="hive", partition_base_dir=str(path)
+        )
+    stamp = metadata_path.stat().st_mtime_ns
+    cached = _DATASET_CACHE.get(str(path))
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    dataset = ds.parquet_dataset(
+        str(metadata_path), partitioning="hive", partition_base_dir=str(path)
+    )
+    _DATASET_CACHE[str(path)] = (stamp, dataset)
+    return dataset
+
+
+INPROGRESS_SUFFIX = ".inprogress"
+
+
+def _next_part_index(part_dir: Path) -> int:
+    indices = []
+    names = [path.name for path in part_dir.glob("part-*.parquet")]
+    names += [path.name[1 : -len(INPROGRESS_SUFFIX)] for path in part_dir.glob(f".part-*.parquet{INPROGRESS_SUFFIX}")]
+    for name in names:
+        try:
+            indices.append(int(Path(name).stem.split("-", 1)[1]))
+        except (IndexError, ValueError):
+            continue
+    return max(indices) + 1 if indices else 0
+
+
+class ParquetWriterPool:
+    def __init__(
+        self,
+        output_dir: Path,
+        config: Dict[str, Any],
+        partition_cols: Optional[List[str]] = None,
+        part_counters: Optional[Dict[Path, int]] = None,
+        source: Optional[str] = None,
+    ) -> None:
+        self.output_dir = output_dir
+        self.partition_cols = (
+            list(partition_cols) if partition_cols is not None else _resolve_partition_cols(config)
+        )
+        self.writer_options = parquet_writer_options(config)
+        self.encodings = resolve_encodings(config, source)
+        self.batch_rows = max(_resolve_config_batch_rows(config, default_rows=200_000), 1)
+        self.row_group_bytes = _resolve_config_int(config, "row_group_bytes", 32 * 1024 * 1024)
+        self.max_open_writers = _resolve_config_int(config, "max_open_writers", 128)
+        self.max_buffer_bytes = _resolve_config_int(config, "max_buffer_bytes", 512 * 1024 * 1024)
+        self.row_group_rows = _resolve_config_int(config, "row_group_rows", 65_536)
+        self.sort_by = _resolve_sort_by(config)
+        self.part_counters: Dict[Path, int] = part_counters if part_counters is not None else {}
+        self.files: List[Path] = []
+        self.schema: Optional[pa.Schema] = None
+        self._writers: "OrderedDict[Path, pq.ParquetWriter]" = OrderedDict()
+        self._buffers: Dict[Path, List[pa.Table]] = {}
+        self._buffer_bytes: Dict[Path, int] = {}
+        self._pending: Dict[Path, Path] = {}
+        self._closed = False
+
+    def __enter__(self) -> "ParquetWriterPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self._closed:
+            raise RuntimeError("ParquetWriterPool is closed")
+        if df.empty:
+            return
+        if not self.partition_cols:
+            self._append(self.output_dir, df)
+            return
+        df_with_parts, added_cols = _ensure_partition_cols(df, self.partition_cols)
+        grouped = df_with_parts.groupby(self.partition_cols, sort=False, dropna=False)
+        for key, group in grouped:
+            part_dir = _partition_dir(self.output_dir, self.partition_cols, key)
+            if added_cols:
+                group = group.drop(columns=added_cols, errors="ignore")
+            self._append(part_dir, group)
+
+    def _append(self, part_dir: Path, df: pd.DataFrame) -> None:
+        for batch in _iter_batches(df, self.batch_rows):
+            batch = _normalize_flags(batch).reset_index(drop=True)
+            table = pa.Table.from_pandas(batch, preserve_index=False)
+            table = apply_value_dtype(_fill_null_types(table), self.encodings)
+            if self.schema is None:
+                self.schema = table.schema
+            elif not table.schema.equals(self.schema):
+                table = table.select(self.schema.names).cast(self.schema)
+            self._buffers.setdefault(part_dir, []).append(table)
+            self._buffer_bytes[part_dir] = self._buffer_bytes.get(part_dir, 0) + table.nbytes
+            if self._buffer_bytes[part_dir] >= self.row_group_bytes:
+                self._flush(part_dir)
+        self._enforce_buffer_limit()
+
+    def _enforce_buffer_limit(self) -> None:
+        total = sum(self._buffer_bytes.values())
+        if total < self.max_buffer_bytes:
+            return
+        for part_dir in sorted(self._buffer_bytes, key=self._buffer_bytes.get, reverse=True):
+            total -= self._buffer_bytes.get(part_dir, 0)
+            self._flush(part_dir)
+            if total < self.max_buffer_bytes:
+                break
+
+    def _writer_for(self, part_dir: Path) -> pq.ParquetWriter:
+        writer = self._writers.get(part_dir)
+        if writer is not None:
+            self._writers.move_to_end(part_dir)
+            return writer
+        while len(self._writers) >= self.max_open_writers:
+            _, oldest = self._writers.popitem(last=False)
+            oldest.close()
+        ensure_dir(part_dir)
+        counter = self.part_counters.get(part_dir)
+        if counter is None:
+            counter = _next_part_index(part_dir)
+        self.part_counters[part_dir] = counter + 1
+        file_path = part_dir / f"part-{counter:05d}.parquet"
+        temp_path = inprogress_path(file_path)
+        sort_keys = self._sort_keys()
+        writer = pq.ParquetWriter(
+            temp_path,
+            self.schema,
+            sorting_columns=(
+                pq.SortingColumn.from_ordering(self.schema, sort_keys) if sort_keys else None
+            ),
+            **self.writer_options,
+            **encoding_writer_options(self.schema, self.encodings),
+        )
+        self._writers[part_dir] = writer
+        self._pending[file_path] = temp_path
+        return writer
+
+    def _sort_keys(self) -> List[tuple]:
+        if self.schema is None:
+            return []
+        return [(col, "ascending") for col in self.sort_by if col in self.schema.names]
+
+    def _flush(self, part_dir: Path) -> None:
+        tables = self._buffers.pop(part_dir, None)
+        self._buffer_bytes.pop(part_dir, None)
+        if not tables:
+            return
+        table = pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+        sort_keys = self._sort_keys()
+        if sort_keys:
+            table = table.sort_by(sort_keys)
+        writer = self._writer_for(part_dir)
+        writer.write_table(table, row_group_size=self.row_group_rows)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        try:
+            for part_dir in list(self._buffers):
+                self._flush(part_dir)
+        finally:
+            for writer in self._writers.values():
+                writer.close()
+            self._writers.clear()
+            self._closed = True
+        for file_path, temp_path in self._pending.items():
+            os.replace(temp_path, file_path)
+            self.files.append(file_path)
+        self._pending.clear()
+        if self.files:
+            write_dataset_metadata(self.output_dir)
+
+    def abort(self) -> None:
+        if self._closed:
+            return
+        for writer in self._writers.values():
+            try:
+                writer.close()
+            except Exception:
+                pass
+        self._writers.clear()
+        self._buffers.clear()
+        self._buffer_bytes.clear()
+        for temp_path in self._pending.values():
+            if temp_path.exists():
+                temp_path.unlink()
+        self._pending.clear()
+        self._closed = True
+
+
 def write_parquet_partitioned(
     df: pd.DataFrame,
     output_dir: Path,
     config: Dict[str, Any],
     partition_cols: Optional[List[str]] = None,
     part_counters: Optional[Dict[Path, int]] = None,
+    writer_pool: Optional[ParquetWriterPool] = None,
+    source: Optional[str] = None,
 ) -> Dict[Path, int]:
+    if writer_pool is not None:
+        writer_pool.write(df)
+        return writer_pool.part_counters
     if df.empty:
         return part_counters or {}
 
@@ -252,31 +699,14 @@ def write_parquet_partitioned(
         write_parquet_configured(df, output_dir, config, partition_cols=None)
         return part_counters or {}
 
-    compression = _resolve_config_compression(config)
-    batch_rows = _resolve_config_batch_rows(config, default_rows=200_000)
-    batch_rows = max(int(batch_rows), 1)
-    part_counters = part_counters or {}
-
-    df_with_parts, added_cols = _ensure_partition_cols(df, partition_cols)
-    grouped = df_with_parts.groupby(partition_cols, sort=False, dropna=False)
-    for key, group in grouped:
-        part_dir = _partition_dir(output_dir, partition_cols, key)
-        ensure_dir(part_dir)
-        if added_cols:
-            group = group.drop(columns=added_cols, errors="ignore")
-        for batch in _iter_batches(group, batch_rows):
-            batch = _normalize_flags(batch).reset_index(drop=True)
-            table = pa.Table.from_pandas(batch, preserve_index=False)
-            counter = part_counters.get(part_dir, 0)
-            file_path = part_dir / f"part-{counter:05d}.parquet"
-            part_counters[part_dir] = counter + 1
-            pq.write_table(table, file_path, compression=compression)
-    return part_counters
+    with ParquetWriterPool(output_dir, config, partition_cols, part_counters, source=source) as pool:
+        pool.write(df)
+    return pool.part_counters
 
 
 def read_parquet(path: Path) -> pd.DataFrame:
     if path.is_dir():
-        dataset = ds.dataset(path, format="parquet", partitioning="hive")
+        dataset = open_dataset(path)
         return dataset.to_table().to_pandas()
     return pd.read_parquet(path)
 
@@ -290,7 +720,7 @@ def read_parquet_filtered(
     if not path.exists():
         return pd.DataFrame()
     if path.is_dir():
-        dataset = ds.dataset(path, format="parquet", partitioning="hive")
+        dataset = open_dataset(path)
         if columns:
             available = [col for col in columns if col in dataset.schema.names]
             if not available:
@@ -313,3 +743,179 @@ def read_parquet_filtered(
             return table.to_pandas()
         return scanner.to_table().to_pandas()
     return pd.read_parquet(path, columns=columns)
+
+
+def _resolve_compaction_cfg(config: Dict[str, Any]) -> Dict[str, Any]:
+    compaction_cfg = (config.get("storage") or {}).get("compaction") or {}
+    sort_by = compaction_cfg.get("sort_by") or ["station_id", "channel", "ts_ms"]
+    return {
+        "target_file_bytes": int(compaction_cfg.get("target_file_bytes") or 128 * 1024 * 1024),
+        "row_group_rows": int(compaction_cfg.get("row_group_rows") or 131_072),
+        "min_files": max(int(compaction_cfg.get("min_files") or 2), 1),
+        "sort_by": [str(col) for col in sort_by],
+    }
+
+
+def list_leaf_partitions(dataset_dir: Path) -> List[Path]:
+    return sorted({path.parent for path in list_dataset_files(dataset_dir)})
+
+
+def _dataset_file_stats(dataset_dir: Path) -> Dict[str, int]:
+    files = list_dataset_files(dataset_dir)
+    return {"files": len(files), "bytes": int(sum(path.stat().st_size for path in files))}
+
+
+def _time_full_scan(dataset_dir: Path) -> float:
+    _DATASET_CACHE.pop(str(dataset_dir), None)
+    tick = time.perf_counter()
+    dataset = open_dataset(dataset_dir)
+    for _ in dataset.scanner().to_batches():
+        pass
+    return round(time.perf_counter() - tick, 4)
+
+
+def inprogress_path(file_path: Path) -> Path:
+    return file_path.parent / f".{file_path.name}{INPROGRESS_SUFFIX}"
+
+
+def staged_part_paths(part_dir: Path, count: int) -> List[Path]:
+    first_index = _next_part_index(part_dir)
+    return [inprogress_path(part_dir / f"part-{first_index + index:05d}.parquet") for index in range(count)]
+
+
+def _finish_replacement(part_dir: Path, journal: Dict[str, List[str]]) -> None:
+    for staged_name, final_name in zip(journal["staged"], journal["final"]):
+        staged = part_dir / staged_name
+        if staged.exists():
+            os.replace(staged, part_dir / final_name)
+    for name in journal["old"]:
+        if name not in journal["final"]:
+            (part_dir / name).unlink(missing_ok=True)
+    (part_dir / REPLACE_JOURNAL).unlink(missing_ok=True)
+
+
+def recover_partition_replacements(dataset_dir: Path) -> int:
+    recovered = 0
+    for journal_path in sorted(dataset_dir.rglob(REPLACE_JOURNAL)):
+        journal = _read_journal(journal_path)
+        if journal is not None:
+            _finish_replacement(journal_path.parent, journal)
+            recovered += 1
+    return recovered
+
+
+def replace_partition_files(part_dir: Path, staged: List[Path], old_files: List[Path]) -> List[Path]:
+    for path in old_files:
+        if path.parent != part_dir or path.name.startswith((".", "_")):
+            raise ValueError(f"Refusing to replace {path}: not a data file of {part_dir}")
+    final = [part_dir / temp_path.name[1 : -len(INPROGRESS_SUFFIX)] for temp_path in staged]
+    if not old_files:
+        for temp_path, target in zip(staged, final):
+            os.replace(temp_path, target)
+        return final
+    # The journal is the commit point: before it exists readers see only the old files, afterwards only the
+    # new ones; an interrupted switch is rolled forward by the next compaction or metadata write.
+    journal = {
+        "staged": [path.name for path in staged],
+        "final": [path.name for path in final],
+        "old": [path.name for path in old_files],
+    }
+    temp_journal = part_dir / f".{REPLACE_JOURNAL}{INPROGRESS_SUFFIX}"
+    try:
+        temp_journal.write_text(json.dumps(journal), encoding="utf-8")
+        os.replace(temp_journal, part_dir / REPLACE_JOURNAL)
+    except Exception:
+        temp_journal.unlink(missing_ok=True)
+        for temp_path in staged:
+            temp_path.unlink(missing_ok=True)
+        raise
+    _finish_replacement(part_dir, journal)
+    return final
+
+
+def _compact_partition(
+    part_dir: Path,
+    files: List[Path],
+    writer_options: Dict[str, Any],
+    encodings: Dict[str, Any],
+    compaction_cfg: Dict[str, Any],
+) -> int:
+    tables = [pq.read_table(path) for path in files]
+    table = pa.concat_tables(tables, promote_options="default") if len(tables) > 1 else tables[0]
+    table = apply_value_dtype(table, encodings)
+    writer_options = {**writer_options, **encoding_writer_options(table.schema, encodings)}
+    sort_keys = [(col, "ascending") for col in compaction_cfg["sort_by"] if col in table.column_names]
+    if sort_keys:
+        table = table.sort_by(sort_keys)
+
+    input_bytes = sum(path.stat().st_size for path in files)
+    bytes_per_row = input_bytes / table.num_rows if table.num_rows else 1.0
+    rows_per_file = max(int(compaction_cfg["target_file_bytes"] / max(bytes_per_row, 1e-9)), 1)
+    row_group_rows = max(min(compaction_cfg["row_group_rows"], rows_per_file), 1)
+
+    starts = range(0, max(table.num_rows, 1), rows_per_file)
+    staged = staged_part_paths(part_dir, len(starts))
+    try:
+        for start, temp_path in zip(starts, staged):
+            pq.write_table(
+                table.slice(start, rows_per_file),
+                temp_path,
+                row_group_size=row_group_rows,
+                **writer_options,
+            )
+    except Exception:
+        for temp_path in staged:
+            temp_path.unlink(missing_ok=True)
+        raise
+    replace_partition_files(part_dir, staged, files)
+    return len(staged)
+
+
+def compact_partitioned_dataset(
+    dataset_dir: Path,
+    config: Dict[str, Any],
+    sort_by: Optional[List[str]] = None,
+    source: Optional[str] = None,
+    timed: bool = True,
+) -> Dict[str, Any]:
+    if not dataset_dir.exists():
+        return {}
+    recover_partition_replacements(dataset_dir)
+    compaction_cfg = _resolve_compaction_cfg(config)
+    if sort_by is not None:
+        compaction_cfg["sort_by"] = list(sort_by)
+    writer_options = parquet_writer_options(config)
+    encodings = resolve_encodings(config, source)
+    before = _dataset_file_stats(dataset_dir)
+    scan_before = _time_full_scan(dataset_dir) if timed and before["files"] else 0.0
+
+    compacted = 0
+    had_metadata = (dataset_dir / METADATA_FILE).exists()
+    for part_dir in list_leaf_partitions(dataset_dir):
+        files = sorted(path for path in part_dir.glob("*.parquet") if not path.name.startswith((".", "_")))
+        small_files = [
+            path for path in files if path.stat().st_size < compaction_cfg["target_file_bytes"]
+        ]
+        if len(files) < compaction_cfg["min_files"] or len(small_files) < 2:
+            continue
+        if compacted == 0:
+            remove_dataset_metadata(dataset_dir)
+        _compact_partition(part_dir, files, writer_options, encodings, compaction_cfg)
+        compacted += 1
+    if compacted or not had_metadata:
+        write_dataset_metadata(dataset_dir)
+
+    after = _dataset_file_stats(dataset_dir)
+    scan_after = _time_full_scan(dataset_dir) if timed and after["files"] else 0.0
+    return {
+        "partitions_compacted": compacted,
+        "files_before": before["files"],
+        "files_after": after["files"],
+        "bytes_before": before["bytes"],
+        "bytes_after": after["bytes"],
+        "scan_s_before": scan_before,
+        "scan_s_after": scan_after,
+        "sort_by": compaction_cfg["sort_by"],
+        "target_file_bytes": compaction_cfg["target_file_bytes"],
+        "row_group_rows": compaction_cfg["row_group_rows"],
+    }
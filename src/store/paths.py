@@ -11,12 +11,15 @@ class OutputPaths:
         self.raw = root / "raw"
         self.raw_index = self.raw / "index"
         self.standard = root / "standard"
+        self.baseline = root / "baseline"
         self.linked = root / "linked"
         self.features = root / "features"
+        self.feature_store = root / "feature_store"
         self.models = root / "models"
         self.plots = root / "plots"
         self.reports = root / "reports"
         self.events = root / "events"
+        self.online = root / "online"
 
     def ensure(self) -> None:
         for path in [
@@ -26,6 +29,7 @@ class OutputPaths:
             self.raw,
             self.raw_index,
             self.standard,
+            self.baseline,
             self.linked,
             self.features,
             self.models,
@@ -25,3 +25,9 @@ def write_json(path: Path, payload: Any) -> None:
     ensure_dir(path.parent)
     with path.open("w", encoding="utf-8") as handle:
         json.dump(payload, handle, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def update_json(path: Path, updates: dict) -> None:
+    payload = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    payload.update(updates)
+    write_json(path, payload)
@@ -1,8 +1,9 @@
+import numpy as np
 import pandas as pd
 import pytest
 from pathlib import Path
 
-from src.pipeline.model import run_model
+from src.pipeline.model import _changepoint_scan, _group_scores, _lagged_correlations, _series_grid, run_model
 from src.store.paths import OutputPaths
 
 
@@ -29,3 +30,116 @@ def test_anomaly_model(tmp_path: Path):
     assert anomaly_path.exists()
     anomalies = pd.read_parquet(anomaly_path)
     assert len(anomalies) >= 1
+
+
+@pytest.mark.unit
+def test_lagged_correlations_match_direct_pearson():
+    rng = np.random.default_rng(3)
+    ts = np.arange(200) * 60_000
+    base = rng.normal(size=220)
+    keep_a = rng.random(200) > 0.2
+    keep_b = rng.random(200) > 0.2
+    series_a = pd.Series(base[10:210][keep_a], index=ts[keep_a])
+    series_b = pd.Series(base[7:207][keep_b] + rng.normal(scale=0.1, size=keep_b.sum()), index=ts[keep_b])
+    short = pd.Series(base[:20], index=ts[:20])
+
+    lag_ms = [lag * 60_000 for lag in range(-5, 6)]
+    values, mask, step = _series_grid([series_a, series_b, short], lag_ms)
+    stats = {"pairs_total": 0, "pairs_evaluated": 0}
+    blocks = list(
+        _lagged_correlations(
+            values,
+            mask,
+            np.array(["geomag", "aef", "seismic"], dtype=object),
+            np.asarray(lag_ms) // step,
+            min_overlap=30,
+            stats=stats,
+            block_size=1,
+        )
+    )
+    assert stats["pairs_total"] == 3
+    assert len(blocks) == 1
+    pairs, corr, lag_pos, overlap = blocks[0]
+    assert pairs.tolist() == [[0, 1]]
+
+    assert lag_ms[lag_pos[0]] == -3 * 60_000
+    shifted = series_b.copy()
+    shifted.index = shifted.index - 3 * 60_000
+    joined = pd.concat([series_a, shifted], axis=1, join="inner").dropna()
+    assert overlap[0] == len(joined)
+    assert corr[0] == pytest.approx(np.corrcoef(joined.iloc[:, 0], joined.iloc[:, 1])[0, 1])
+
+
+@pytest.mark.unit
+def test_lagged_correlations_bounded_pool_matches_serial():
+    rng = np.random.default_rng(5)
+    ts = np.arange(120) * 60_000
+    sources = np.array(["geomag", "aef", "seismic", "vlf"] * 3, dtype=object)
+    series = [pd.Series(rng.normal(size=120), index=ts) for _ in sources]
+    lag_ms = [lag * 60_000 for lag in range(-3, 4)]
+    values, mask, step = _series_grid(series, lag_ms)
+
+    def run(**kwargs):
+        stats = {"pairs_total": 0, "pairs_evaluated": 0}
+        rows = {}
+        for pairs, corr, _, _ in _lagged_correlations(
+            values, mask, sources, np.asarray(lag_ms) // step, 30, stats, block_size=4, **kwargs
+        ):
+            rows.update({tuple(pair): value for pair, value in zip(pairs.tolist(), corr)})
+        return stats, rows
+
+    serial_stats, serial = run()
+    pooled_stats, pooled = run(workers=2, max_in_flight=1)
+    assert pooled_stats == serial_stats
+    assert len(serial) == 54
+    assert pooled.keys() == serial.keys()
+    assert all(pooled[key] == pytest.approx(serial[key]) for key in serial)
+
+
+@pytest.mark.unit
+def test_group_scores_zscore_and_robust():
+    df = pd.DataFrame(
+        {
+            "source": "geomag",
+            "channel": "X",
+            "feature": ["mean"] * 5 + ["flat"] * 2 + ["single"],
+            "station_id": list("ABCDE") + list("AB") + ["A"],
+            "value": [1.0, 2.0, 3.0, 4.0, 100.0, 5.0, 5.0, 7.0],
+        }
+    )
+    zscore = _group_scores(df, "zscore")
+    expected = (df["value"][:5] - df["value"][:5].mean()) / df["value"][:5].std()
+    assert np.allclose(zscore[:5], expected)
+    assert zscore[5:7].tolist() == [0.0, 0.0]
+    assert np.isnan(zscore[7])
+
+    robust = _group_scores(df, "robust")
+    assert robust[4] == pytest.approx((100.0 - 3.0) / (1.4826 * 1.0))
+    assert abs(robust[4]) > abs(zscore[4])
+
+
+@pytest.mark.unit
+def test_changepoint_scan_matches_brute_force():
+    rng = np.random.default_rng(0)
+    ts = np.arange(300) * 60_000
+    values = rng.normal(size=(2, 300))
+    values[0, 170:] += 5.0
+    values[1] += 45_000.0
+    values[1, 140:] += 3.0
+    mask = np.ones_like(values)
+    mask[0, rng.random(300) < 0.2] = 0.0
+    values = values * mask
+
+    split_ts, split_score = _changepoint_scan(values, mask, ts, 150 * 60_000, 60 * 60_000, 10)
+
+    observed = mask[0] > 0
+    best = None
+    for k in range(90, 211):
+        pre = values[0, :k][observed[:k]]
+        post = values[0, k:][observed[k:]]
+        score = abs(post.mean() - pre.mean()) / pre.std(ddof=1)
+        if best is None or score > best[1]:
+            best = (k, score)
+    assert split_ts[0] == best[0] * 60_000
+    assert split_score[0] == pytest.approx(best[1])
+    assert split_ts[1] == 140 * 60_000
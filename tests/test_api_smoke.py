@@ -79,3 +79,7 @@ def test_api_smoke(tmp_path: Path):
     assert raw_resp.status_code == 200
     assert len(raw_resp.json()) > 0
     assert client.get("/standard/query", params={"source": "geomag"}).status_code == 200
+    assert (standard_dir / "_metadata").exists()
+    summary_resp = client.get("/standard/summary", params={"source": "geomag"})
+    assert summary_resp.status_code == 200
+    assert summary_resp.json()["rows"] == 1
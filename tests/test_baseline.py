@@ -0,0 +1,125 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pipeline.baseline import load_baseline, run_baseline
+from src.pipeline.model import run_model
+from src.sketch import QuantileSketch
+from src.store.paths import OutputPaths
+
+
+def _write_day(output_paths: OutputPaths, day: str, values: np.ndarray) -> None:
+    ts = pd.Timestamp(day, tz="UTC").value // 1_000_000 + np.arange(len(values)) * 60_000
+    part_dir = output_paths.standard / "source=geomag" / "station_id=KAK" / f"date={day}"
+    part_dir.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(
+        {"ts_ms": ts, "source": "geomag", "channel": "X", "value": values}
+    ).to_parquet(part_dir / "part-00000.parquet", index=False)
+
+
+def _write_linked(output_paths: OutputPaths, event_id: str, day: str, values: np.ndarray, start: int) -> None:
+    ts = pd.Timestamp(day, tz="UTC").value // 1_000_000 + (start + np.arange(len(values))) * 60_000
+    linked_dir = output_paths.linked / event_id
+    linked_dir.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(
+        {"ts_ms": ts, "source": "geomag", "station_id": "KAK", "channel": "X", "value": values}
+    ).to_parquet(linked_dir / "aligned.parquet", index=False)
+
+
+@pytest.mark.unit
+def test_quantile_sketch_merge():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=50_000)
+    left = QuantileSketch(200)
+    right = QuantileSketch(200)
+    left.update(values[:20_000])
+    right.update(values[20_000:])
+    left.merge(right)
+    restored = QuantileSketch.from_record(left.to_record(), 200)
+
+    assert restored.count == len(values)
+    ranks = [(values < q).mean() for q in restored.quantiles([0.1, 0.5, 0.9])]
+    assert np.allclose(ranks, [0.1, 0.5, 0.9], atol=0.03)
+
+
+@pytest.mark.integ
+def test_baseline_incremental_and_model_lookup(tmp_path: Path):
+    output_paths = OutputPaths(tmp_path / "outputs")
+    output_paths.ensure()
+    rng = np.random.default_rng(1)
+    day_one = 100.0 + rng.normal(size=1440)
+    day_two = 100.0 + rng.normal(size=1440)
+    config = {
+        "events": [{"event_id": "ev", "origin_time_utc": "2020-01-03T05:30:00Z"}],
+        "baseline": {"sources": ["geomag"], "min_count": 30},
+        "features": {"scoring": "baseline", "anomaly_threshold": 3.0, "topn_anomalies": 10},
+    }
+
+    _write_day(output_paths, "2020-01-01", day_one)
+    run_baseline(tmp_path, config, output_paths, "run", "hash", False, None)
+    _write_day(output_paths, "2020-01-02", day_two)
+    run_baseline(tmp_path, config, output_paths, "run", "hash", False, None)
+
+    report = json.loads((output_paths.reports / "dq_baseline.json").read_text(encoding="utf-8"))
+    assert report["incremental"] is True
+    assert report["sources"]["geomag"]["rows"] == 1440
+
+    baseline = load_baseline(output_paths.baseline, hour=5, season="DJF")
+    expected = np.concatenate([day_one[300:360], day_two[300:360]])
+    row = baseline.iloc[0]
+    assert row["count"] == 120
+    assert row["mean"] == pytest.approx(expected.mean())
+    assert row["std"] == pytest.approx(expected.std(ddof=1))
+
+    event_day = 100.0 + rng.normal(size=1440)
+    event_day[300] = 110.0
+    _write_linked(output_paths, "ev", "2020-01-03", event_day[270:391], 270)
+    features_dir = output_paths.features / "ev"
+    features_dir.mkdir(parents=True)
+    pd.DataFrame(
+        [
+            {"event_id": "ev", "source": "geomag", "station_id": "KAK", "channel": "X", "feature": "mean", "value": 100.0},
+            {"event_id": "ev", "source": "geomag", "station_id": "KAK", "channel": "X", "feature": "max", "value": 110.0},
+        ]
+    ).to_parquet(features_dir / "features.parquet", index=False)
+    run_model(tmp_path, config, output_paths, "run", "hash", False, "ev")
+
+    anomalies = pd.read_parquet(features_dir / "anomaly.parquet")
+    assert anomalies["feature"].tolist() == ["baseline_sample"]
+    assert anomalies["score"].iloc[0] == pytest.approx((110.0 - expected.mean()) / expected.std(ddof=1))
+
+    config["baseline"]["statistic"] = "robust"
+    run_model(tmp_path, config, output_paths, "run", "hash", False, "ev")
+    robust = pd.read_parquet(features_dir / "anomaly.parquet")
+    assert robust["score"].iloc[0] == pytest.approx((110.0 - row["p50"]) / (1.4826 * row["mad"]))
+
+    event_day[300] = 100.0
+    _write_linked(output_paths, "ev", "2020-01-03", event_day[270:391], 270)
+    run_model(tmp_path, config, output_paths, "run", "hash", False, "ev")
+    assert pd.read_parquet(features_dir / "anomaly.parquet").empty
+
+
+@pytest.mark.integ
+def test_model_baseline_scoring_without_baseline(tmp_path: Path):
+    output_paths = OutputPaths(tmp_path / "outputs")
+    output_paths.ensure()
+    config = {
+        "events": [{"event_id": "ev", "origin_time_utc": "2020-01-03T05:30:00Z"}],
+        "baseline": {"sources": ["geomag"], "min_count": 30},
+        "features": {"scoring": "baseline", "anomaly_threshold": 3.0, "topn_anomalies": 10},
+    }
+    assert load_baseline(output_paths.baseline).columns.tolist()[:7] == [
+        "source", "station_id", "channel", "hour", "season", "count", "mean"
+    ]
+    _write_linked(output_paths, "ev", "2020-01-03", np.full(121, 100.0), 270)
+    features_dir = output_paths.features / "ev"
+    features_dir.mkdir(parents=True)
+    pd.DataFrame(
+        [{"event_id": "ev", "source": "geomag", "station_id": "KAK", "channel": "X", "feature": "mean", "value": 100.0}]
+    ).to_parquet(features_dir / "features.parquet", index=False)
+    run_model(tmp_path, config, output_paths, "run", "hash", False, "ev")
+
+    assert "baseline_sample" not in set(pd.read_parquet(features_dir / "anomaly.parquet")["feature"])
@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pipeline.feature_store import FeatureIndex, read_feature_store, update_feature_store
+
+
+def _features(event_id: str, scale: float, stations: list[str]) -> pd.DataFrame:
+    rows = []
+    for idx, station_id in enumerate(stations):
+        for feature, base in [("mean", 10.0), ("std", 1.0), ("peak", 5.0)]:
+            rows.append(
+                {
+                    "event_id": event_id,
+                    "source": "geomag",
+                    "station_id": station_id,
+                    "channel": "X",
+                    "feature": feature,
+                    "value": base * scale + idx,
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.unit
+def test_feature_store_incremental_and_similarity(tmp_path: Path):
+    store_dir = tmp_path / "feature_store"
+    for event_id, scale in [("a", 1.0), ("b", 1.1), ("c", 3.0), ("d", 8.0)]:
+        update_feature_store(store_dir, _features(event_id, scale, ["KAK", "MMB"]), event_id, "h1")
+    update_feature_store(store_dir, _features("e", 1.05, ["KNY"]), "e", "h1")
+    stats = update_feature_store(store_dir, _features("c", 1.2, ["KAK", "MMB"]), "c", "h1")
+
+    assert stats["store_vectors"] == 5
+    stored = read_feature_store(store_dir, event_id="c")
+    assert len(stored) == 6
+    assert stored.loc[stored["feature"] == "mean", "value"].min() == pytest.approx(12.0)
+
+    similar = FeatureIndex.load(store_dir).similar("a", k=3)
+    assert similar["event_id"].tolist() == ["b", "c", "d"]
+    assert np.all(np.diff(similar["distance"]) >= 0)
+    assert similar["overlap"].tolist() == [6, 6, 6]
+
+    with pytest.raises(KeyError):
+        FeatureIndex.load(store_dir).similar("a", params_hash="other")
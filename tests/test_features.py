@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pipeline.features import _extract_features, _rolling_features, _spectral_band_metadata, _spectral_features
+from src.store.matrix import build_aligned_matrix
+
+
+@pytest.mark.unit
+def test_extract_features_vectorized():
+    df = pd.DataFrame(
+        [
+            {"source": "geomag", "station_id": "KAK", "channel": "X", "ts_ms": 120_000, "value": 4.0},
+            {"source": "geomag", "station_id": "KAK", "channel": "X", "ts_ms": 0, "value": 1.0},
+            {"source": "geomag", "station_id": "KAK", "channel": "X", "ts_ms": 60_000, "value": 1.0},
+            {"source": "seismic", "station_id": "N.A", "channel": "BHZ_rms", "ts_ms": 0, "value": 2.0},
+            {"source": "seismic", "station_id": "N.A", "channel": "BHZ_rms", "ts_ms": 60_000, "value": 5.0},
+            {"source": "aef", "station_id": "KAK", "channel": "E", "ts_ms": 0, "value": None},
+        ]
+    )
+    features = _extract_features(df, "e", origin_ms=30_000)
+    lookup = features.set_index(["source", "channel", "feature"])["value"]
+
+    assert set(features["source"]) == {"geomag", "seismic"}
+    assert lookup[("geomag", "X", "mean")] == pytest.approx(2.0)
+    assert lookup[("geomag", "X", "count")] == 3
+    assert lookup[("geomag", "X", "gradient_abs_mean")] == pytest.approx(0.025)
+    assert lookup[("geomag", "X", "gradient_abs_max")] == pytest.approx(0.05)
+    assert lookup[("seismic", "BHZ_rms", "p_arrival_offset_s")] == pytest.approx(30.0)
+    assert ("seismic", "BHZ_rms", "s_arrival_offset_s") not in lookup.index
+    assert ("seismic", "BHZ_rms", "gradient_abs_mean") not in lookup.index
+
+
+@pytest.mark.unit
+def test_rolling_features_match_pandas():
+    rng = np.random.default_rng(0)
+    ts = np.arange(40) * 60_000
+    values = rng.normal(size=40)
+    values[[5, 6, 20]] = np.nan
+    df = pd.DataFrame(
+        {"source": "geomag", "station_id": "KAK", "channel": "X", "ts_ms": ts, "value": values}
+    ).dropna()
+    matrix = build_aligned_matrix(df, 0, int(ts[-1]), 60_000)
+    rolling = _rolling_features(matrix, window_minutes=10).set_index("ts_ms")
+
+    series = pd.Series(values, index=ts)
+    window = series.rolling(10, min_periods=5)
+    expected = pd.DataFrame(
+        {
+            "rolling_mean": window.mean(),
+            "rolling_std": window.std(),
+            "rolling_median": window.median(),
+            "rolling_rms": np.sqrt((series**2).rolling(10, min_periods=5).mean()),
+        }
+    ).dropna(subset=["rolling_mean"])
+    assert rolling.index.tolist() == expected.index.tolist()
+    for column in expected.columns:
+        assert np.allclose(rolling[column], expected[column])
+    zscore = (series - window.mean()) / window.std()
+    assert np.allclose(rolling["rolling_zscore"].dropna(), zscore.loc[rolling.index].dropna())
+
+
+@pytest.mark.unit
+def test_rolling_std_survives_large_dc_offset():
+    rng = np.random.default_rng(3)
+    ts = np.arange(20_000) * 60_000
+    values = 50_000.0 + 0.01 * rng.normal(size=ts.size)
+    df = pd.DataFrame({"source": "geomag", "station_id": "KAK", "channel": "X", "ts_ms": ts, "value": values})
+    matrix = build_aligned_matrix(df, 0, int(ts[-1]), 60_000)
+    rolling = _rolling_features(matrix, window_minutes=10).set_index("ts_ms")
+
+    expected = pd.Series(values, index=ts).rolling(10, min_periods=5).std().dropna()
+    assert np.allclose(rolling["rolling_std"].loc[expected.index], expected, rtol=1e-6)
+    assert np.allclose(rolling["rolling_rms"], 50_000.0, rtol=1e-6)
+
+
+@pytest.mark.unit
+def test_spectral_features_batched():
+    ts = np.arange(256) * 60_000
+    t_s = ts / 1000.0
+    frames = []
+    for station, freq in (("KAK", 0.004), ("MMB", 0.001)):
+        frames.append(
+            pd.DataFrame(
+                {
+                    "source": "geomag",
+                    "station_id": station,
+                    "channel": "X",
+                    "ts_ms": ts,
+                    "value": np.sin(2 * np.pi * freq * t_s),
+                }
+            )
+        )
+    matrix = build_aligned_matrix(pd.concat(frames), 0, int(ts[-1]), 60_000)
+    settings = {
+        "window": "hann",
+        "min_points": 16,
+        "bands_hz": {"geomag": {"pc5": [0.00167, 0.0067], "pc3": [0.022, 0.1]}},
+    }
+    features = _spectral_features(matrix, "e", settings)
+    lookup = features.set_index(["station_id", "feature"])["value"]
+
+    assert lookup[("KAK", "dominant_freq_hz")] == pytest.approx(0.004, abs=1e-4)
+    assert lookup[("MMB", "dominant_freq_hz")] == pytest.approx(0.001, abs=1e-4)
+    assert lookup[("KAK", "band_power_pc5")] > 10 * lookup[("MMB", "band_power_pc5")]
+    assert ("KAK", "band_power_pc3") not in lookup.index
+
+    settings["bands_hz"]["geomag"]["pc4"] = [0.0067, 0.022]
+    clipped = _spectral_features(matrix, "e", settings).set_index(["station_id", "feature"])["value"]
+    assert lookup[("KAK", "band_power_pc5")] == pytest.approx(clipped[("KAK", "band_power_pc5")])
+    assert clipped[("MMB", "band_power_pc4")] >= 0
+    bands = _spectral_band_metadata(matrix, settings)
+    assert bands["nyquist_hz"] == pytest.approx(1 / 120)
+    assert bands["bands"]["geomag"]["pc4"] == {
+        "requested_hz": [0.0067, 0.022],
+        "effective_hz": [0.0067, pytest.approx(1 / 120)],
+        "status": "clipped",
+    }
+    assert bands["bands"]["geomag"]["pc3"]["status"] == "skipped"
+    assert bands["bands"]["geomag"]["pc5"]["status"] == "full"
@@ -0,0 +1,158 @@
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.dataset as ds
+import pytest
+
+from src.pipeline.link import _link_settings, _nearby_by_event, run_link
+from src.pipeline.spatial import SpatialIndex
+from src.store.layout import iter_standard_batches
+from src.store.matrix import load_aligned_matrix
+from src.store.parquet import write_parquet_partitioned
+from src.store.paths import OutputPaths
+
+
+def test_batch_link_routes_merged_windows(tmp_path: Path) -> None:
+    output_paths = OutputPaths(tmp_path / "outputs")
+    base_ms = 1577836800000
+    rows = [
+        {
+            "ts_ms": base_ms + minute * 60_000,
+            "source": "geomag",
+            "station_id": station_id,
+            "channel": "X",
+            "value": float(minute),
+            "lat": lat,
+            "lon": 0.0,
+            "elev": 0.0,
+            "quality_flags": {},
+        }
+        for station_id, lat in [("NEAR", 0.5), ("FAR", 30.0)]
+        for minute in range(600)
+    ]
+    config = {
+        "storage": {"parquet": {"partition_cols": ["station_id", "date"], "row_group_rows": 50}},
+        "time": {"align_interval": "1min", "event_window": {"pre_hours": 1, "post_hours": 1}},
+        "link": {"spatial_km": 200, "batch": {"enabled": True, "catalog_csv": "catalog.csv"}},
+    }
+    write_parquet_partitioned(pd.DataFrame(rows), output_paths.standard / "source=geomag", config)
+    assert len(list(iter_standard_batches(output_paths.standard / "source=geomag"))) > 2
+    (tmp_path / "catalog.csv").write_text(
+        "event_id,origin_time_utc,lat,lon,magnitude\n"
+        "a,2020-01-01T02:00:00Z,0,0,5.1\n"
+        "b,2020-01-01T03:00:00Z,30,0,\n"
+        "c,2020-01-01T09:00:00Z,0,0,4.0\n",
+        encoding="utf-8",
+    )
+
+    run_link(tmp_path, config, output_paths, "run", "hash", False, None)
+
+    stats = pd.read_json(output_paths.reports / "link_batch.json", typ="series")
+    assert stats["window_groups"] == 2
+    assert stats["scans"] == 2
+    linked_a = pd.read_parquet(output_paths.linked / "a" / "aligned.parquet")
+    linked_b = pd.read_parquet(output_paths.linked / "b" / "aligned.parquet")
+    linked_c = pd.read_parquet(output_paths.linked / "c" / "aligned.parquet")
+    assert set(linked_a["station_id"]) == {"NEAR"}
+    assert set(linked_b["station_id"]) == {"FAR"}
+    assert set(linked_c["station_id"]) == {"NEAR"}
+    assert linked_a["ts_ms"].min() == base_ms + 60 * 60_000
+    assert linked_a["ts_ms"].max() == base_ms + 180 * 60_000
+    assert len(linked_a) == 121
+    assert linked_a["ts_ms"].is_monotonic_increasing
+
+
+def test_link_aggregates_bins_by_align_strategy(tmp_path: Path) -> None:
+    output_paths = OutputPaths(tmp_path / "outputs")
+    base_ms = 1577836800000
+    seconds = 7200
+    df = pd.DataFrame(
+        {
+            "ts_ms": [base_ms + i * 1000 for i in range(seconds)],
+            "source": "geomag",
+            "station_id": "KAK",
+            "channel": "X",
+            "value": [float(i) for i in range(seconds)],
+            "lat": 0.1,
+            "lon": 0.0,
+            "elev": 0.0,
+            "quality_flags": [{}] * seconds,
+        }
+    )
+    config = {
+        "paths": {"geomag": {"read_mode": "sec"}},
+        "storage": {"parquet": {"partition_cols": ["station_id", "date"]}},
+        "events": [{"event_id": "e", "origin_time_utc": "2020-01-01T01:00:00Z", "lat": 0.0, "lon": 0.0}],
+        "time": {
+            "align_interval": "1min",
+            "event_window": {"pre_hours": 1, "post_hours": 1},
+            "align_strategy": {"geomag_sec": "aggregate"},
+        },
+        "link": {"spatial_km": 200},
+    }
+    write_parquet_partitioned(df, output_paths.standard / "source=geomag", config)
+
+    run_link(tmp_path, config, output_paths, "run", "hash", False, "e")
+
+    aligned = pd.read_parquet(output_paths.linked / "e" / "aligned.parquet")
+    assert len(aligned) == 120
+    first = aligned.iloc[0]
+    assert first["value"] == 29.5
+    assert first["value_min"] == 0.0
+    assert first["value_max"] == 59.0
+    assert first["value_last"] == 59.0
+    assert first["value_count"] == 60
+
+    matrix = load_aligned_matrix(output_paths.linked / "e")
+    assert matrix.values.shape == (121, 1)
+    assert matrix.columns.iloc[0].to_dict() == {"source": "geomag", "station_id": "KAK", "channel": "X"}
+    assert matrix.values[0, 0] == 29.5
+    assert matrix.mask[-1, 0]
+    assert not matrix.mask[:120, 0].any()
+
+
+def test_nearby_by_event_pushes_down_radius_edge(tmp_path: Path) -> None:
+    output_paths = OutputPaths(tmp_path / "outputs")
+    base_ms = 1577836800000
+    # 200 km on the equator is ~1.7987 degrees of latitude.
+    stations = [("INSIDE", 1.79), ("OUTSIDE", 1.81)]
+    rows = [
+        {
+            "ts_ms": base_ms + minute * 60_000,
+            "source": "geomag",
+            "station_id": station_id,
+            "channel": "X",
+            "value": float(minute),
+            "lat": lat,
+            "lon": 0.0,
+            "elev": 0.0,
+            "quality_flags": {},
+        }
+        for station_id, lat in stations
+        for minute in range(120)
+    ]
+    config = {
+        "storage": {"parquet": {"partition_cols": ["station_id", "date"]}},
+        "events": [{"event_id": "e", "origin_time_utc": "2020-01-01T01:00:00Z", "lat": 0.0, "lon": 0.0}],
+        "time": {"align_interval": "1min", "event_window": {"pre_hours": 1, "post_hours": 1}},
+        "link": {"spatial_km": 200},
+    }
+    source_path = output_paths.standard / "source=geomag"
+    write_parquet_partitioned(pd.DataFrame(rows), source_path, config)
+    settings = _link_settings(config)
+    window_filter = (ds.field("ts_ms") >= base_ms) & (ds.field("ts_ms") <= base_ms + 120 * 60_000)
+    catalog = SpatialIndex(
+        pd.DataFrame([{"source": "geomag", "station_id": sid, "lat": lat, "lon": 0.0} for sid, lat in stations])
+    )
+
+    for index in [None, catalog]:
+        nearby = _nearby_by_event(index, source_path, "geomag", config["events"], window_filter, settings)
+        assert nearby[0]["station_id"].tolist() == ["INSIDE"]
+        assert nearby[0]["distance_km"].iloc[0] == pytest.approx(199.04, abs=0.01)
+
+    run_link(tmp_path, config, output_paths, "run", "hash", False, "e")
+
+    aligned = pd.read_parquet(output_paths.linked / "e" / "aligned.parquet")
+    assert set(aligned["station_id"]) == {"INSIDE"}
+    stations_json = pd.read_json(output_paths.linked / "e" / "stations.json", typ="series")
+    assert [item["station_id"] for item in stations_json["stations"]] == ["INSIDE"]
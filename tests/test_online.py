@@ -0,0 +1,101 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pipeline.online import OnlineScorer, ewma_update, read_online_anomalies
+from src.store.paths import OutputPaths
+
+
+def _write_part(
+    output_paths: OutputPaths, name: str, ts_ms: np.ndarray, values: np.ndarray, station_id: str = "KAK"
+) -> None:
+    part_dir = output_paths.standard / "source=geomag" / f"station_id={station_id}" / "date=2020-01-01"
+    part_dir.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(
+        {"ts_ms": ts_ms, "source": "geomag", "channel": "X", "value": values}
+    ).to_parquet(part_dir / name, index=False)
+
+
+@pytest.mark.unit
+def test_ewma_update_matches_recursion():
+    values = np.random.default_rng(0).normal(size=200)
+    alpha = 0.1
+    means, variances, prior_mean, prior_var = ewma_update(values, 0.5, 2.0, alpha)
+
+    mean, var = 0.5, 2.0
+    for idx, value in enumerate(values):
+        assert prior_mean[idx] == pytest.approx(mean)
+        assert prior_var[idx] == pytest.approx(var)
+        delta = value - mean
+        mean += alpha * delta
+        var = (1 - alpha) * (var + alpha * delta * delta)
+    assert means[-1] == pytest.approx(mean)
+    assert variances[-1] == pytest.approx(var)
+
+
+@pytest.mark.integ
+def test_online_scorer_incremental(tmp_path: Path):
+    output_paths = OutputPaths(tmp_path / "outputs")
+    config = {
+        "online": {"sources": ["geomag"], "alpha": 0.02, "min_points": 50},
+        "features": {"anomaly_threshold": 4.0},
+    }
+    rng = np.random.default_rng(1)
+    ts = pd.Timestamp("2020-01-01", tz="UTC").value // 1_000_000 + np.arange(400) * 1000
+    values = 10.0 + rng.normal(scale=0.1, size=400)
+    values[350] += 2.0
+
+    _write_part(output_paths, "part-00000.parquet", ts[:300], values[:300])
+    assert OnlineScorer(output_paths, config).poll().empty
+
+    _write_part(output_paths, "part-00001.parquet", ts[300:], values[300:])
+    anomalies = OnlineScorer(output_paths, config).poll()
+    assert anomalies["ts_ms"].tolist() == [int(ts[350])]
+    assert anomalies["score"].iloc[0] > 4.0
+
+    state = pd.read_parquet(output_paths.online / "state.parquet")
+    assert state["count"].tolist() == [400]
+    assert state["last_ts_ms"].tolist() == [int(ts[-1])]
+    assert OnlineScorer(output_paths, config).poll().empty
+    assert read_online_anomalies(output_paths.online)["ts_ms"].tolist() == [int(ts[350])]
+
+
+@pytest.mark.integ
+def test_online_scorer_skips_unreadable_station_and_compacts_log(tmp_path: Path):
+    output_paths = OutputPaths(tmp_path / "outputs")
+    config = {
+        "online": {"sources": ["geomag"], "alpha": 0.02, "min_points": 50, "compact_min_files": 3},
+        "features": {"anomaly_threshold": 4.0},
+    }
+    rng = np.random.default_rng(2)
+    ts = pd.Timestamp("2020-01-01", tz="UTC").value // 1_000_000 + np.arange(600) * 1000
+    values = 10.0 + rng.normal(scale=0.1, size=600)
+    spikes = [150, 250, 350, 450]
+    values[spikes] += 2.0
+    _write_part(output_paths, "part-00000.parquet", ts[:100], values[:100])
+    _write_part(output_paths, "part-00000.parquet", ts[:100], values[:100], station_id="ZZZ")
+    bad_path = output_paths.standard / "source=geomag" / "station_id=ZZZ" / "date=2020-01-01" / "part-00000.parquet"
+    good_bytes = bad_path.read_bytes()
+    bad_path.write_bytes(b"not a parquet file")
+
+    scorer = OnlineScorer(output_paths, config)
+    assert scorer.poll().empty
+    assert scorer.failed_stations == [("geomag", "ZZZ")]
+    assert {key[1] for key in scorer.state} == {"KAK"}
+
+    bad_path.write_bytes(good_bytes)
+    scorer.poll()
+    assert scorer.failed_stations == []
+    assert {key[1] for key in scorer.state} == {"KAK", "ZZZ"}
+
+    for index, spike in enumerate(spikes, start=1):
+        window = slice(spike - 50, spike + 50)
+        _write_part(output_paths, f"part-{index:05d}.parquet", ts[window], values[window])
+        assert scorer.poll()["ts_ms"].tolist() == [int(ts[spike])]
+
+    log_dir = output_paths.online / "anomalies"
+    assert sorted(path.name for path in log_dir.glob("*.parquet")) == ["part-00003.parquet", "part-00004.parquet"]
+    assert not list(log_dir.glob(".*"))
+    assert read_online_anomalies(output_paths.online)["ts_ms"].tolist() == [int(ts[spike]) for spike in spikes]
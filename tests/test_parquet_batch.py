@@ -1,8 +1,31 @@
+import os
 from pathlib import Path
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
 
-from src.store.parquet import read_parquet, write_parquet
+from src.store.layout import (
+    LAYOUT_FILE,
+    iter_standard_batches,
+    read_standard_filtered,
+    station_bbox_filter,
+    widen_dataset,
+)
+from src.store.parquet import (
+    METADATA_FILE,
+    REPLACE_JOURNAL,
+    ParquetWriterPool,
+    column_byte_breakdown,
+    compact_partitioned_dataset,
+    list_dataset_files,
+    read_parquet,
+    replace_partition_files,
+    write_parquet,
+    write_parquet_partitioned,
+)
 
 
 def test_write_parquet_partitioned_batch(tmp_path: Path) -> None:
@@ -18,3 +41,283 @@ def test_write_parquet_partitioned_batch(tmp_path: Path) -> None:
     reloaded = read_parquet(output_dir)
     assert len(reloaded) == len(df)
     assert set(reloaded["source"].unique()) == {"a", "b"}
+
+
+def test_writer_pool_single_file_per_partition(tmp_path: Path) -> None:
+    output_dir = tmp_path / "pooled"
+    config = {"storage": {"parquet": {"partition_cols": ["station_id", "date"], "batch_rows": 4}}}
+    with ParquetWriterPool(output_dir, config) as pool:
+        for start in range(0, 40, 5):
+            pool.write(
+                pd.DataFrame(
+                    {
+                        "ts_ms": range(start * 1000, (start + 5) * 1000, 1000),
+                        "station_id": ["A" if start % 2 == 0 else "B"] * 5,
+                        "value": [float(i) for i in range(5)],
+                    }
+                )
+            )
+
+    files = sorted(output_dir.rglob("*.parquet"))
+    assert len(files) == 2
+    reloaded = read_parquet(output_dir)
+    assert len(reloaded) == 40
+
+
+def test_writer_pool_removes_files_on_error(tmp_path: Path) -> None:
+    output_dir = tmp_path / "aborted"
+    config = {"storage": {"parquet": {"partition_cols": ["station_id"], "row_group_bytes": 1}}}
+    with pytest.raises(RuntimeError):
+        with ParquetWriterPool(output_dir, config) as pool:
+            pool.write(pd.DataFrame({"ts_ms": [0, 1], "station_id": ["A", "A"], "value": [1.0, 2.0]}))
+            raise RuntimeError("boom")
+    assert not list(output_dir.rglob("*.parquet"))
+
+
+def test_writer_pool_hides_open_files_from_readers(tmp_path: Path) -> None:
+    output_dir = tmp_path / "open"
+    config = {"storage": {"parquet": {"partition_cols": ["station_id"], "row_group_bytes": 1}}}
+    pool = ParquetWriterPool(output_dir, config)
+    pool.write(pd.DataFrame({"ts_ms": [0, 1], "station_id": ["A", "A"], "value": [1.0, 2.0]}))
+    assert list(output_dir.rglob("*.inprogress"))
+    assert ds.dataset(output_dir, format="parquet", partitioning="hive").to_table().num_rows == 0
+
+    pool.close()
+    assert not list(output_dir.rglob("*.inprogress"))
+    assert [path.name for path in output_dir.rglob("*.parquet")] == ["part-00000.parquet"]
+    assert len(read_parquet(output_dir)) == 2
+
+
+def test_writer_pool_promotes_null_first_batch(tmp_path: Path) -> None:
+    output_dir = tmp_path / "nulls"
+    config = {"storage": {"parquet": {"partition_cols": ["station_id"]}}}
+    with ParquetWriterPool(output_dir, config) as pool:
+        pool.write(pd.DataFrame({"ts_ms": [0], "station_id": ["A"], "value": [None], "params_hash": [None]}))
+        pool.write(pd.DataFrame({"ts_ms": [1], "station_id": ["A"], "value": [2.5], "params_hash": ["abc"]}))
+
+    assert pool.schema.field("value").type == pa.float64()
+    assert pool.schema.field("params_hash").type == pa.string()
+    reloaded = read_parquet(output_dir).sort_values("ts_ms")
+    assert reloaded["value"].isna().tolist() == [True, False]
+    assert reloaded["params_hash"].tolist() == [None, "abc"]
+
+
+def test_compact_partitioned_dataset(tmp_path: Path) -> None:
+    output_dir = tmp_path / "fragmented"
+    config = {"storage": {"parquet": {"partition_cols": ["station_id"]}}}
+    for start in (20, 10, 0):
+        write_parquet_partitioned(
+            pd.DataFrame(
+                {
+                    "ts_ms": range(start, start + 10),
+                    "station_id": ["A"] * 10,
+                    "channel": ["X", "Y"] * 5,
+                    "value": [1.0] * 10,
+                }
+            ),
+            output_dir,
+            config,
+        )
+    assert len(list(output_dir.rglob("*.parquet"))) == 3
+
+    stats = compact_partitioned_dataset(output_dir, config)
+    assert stats["files_before"] == 3
+    assert stats["files_after"] == 1
+    reloaded = read_parquet(output_dir)
+    assert len(reloaded) == 30
+    x_rows = reloaded[reloaded["channel"] == "X"]
+    assert x_rows["ts_ms"].is_monotonic_increasing
+
+
+def test_compact_root_leaf_replaces_files_in_place(tmp_path: Path) -> None:
+    output_dir = tmp_path / "flat"
+    output_dir.mkdir()
+    for index in range(3):
+        frame = pd.DataFrame({"ts_ms": range(index * 10, index * 10 + 10), "station_id": "A", "value": 1.0})
+        pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), output_dir / f"part-{index:05d}.parquet")
+    pq.write_table(pa.table({"station_id": ["A"], "lat": [1.0]}), output_dir / "_stations.parquet")
+    (output_dir / "_layout.json").write_text("{}", encoding="utf-8")
+
+    stats = compact_partitioned_dataset(output_dir, {"storage": {}})
+
+    assert stats["partitions_compacted"] == 1
+    names = {path.name for path in output_dir.iterdir()}
+    assert {"_layout.json", "_stations.parquet"} <= names
+    assert sorted(name for name in names if not name.startswith("_")) == ["part-00003.parquet"]
+    assert len(read_parquet(output_dir)) == 30
+    with pytest.raises(ValueError):
+        replace_partition_files(output_dir, [], [output_dir / "_stations.parquet"])
+
+
+@pytest.mark.parametrize("published", [False, True])
+def test_compaction_interrupted_after_commit_never_duplicates(tmp_path: Path, monkeypatch, published: bool) -> None:
+    output_dir = tmp_path / "interrupted"
+    part_dir = output_dir / "station_id=A"
+    part_dir.mkdir(parents=True)
+    for index in range(3):
+        frame = pd.DataFrame({"ts_ms": range(index * 10, index * 10 + 10), "value": 1.0})
+        pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), part_dir / f"part-{index:05d}.parquet")
+
+    def crash_before_unlink(part_dir, journal):
+        if published:
+            for staged_name, final_name in zip(journal["staged"], journal["final"]):
+                os.replace(part_dir / staged_name, part_dir / final_name)
+        raise OSError("interrupted")
+
+    with monkeypatch.context() as patch:
+        patch.setattr("src.store.parquet._finish_replacement", crash_before_unlink)
+        with pytest.raises(OSError):
+            compact_partitioned_dataset(output_dir, {"storage": {}})
+
+    new_part = part_dir / ("part-00003.parquet" if published else ".part-00003.parquet.inprogress")
+    assert len(list(part_dir.glob("part-*.parquet"))) == (4 if published else 3)
+    assert (part_dir / REPLACE_JOURNAL).exists()
+    assert list_dataset_files(output_dir) == [new_part]
+    assert sorted(read_parquet(output_dir)["ts_ms"]) == list(range(30))
+
+    compact_partitioned_dataset(output_dir, {"storage": {}})
+    assert sorted(path.name for path in part_dir.iterdir()) == ["part-00003.parquet"]
+    assert sorted(read_parquet(output_dir)["ts_ms"]) == list(range(30))
+
+
+def test_writer_pool_time_clustered_row_groups(tmp_path: Path) -> None:
+    output_dir = tmp_path / "clustered"
+    config = {"storage": {"parquet": {"partition_cols": ["station_id"], "row_group_rows": 100}}}
+    shuffled = pd.DataFrame({"ts_ms": range(1000), "station_id": ["A"] * 1000, "value": 1.0}).sample(
+        frac=1.0, random_state=0
+    )
+    write_parquet_partitioned(shuffled, output_dir, config)
+
+    (file_path,) = list(output_dir.rglob("*.parquet"))
+    metadata = pq.ParquetFile(file_path).metadata
+    assert metadata.num_row_groups == 10
+    ts_idx = metadata.schema.names.index("ts_ms")
+    ranges = [
+        (metadata.row_group(i).column(ts_idx).statistics.min, metadata.row_group(i).column(ts_idx).statistics.max)
+        for i in range(metadata.num_row_groups)
+    ]
+    assert ranges == sorted(ranges)
+    assert all(prev[1] < nxt[0] for prev, nxt in zip(ranges, ranges[1:]))
+
+    dataset = ds.dataset(output_dir, format="parquet", partitioning="hive")
+    narrow = (ds.field("ts_ms") >= 250) & (ds.field("ts_ms") < 300)
+    matched = [rg for frag in dataset.get_fragments() for rg in frag.split_by_row_group(narrow)]
+    assert len(matched) == 1
+
+
+def test_widen_dataset_long_view_roundtrip(tmp_path: Path, monkeypatch) -> None:
+    rows = []
+    for station_id, lat in [("KAK", 36.2), ("MMB", 43.9)]:
+        for ts in range(5):
+            for channel in ["X", "Y", "Z", "F"]:
+                rows.append(
+                    {
+                        "ts_ms": ts * 60_000,
+                        "source": "geomag",
+                        "station_id": station_id,
+                        "channel": channel,
+                        "value": float(ts),
+                        "lat": lat,
+                        "lon": 140.0,
+                        "elev": 10.0,
+                        "quality_flags": {"is_outlier": channel == "Z"},
+                    }
+                )
+    df = pd.DataFrame(rows)
+    output_dir = tmp_path / "source=geomag"
+    config = {"storage": {"parquet": {"partition_cols": ["station_id", "date"]}}}
+    write_parquet_partitioned(df, output_dir, config)
+    assert (output_dir / METADATA_FILE).exists()
+
+    stale = []
+
+    def replace_and_check(part_dir, staged, old_files):
+        stale.append((output_dir / METADATA_FILE).exists() or (output_dir / LAYOUT_FILE).exists())
+        return replace_partition_files(part_dir, staged, old_files)
+
+    monkeypatch.setattr("src.store.layout.replace_partition_files", replace_and_check)
+    layout = widen_dataset(output_dir, config)
+    assert stale == [False, False]
+    assert (output_dir / LAYOUT_FILE).exists()
+    assert (output_dir / METADATA_FILE).exists()
+    assert layout["channels"] == ["F", "X", "Y", "Z"]
+    assert layout["wide_rows"] * 4 == layout["long_rows"] == len(df)
+    assert len(read_parquet(output_dir)) == 10
+
+    long_df = read_standard_filtered(
+        output_dir, filters=(ds.field("station_id") == "MMB") & (ds.field("ts_ms") >= 120_000)
+    )
+    assert len(long_df) == 12
+    assert set(long_df["channel"]) == {"F", "X", "Y", "Z"}
+    assert long_df["lat"].eq(43.9).all()
+    assert long_df["source"].eq("geomag").all()
+
+
+def test_wide_layout_bbox_and_limit_match_long(tmp_path: Path) -> None:
+    rows = []
+    for station_id, lat in [("KAK", 36.2), ("MMB", 43.9)]:
+        for ts in range(40):
+            for channel in ["X", "Y"]:
+                rows.append(
+                    {
+                        "ts_ms": ts * 60_000,
+                        "source": "geomag",
+                        "station_id": station_id,
+                        "channel": channel,
+                        "value": float(ts),
+                        "lat": lat,
+                        "lon": 140.0,
+                        "elev": 10.0,
+                        "quality_flags": {},
+                    }
+                )
+    df = pd.DataFrame(rows)
+    config = {"storage": {"parquet": {"partition_cols": ["station_id", "date"]}}}
+    long_dir = tmp_path / "long" / "source=geomag"
+    wide_dir = tmp_path / "wide" / "source=geomag"
+    write_parquet_partitioned(df, long_dir, config)
+    write_parquet_partitioned(df, wide_dir, config)
+    widen_dataset(wide_dir, config)
+
+    long_df = read_standard_filtered(long_dir, filters=ds.field("lat") >= 40.0, limit=50)
+    wide_df = read_standard_filtered(wide_dir, filters=station_bbox_filter(wide_dir, lat_min=40.0), limit=50)
+    assert len(long_df) == len(wide_df) == 50
+    assert wide_df["station_id"].eq("MMB").all()
+    assert wide_df["lat"].eq(43.9).all()
+    assert station_bbox_filter(wide_dir) is None
+    batches = list(iter_standard_batches(wide_dir, filters=station_bbox_filter(wide_dir, lat_min=40.0)))
+    streamed = pd.concat(batches, ignore_index=True)
+    assert len(streamed) == 80
+    assert list(streamed.columns) == list(read_standard_filtered(wide_dir, limit=1).columns)
+    assert read_standard_filtered(wide_dir, filters=station_bbox_filter(wide_dir, lat_min=50.0), limit=50).empty
+
+
+def test_writer_pool_source_encodings(tmp_path: Path) -> None:
+    df = pd.DataFrame(
+        {
+            "ts_ms": [i * 1000 for i in range(500)],
+            "station_id": "KAK",
+            "channel": "X",
+            "value": [float(i) * 0.5 for i in range(500)],
+        }
+    )
+    config = {
+        "storage": {
+            "parquet": {
+                "partition_cols": ["station_id"],
+                "encodings": {
+                    "geomag": {"value_dtype": "float32", "ts_encoding": "delta", "byte_stream_split": True}
+                },
+            }
+        }
+    }
+    output_dir = tmp_path / "source=geomag"
+    write_parquet_partitioned(df, output_dir, config, source="geomag")
+
+    breakdown = column_byte_breakdown(output_dir)
+    assert breakdown["rows"] == 500
+    assert breakdown["columns"]["value"]["physical_type"] == "FLOAT"
+    assert "BYTE_STREAM_SPLIT" in breakdown["columns"]["value"]["encodings"]
+    assert "DELTA_BINARY_PACKED" in breakdown["columns"]["ts_ms"]["encodings"]
+    assert "RLE_DICTIONARY" in breakdown["columns"]["channel"]["encodings"]
+    assert read_parquet(output_dir)["value"].tolist() == df["value"].tolist()
@@ -0,0 +1,92 @@
+import base64
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pipeline.plots import run_plots
+from src.store.paths import OutputPaths
+
+
+@pytest.mark.integ
+def test_run_plots_writes_compact_specs(tmp_path: Path):
+    output_paths = OutputPaths(tmp_path / "outputs")
+    output_paths.ensure()
+    linked_dir = output_paths.linked / "ev"
+    linked_dir.mkdir(parents=True)
+    n = 20_000
+    ts = pd.Timestamp("2020-01-01", tz="UTC").value // 1_000_000 + np.arange(n) * 1000
+    values = np.sin(np.arange(n) / 500.0)
+    values[12_345] = 40.0
+    pd.DataFrame(
+        {
+            "ts_ms": ts,
+            "source": "geomag",
+            "station_id": "KAK",
+            "channel": "X",
+            "value": values,
+            "lat": 36.2,
+            "lon": 140.2,
+        }
+    ).to_parquet(linked_dir / "aligned.parquet", index=False)
+    config = {"events": [{"event_id": "ev"}], "plots": {"max_points_per_trace": 1000}}
+
+    run_plots(tmp_path, config, output_paths, "run", "hash", False, "ev")
+
+    spec_text = (output_paths.plots / "spec" / "ev" / "plot_aligned_timeseries.json").read_text(encoding="utf-8")
+    trace = json.loads(spec_text)["data"][0]
+    assert trace["y"]["dtype"] == "f4"
+    assert trace["x"]["dtype"] == "f8"
+    y = np.frombuffer(base64.b64decode(trace["y"]["bdata"]), dtype=np.float32)
+    assert len(y) <= 1000
+    assert y.max() == pytest.approx(40.0)
+
+    html = (output_paths.plots / "html" / "ev" / "plot_aligned_timeseries.html").read_text(encoding="utf-8")
+    assert "bdata" not in html
+    assert "/assets/plotly.min.js" in html
+    assert (output_paths.plots / "assets" / "plotly.min.js").exists()
+    spec_script = (output_paths.plots / "spec" / "ev" / "plot_aligned_timeseries.js").read_text(encoding="utf-8")
+    assert spec_script == f"window.PLOT_SPEC = {spec_text};\n"
+    assert '"/spec/$1$2"' in html and 'specBase + ".js"' in html
+
+
+@pytest.mark.integ
+def test_run_plots_skips_unchanged_tasks(tmp_path: Path):
+    output_paths = OutputPaths(tmp_path / "outputs")
+    output_paths.ensure()
+    linked_dir = output_paths.linked / "ev"
+    linked_dir.mkdir(parents=True)
+    ts = pd.Timestamp("2020-01-01", tz="UTC").value // 1_000_000 + np.arange(600) * 60_000
+    pd.DataFrame(
+        {
+            "ts_ms": ts,
+            "station_id": "KAK",
+            "channel": "X",
+            "value": np.cos(np.arange(600) / 30.0),
+            "lat": 36.2,
+            "lon": 140.2,
+        }
+    ).to_parquet(linked_dir / "aligned.parquet", index=False)
+    config = {"events": [{"event_id": "ev"}], "plots": {"workers": 2}}
+
+    def dq():
+        return json.loads((output_paths.reports / "dq_plots.json").read_text(encoding="utf-8"))
+
+    run_plots(tmp_path, config, output_paths, "run", "hash", False, "ev")
+    assert dq()["rebuilt"] == ["aligned_timeseries", "filter_effect", "station_map", "vlf_spectrogram"]
+    assert (output_paths.plots / "spec" / "ev" / "plot_station_map.fingerprint.json").exists()
+
+    run_plots(tmp_path, config, output_paths, "run", "hash", False, "ev")
+    assert dq()["reused"] == ["aligned_timeseries", "station_map"]
+    assert dq()["aligned_timeseries_points"]["output"] == 600
+
+    (output_paths.reports / "filter_effect.json").write_text(
+        json.dumps({"geomag": {"before_std": 2.0, "after_std": 1.0}}), encoding="utf-8"
+    )
+    config["plots"]["max_points_per_trace"] = 100
+    run_plots(tmp_path, config, output_paths, "run", "hash", False, "ev")
+    assert dq()["reused"] == ["station_map"]
+    assert dq()["filter_effect"] == "ok"
+    assert dq()["aligned_timeseries_points"]["output"] <= 100
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from src.plots.downsample import bucket_max, downsample_indices
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("method", ["minmax", "lttb"])
+def test_downsample_keeps_budget_and_extremes(method):
+    rng = np.random.default_rng(0)
+    x = np.arange(50_000) * 1000.0
+    y = np.cumsum(rng.normal(size=50_000))
+    y[1234] += 200.0
+    y[40_000] -= 300.0
+
+    picks = downsample_indices(x, y, 500, method)
+
+    assert len(picks) <= 500
+    assert np.all(np.diff(picks) > 0)
+    assert y[picks].max() == y.max()
+    assert y[picks].min() == y.min()
+    assert np.array_equal(downsample_indices(x[:100], y[:100], 500, method), np.arange(100))
+
+
+@pytest.mark.unit
+def test_bucket_max_preserves_peaks():
+    z = np.zeros((1000, 3))
+    z[777, 1] = 9.0
+    starts, pooled = bucket_max(z, 100)
+    assert pooled.shape == (100, 3)
+    assert starts[0] == 0
+    assert pooled[:, 1].max() == 9.0
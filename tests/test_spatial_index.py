@@ -1,3 +1,5 @@
+import math
+
 import pandas as pd
 import pytest
 
@@ -16,3 +18,24 @@ def test_spatial_query_radius():
     result = index.query_radius(0.0, 0.0, 500)
     assert "A" in result["station_id"].tolist()
     assert "B" not in result["station_id"].tolist()
+
+
+@pytest.mark.unit
+def test_spatial_index_batch_queries():
+    df = pd.DataFrame(
+        [
+            {"station_id": "A", "lat": 0.0, "lon": 0.0, "elev": 0.0},
+            {"station_id": "B", "lat": 0.0, "lon": 1.0, "elev": 0.0},
+            {"station_id": "C", "lat": 0.0, "lon": 179.5, "elev": 0.0},
+            {"station_id": "D", "lat": None, "lon": None, "elev": 0.0},
+        ]
+    )
+    index = SpatialIndex(df)
+    result = index.query_radius_batch([0.0, 0.0], [0.0, -179.9], 200)
+    assert result[result["query_index"] == 0]["station_id"].tolist() == ["A", "B"]
+    assert result[result["query_index"] == 1]["station_id"].tolist() == ["C"]
+    expected = 6371.0 * math.radians(0.6)
+    assert result[result["query_index"] == 1]["distance_km"].iloc[0] == pytest.approx(expected)
+
+    nearest = index.query_knn_batch([0.0, 0.0], [0.9, 179.0], 1)
+    assert nearest["station_id"].tolist() == ["B", "C"]
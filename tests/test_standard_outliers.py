@@ -0,0 +1,78 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pipeline.standard import SKETCHES_FILE, _mad_outlier_mask, _process_standard_source
+from src.store.parquet import read_parquet
+from src.store.paths import OutputPaths
+
+N = 1200
+SPIKES = [200, 700, 1100]
+
+
+def _series() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    values = 45_000 + 2.0 * np.arange(N) + rng.normal(size=N)
+    values[SPIKES] += 40
+    return values
+
+
+def _standardize(tmp_path: Path, batch_rows: int, scope: str) -> tuple:
+    ingest_dir = tmp_path / f"ingest_{batch_rows}_{scope}" / "geomag" / "station_id=KAK"
+    ingest_dir.mkdir(parents=True)
+    pd.DataFrame(
+        {
+            "ts_ms": 1_577_836_800_000 + np.arange(N) * 60_000,
+            "source": "geomag",
+            "channel": "X",
+            "value": _series(),
+            "lat": 36.2,
+            "lon": 140.2,
+            "elev": 0.0,
+            "quality_flags": "{}",
+            "proc_stage": "ingest",
+            "proc_version": "test",
+            "params_hash": "hash",
+        }
+    ).to_parquet(ingest_dir / "part-00000.parquet", index=False)
+    output_paths = OutputPaths(tmp_path / f"outputs_{batch_rows}_{scope}")
+    output_paths.ensure()
+    config = {
+        "preprocess": {
+            "batch_rows": batch_rows,
+            "geomag": {
+                "detrend": {"method": "linear"},
+                "highpass": {"window_points": 60},
+                "outlier": {"threshold": 6.0, "scope": scope},
+            },
+        }
+    }
+    _process_standard_source("geomag", ingest_dir.parent, output_paths, config, "hash", None)
+
+    dataset_dir = output_paths.standard / "source=geomag"
+    sketches = pd.read_parquet(dataset_dir / SKETCHES_FILE)
+    output = read_parquet(dataset_dir).sort_values("ts_ms").reset_index(drop=True)
+    flags = [item if isinstance(item, dict) else json.loads(item) for item in output["quality_flags"]]
+    flagged = [idx for idx, item in enumerate(flags) if item.get("is_outlier")]
+    return flagged, sketches, flags[0]["preprocess"]["outlier"]["scope"]
+
+
+@pytest.mark.integ
+def test_outliers_use_whole_series_residual_sketch(tmp_path: Path):
+    raw = pd.Series(_series())
+    assert not _mad_outlier_mask(raw, 6.0, raw.mean(), raw.std()).any()
+
+    small, sketches, scope = _standardize(tmp_path, 150, "series")
+    large, _, _ = _standardize(tmp_path, 50_000, "series")
+    assert small == large == SPIKES
+    assert scope == "series"
+    assert sketches["sketch_count"].tolist() == [N]
+    assert abs(sketches["median"].iloc[0]) < 5.0
+    assert sketches["mad"].iloc[0] < 5.0
+
+    flagged, _, scope = _standardize(tmp_path, 150, "batch")
+    assert scope == "batch"
+    assert set(SPIKES) <= set(flagged)